@@ -0,0 +1,21 @@
+'''
+Benchmarks for the election scripts.
+
+generate.py writes synthetic nominee and ballot CSVs laid out like the
+Qualtrics exports the scripts read, and bench.py times each phase of a run
+over them. From the repository root:
+
+    python -m benchmarks.bench --voters 1000 10000 100000
+
+The scripts aren't a package, so their directory is put on the import path
+here, as running them from scripts/ would.
+'''
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, "scripts")
+VOTING_TABLE = os.path.join(ROOT_DIR, "config", "VOTING.csv")
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,235 @@
+'''
+Times each phase of an election over synthetic data of growing size.
+
+For every number of voters asked for, a synthetic election is generated
+(see generate.py) and then:
+
+    get_candidates      parsing the nominee CSV
+    get_ballots         parsing and encoding the ballot CSV
+    build elections     making a PositionElection per position
+    compute_winners     counting every position once
+    elections.py        the whole script, allocation loop included, run in
+                        its own process with its configurables pointed at
+                        the synthetic files
+
+The first four run in this process and are timed with instrument.py;
+their peak is the most memory traced by tracemalloc while the phase ran,
+over what was allocated when it started (tracing slows pure-Python phases
+down, turn it off with --no-memory for cleaner timings). The phases the
+scripts time inside them go to the JSON output. The last one's peak is the
+process' maximum resident set size.
+
+    python -m benchmarks.bench --voters 1000 10000 100000 --json out.json
+'''
+import argparse
+import contextlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+from benchmarks import SCRIPTS_DIR
+from benchmarks import generate as synthetic
+import election_helper
+import instrument
+import tabulation
+import pyrankvote
+from election_helper import get_candidates, get_ballots, PositionElection
+
+# the configurables at the top of elections.py that the in-process phases
+# mirror, with the values elections.py ships with
+HELPER_SETTINGS = {
+    "MAX_POSITIONS": synthetic.MAX_POSITIONS,
+    "CANDIDATE_START_ROW": 1,
+    "VOTING_START_ROW": synthetic.BALLOT_HEADER_ROWS,
+    "SURNAME_COL": synthetic.SURNAME_COL,
+    "FIRSTNAME_COL": synthetic.FIRSTNAME_COL,
+    "EMAIL_COL": synthetic.EMAIL_COL,
+    "ROLES_COL": synthetic.ROLES_COL,
+    "STATUS_COL": synthetic.STATUS_COL,
+    "CAND_TYPE_COL": synthetic.CAND_TYPE_COL,
+    "TERMS_COL": synthetic.TERMS_COL,
+}
+RAW_VOTING_OFFSET = -18
+MULTI_SEATS = {"Quartermaster": 5}
+EVALUATORS = {"native": tabulation.preferential_block_voting,
+              "native-stv": tabulation.single_transferable_vote,
+              "pyrankvote": pyrankvote.preferential_block_voting,
+              "pyrankvote-stv": pyrankvote.single_transferable_vote}
+
+
+def configure_script(settings: dict) -> str:
+    '''
+    Source of elections.py with the given configurables (name -> source
+    of its new value) replaced.
+    '''
+    with open(os.path.join(SCRIPTS_DIR, "elections.py"), encoding="utf-8") as f:
+        source = f.read()
+    for name, value in settings.items():
+        source, found = re.subn(rf"^{name} = .*$", f"{name} = {value}",
+                                source, count=1, flags=re.M)
+        if found == 0:
+            raise KeyError(f"elections.py has no configurable {name}")
+    return source
+
+
+def run_script(directory: str, settings: dict) -> tuple[float, int]:
+    '''
+    Runs a configured elections.py in directory/scripts.
+    Returns its wall time and maximum resident set size in bytes.
+    '''
+    work = os.path.join(directory, "scripts")
+    os.makedirs(work, exist_ok=True)
+    with open(os.path.join(work, "elections.py"), "w", encoding="utf-8") as f:
+        f.write(configure_script(settings))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [SCRIPTS_DIR] + [p for p in [env.get("PYTHONPATH")] if p])
+
+    with open(os.path.join(work, "stderr.txt"), "w+") as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "elections.py"], cwd=work,
+                                   stdout=subprocess.DEVNULL, stderr=stderr,
+                                   env=env)
+        # wait4 gives this child's own resource usage
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"elections.py failed:\n{stderr.read()}")
+    # ru_maxrss is in kilobytes on Linux
+    return seconds, usage.ru_maxrss * 1024
+
+
+def bench(n_voters: int, directory: str, args) -> tuple[List[dict], dict]:
+    '''
+    Generates an election of n_voters in directory and measures its phases.
+    Returns one {"voters", "phase", "seconds", "peak_bytes"} entry per
+    phase (peak_bytes being None if memory isn't traced), and everything
+    instrument recorded while they ran.
+    '''
+    print(f"Generating {n_voters:,} ballots in {directory}...")
+    config = synthetic.generate(directory, n_voters, args.candidates,
+                                args.positions_per_candidate, args.joints,
+                                args.seed)
+    nominee_file = os.path.join(directory, "data", synthetic.NOMINEE_FILE)
+    ballot_file = os.path.join(directory, "data", synthetic.BALLOT_FILE)
+    position_cols = [[name, column + RAW_VOTING_OFFSET]
+                     for name, column in synthetic.read_positions()]
+    evaluator = EVALUATORS[args.evaluator]
+    for name, value in HELPER_SETTINGS.items():
+        setattr(election_helper, name, value)
+    label = {"voters": n_voters}
+
+    # started after generating, so tracing memory doesn't slow that down
+    recorder = instrument.enable(trace_memory=not args.no_memory)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with instrument.phase("get_candidates", **label):
+                candidates = get_candidates(nominee_file,
+                                            joint_candidates=config["joints"])
+
+            with instrument.phase("get_ballots", **label):
+                ballots = get_ballots(ballot_file, position_cols, candidates,
+                                      as_matrix=not args.list_ballots,
+                                      chunk_size=args.chunk_size,
+                                      group=not (args.list_ballots or args.no_group))
+
+            with instrument.phase("build elections", **label):
+                candidates_by_pos = {}
+                for c in candidates.values():
+                    for pos in c.positions:
+                        candidates_by_pos.setdefault(pos, []).append(c)
+                elections = [PositionElection(position, candidates_by_pos[position],
+                                              ballots[position], evaluator,
+                                              seats=MULTI_SEATS.get(position, 1))
+                             for position in ballots.keys()]
+
+            with instrument.phase("compute_winners", **label):
+                for election in elections:
+                    election.compute_winners()
+    finally:
+        instrument.disable()
+    results = [dict(label, phase=record["name"], seconds=record["seconds"],
+                    peak_bytes=record.get("peak_bytes"))
+               for record in recorder.phases if record["depth"] == 0]
+
+    if not args.no_script:
+        seconds, peak = run_script(directory, {
+            "CANDIDACY_FILE": repr(config["candidacy_file"]),
+            "BALLOT_FILE": repr(config["ballot_file"]),
+            "joints": repr(config["joints"]),
+            "USE_BALLOT_MATRIX": repr(not args.list_ballots),
+            "GROUP_BALLOTS": repr(not args.no_group),
+            "BALLOT_CHUNK_SIZE": repr(args.chunk_size),
+            "EVALUATOR": repr(f"{evaluator.__module__}.{evaluator.__name__}"),
+            # a cache hit would skip the parsing or counting being measured
+            "PARSE_CACHE_DIR": "None",
+            "RESULT_CACHE_DIR": "None",
+        })
+        results.append(dict(label, phase="elections.py", seconds=seconds,
+                            peak_bytes=peak))
+    return results, recorder.to_json()
+
+
+def report(results: List[dict]) -> None:
+    print(f"\n{'voters':>12}  {'phase':<16}{'time (s)':>10}{'peak (MiB)':>12}")
+    for result in results:
+        peak = result["peak_bytes"]
+        peak = "-" if peak is None else f"{peak / 2 ** 20:.1f}"
+        print(f"{result['voters']:>12,}  {result['phase']:<16}"
+              f"{result['seconds']:>10.3f}{peak:>12}")
+
+
+def main(argv: List[str] = None) -> List[dict]:
+    parser = argparse.ArgumentParser(
+        description="Time each phase of an election over synthetic data.")
+    parser.add_argument("--voters", type=int, nargs="+",
+                        default=[1000, 10000, 100000],
+                        help="electorate sizes to run, i.e. 1000 ... 10000000")
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--positions-per-candidate", type=int, default=3)
+    parser.add_argument("--joints", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--evaluator", choices=EVALUATORS, default="native")
+    parser.add_argument("--list-ballots", action="store_true",
+                        help="parse into Ballot objects, not ballot matrices")
+    parser.add_argument("--no-group", action="store_true",
+                        help="don't group identical rankings")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="stream the ballot file this many rows at a time")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="don't trace memory (faster, no peak column)")
+    parser.add_argument("--no-script", action="store_true",
+                        help="skip running the whole of elections.py")
+    parser.add_argument("--keep", metavar="DIR", default=None,
+                        help="write the synthetic elections here and keep them")
+    parser.add_argument("--json", metavar="FILE", default=None,
+                        help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    recorded = {}
+    for n_voters in args.voters:
+        if args.keep is not None:
+            measured, recorded[n_voters] = bench(
+                n_voters, os.path.join(args.keep, str(n_voters)), args)
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                measured, recorded[n_voters] = bench(n_voters, directory, args)
+        results.extend(measured)
+    report(results)
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results,
+                       "instrumentation": recorded}, f, indent=1, default=str)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+'''
+Synthetic election generator.
+
+Writes a nominee CSV and a ballot CSV in the layout scripts/elections.py
+reads with its default configurables (nominee columns, header rows and the
+RAW_VOTING_OFFSET shift of the VOTING.csv column numbers), along with a copy
+of the position table:
+
+    <directory>/data/nominees.csv
+    <directory>/data/votes.csv
+    <directory>/config/VOTING.csv
+
+Voters rank a random number of each position's candidates, in an order
+drawn by candidate popularity, so some candidates are clear favourites and
+rankings repeat the way they do in real elections. A few voters abstain or
+leave positions blank, and positions with a single candidate get a yes/no
+vote.
+'''
+import argparse
+import csv
+import os
+import shutil
+import numpy as np
+from typing import List
+from benchmarks import VOTING_TABLE
+
+NOMINEE_FILE = "nominees.csv"
+BALLOT_FILE = "votes.csv"
+
+# nominee columns, as configured at the top of elections.py
+SURNAME_COL, FIRSTNAME_COL, ROLES_COL, EMAIL_COL = 0, 1, 2, 5
+STATUS_COL, CAND_TYPE_COL, TERMS_COL = 6, 7, 8
+NOMINEE_WIDTH = 9
+# header rows above the ballots in a Qualtrics export
+BALLOT_HEADER_ROWS = 3
+# positions past this many are dropped from applications, as with
+# election_helper.MAX_POSITIONS in elections.py, and don't make the ballot
+MAX_POSITIONS = 3
+
+
+def read_positions(voting_table: str = VOTING_TABLE) -> List[tuple[str, int]]:
+    with open(voting_table, newline='', encoding='utf-8') as f:
+        return [(name, int(column)) for name, column in list(csv.reader(f))[1:]]
+
+
+def generate(directory: str, n_voters: int, n_candidates: int = 40,
+             positions_per_candidate: int = 3, n_joints: int = 1,
+             seed: int = 0, voting_table: str = VOTING_TABLE,
+             offset: int = -18, batch_size: int = 10000) -> dict:
+    '''
+    Writes a synthetic election to directory.
+    Returns what elections.py needs to be configured with to run it:
+    {"candidacy_file", "ballot_file", "joints"}, file paths being
+    relative to a working directory one level below directory.
+    ...
+
+    Arguments
+    ---------
+    directory : str
+        Where to write the data/ and config/ folders.
+    n_voters : int
+        Number of ballots.
+    n_candidates : int
+        Number of individual nominees (joint candidacies come on top).
+    positions_per_candidate : int
+        How many positions each nominee runs for.
+    n_joints : int
+        Number of pairs of nominees running jointly for one position.
+    seed : int
+        Seed for the random generator, the same arguments and seed
+        always write the same files.
+    voting_table : str
+        Position table to lay the ballot columns out by.
+    offset : int
+        Shift applied to the position table's column numbers, as
+        RAW_VOTING_OFFSET is in elections.py.
+    batch_size : int
+        Ballots generated and written at a time.
+
+    '''
+    rng = np.random.default_rng(seed)
+    positions = read_positions(voting_table)
+    position_names = [name for name, _ in positions]
+    names = [f"Nominee {i:04d}" for i in range(n_candidates)]
+
+    # everyone runs for positions_per_candidate positions, dealt out so
+    # that every position gets someone
+    per_candidate = min(positions_per_candidate, len(positions))
+    running = []
+    for i in range(n_candidates):
+        first = position_names[i % len(positions)]
+        others = [p for p in rng.permutation(position_names) if p != first]
+        running.append([first] + others[:per_candidate - 1])
+
+    joints = []
+    for j in range(min(n_joints, n_candidates // 2)):
+        a, b = 2 * j, 2 * j + 1
+        position = running[a][0]
+        if position not in running[b][:MAX_POSITIONS]:
+            others = [p for p in running[b] if p != position]
+            running[b] = [position] + others[:per_candidate - 1]
+        joints.append(([names[a], names[b]], [position],
+                       f"{names[a]} and {names[b]}"))
+
+    data_dir = os.path.join(directory, "data")
+    config_dir = os.path.join(directory, "config")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(config_dir, exist_ok=True)
+    shutil.copy(voting_table, os.path.join(config_dir, "VOTING.csv"))
+
+    with open(os.path.join(data_dir, NOMINEE_FILE), "w", newline='',
+              encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Surname", "First name", "Roles", "", "", "Email",
+                         "Student next year", "Response type", "Terms"])
+        for name, roles in zip(names, running):
+            row = [""] * NOMINEE_WIDTH
+            row[FIRSTNAME_COL], row[SURNAME_COL] = name.split(" ")
+            row[ROLES_COL] = ",".join(roles)
+            row[EMAIL_COL] = name.replace(" ", ".").lower() + "@example.com"
+            row[STATUS_COL] = "Yes"
+            row[CAND_TYPE_COL] = "IP Address"
+            row[TERMS_COL] = "Term 1,Term 2"
+            writer.writerow(row)
+
+    # who appears on each position's ballot; joint members only together
+    on_ballot = {name: [] for name in position_names}
+    for name, roles in zip(names, running):
+        for position in roles[:MAX_POSITIONS]:
+            if position in on_ballot:
+                on_ballot[position].append(name)
+    for members, (position,), joint_name in joints:
+        on_ballot[position] = [n for n in on_ballot[position]
+                               if n not in members] + [joint_name]
+    popularity = {p: rng.random(len(c)) ** 2 + 0.01 for p, c in on_ballot.items()}
+
+    width = max(column for _, column in positions) + offset
+    with open(os.path.join(data_dir, BALLOT_FILE), "w", newline='',
+              encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for _ in range(BALLOT_HEADER_ROWS):
+            writer.writerow(["header"] * width)
+        for start in range(0, n_voters, batch_size):
+            batch = min(batch_size, n_voters - start)
+            rows = [[""] * width for _ in range(batch)]
+            for position, column in positions:
+                cells = _position_votes(rng, on_ballot[position],
+                                        popularity[position], batch)
+                for row, cell in zip(rows, cells):
+                    row[column + offset - 1] = cell
+            writer.writerows(rows)
+
+    return {"candidacy_file": f"../data/{NOMINEE_FILE}",
+            "ballot_file": f"../data/{BALLOT_FILE}",
+            "joints": joints}
+
+
+def _position_votes(rng: np.random.Generator, candidates: List[str],
+                    popularity: np.ndarray, n: int) -> List[str]:
+    '''
+    One position's ballot cells for n voters.
+    '''
+    if len(candidates) == 0:
+        return [""] * n
+    if len(candidates) == 1:
+        cells = np.where(rng.random(n) < 0.8, "Yes", "No").astype(object)
+    else:
+        # exponential race: lower times for more popular candidates
+        times = rng.exponential(size=(n, len(candidates))) / popularity
+        order = np.argsort(times, axis=1)
+        lengths = rng.integers(1, len(candidates) + 1, size=n)
+        names = np.array(candidates, dtype=object)
+        cells = np.array([",".join(names[row[:length]])
+                          for row, length in zip(order, lengths)], dtype=object)
+    skip = rng.random(n)
+    cells[skip < 0.05] = "Abstain"
+    cells[(skip >= 0.05) & (skip < 0.08)] = ""
+    return cells.tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic election in Qualtrics' CSV layout.")
+    parser.add_argument("directory")
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--positions-per-candidate", type=int, default=3)
+    parser.add_argument("--joints", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.directory, args.voters, args.candidates,
+             args.positions_per_candidate, args.joints, args.seed)
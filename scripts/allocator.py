@@ -0,0 +1,248 @@
+'''
+Hands out the seats of every position election between their winners.
+
+The elections are counted over and over. Each winner gets the seat they
+ranked highest and is struck off the rest, and the ranking threshold is
+lowered every pass. An election's count only changes when somebody is
+struck off it, so the allocator keeps each election's last result and only
+tabulates again the ones that were touched (dirty) since. The rest are
+given their last result back, with the same winners and events as a fresh
+count. Who runs where, and which elections are still open, are kept in
+dicts rather than found by going through every election. Every round of
+every count, and every winner, seat and removal, also goes to the audit
+trail if one is being kept (see audit.py): rounds as they're counted,
+other than those of counts done in worker processes, which are written
+when the workers hand them back.
+
+Usage
+-----
+    problems = Allocator(elections).run()
+    elections[0].final_winners
+'''
+from typing import List
+import audit
+import events
+import instrument
+
+# lowest choice a winner can be given a seat for
+LOWEST_RANKING = 3
+
+
+class Allocator:
+    '''
+    Allocates the seats of a set of position elections.
+    ...
+
+    Attributes
+    ----------
+        elections : List[PositionElection]
+            Every election, in the order they're counted and reported.
+        open : dict
+            Elections with seats left, as {election: None} (an ordered set).
+        problems : List[str]
+            Problems met along the way.
+        processes : int or None
+            Worker processes counting the dirty elections, if any.
+
+    '''
+
+    def __init__(self, elections: List["PositionElection"],
+                 processes: int = None) -> None:
+        self.elections = list(elections)
+        self.open = dict.fromkeys(self.elections)
+        self.problems = []
+        self.processes = processes
+        self._order = {election: i for i, election in enumerate(self.elections)}
+        # candidate -> elections they started in; only ever gets smaller
+        self._running = {}
+        for election in self.elections:
+            for candidate in election.candidates:
+                self._running.setdefault(candidate, []).append(election)
+        # elections whose last result is out of date (or who have none yet)
+        self._dirty = set(self.elections)
+        self._results = {}
+        self._counter = None
+
+    def run(self) -> List[str]:
+        '''
+        Runs every allocation pass, leaving the seats in each election's
+        final_winners.
+        Returns the problems met along the way.
+        '''
+        if self.processes is not None:
+            from parallel import ParallelCounter
+            self._counter = ParallelCounter(self.elections, self.processes)
+        try:
+            for threshold in range(1, LOWEST_RANKING + 1):
+                # passes used to be numbered within a threshold, there's only ever one
+                with instrument.phase("allocation pass", iteration=1, threshold=threshold):
+                    self.allocation_pass(threshold)
+        finally:
+            if self._counter is not None:
+                self._counter.close()
+                self._counter = None
+        return self.problems
+
+    def allocation_pass(self, threshold: int) -> None:
+        '''
+        Counts the open elections once and settles everyone who won, giving
+        winners of several elections the one they ranked #threshold.
+        '''
+        audit.allocation_pass(threshold)
+        events.info("allocation_pass",
+                    "Running all elections... (iteration {iteration}, ranking threshold {threshold})",
+                    iteration=1, threshold=threshold)
+        # {candidate: ([elections won], [their rankings])}
+        cycle_winners = {}
+        closing = {}
+        if self._counter is not None:
+            self._count_parallel()
+        for election in self.open:
+            # counted in parallel already, if there's a pool
+            result = election.compute_winners(
+                self._results[election] if self._counter is not None
+                else self._result(election))
+            if result is None:
+                audit.winners(election.position, None)
+                self.problems.append(
+                    "at (iteration {}, ranking threshold {})\n".format(1, threshold) +
+                    "Nobody left to run for {} Original candidates: {}\n"
+                    .format(election.position, list([c.name for c in election.starting])))
+                closing[election] = "no candidates"
+                continue
+            result = list(result)
+            audit.winners(election.position, result)
+            for winner, ranking in result:
+                won_elecs, rankings = cycle_winners.setdefault(winner, ([], []))
+                won_elecs.append(election)
+                rankings.append(ranking)
+
+        events.info("winners_computing", "\n Computing true winners...")
+        for candidate, (won_elecs, rankings) in cycle_winners.items():
+            self._settle(candidate, won_elecs, rankings, threshold, cycle_winners)
+
+        events.info("seats_filled", "\n\n{table}\n\n",
+                    table=lambda: "\n".join("{}: {}/{} seats filled.".format(
+                        e.position, len(e.final_winners), e.seats) for e in self.elections),
+                    seats=lambda: {e.position: [len(e.final_winners), e.seats]
+                                   for e in self.elections})
+        for election in list(self.open):
+            if len(election.final_winners) >= election.seats:
+                events.info("election_closed",
+                            "All seats for {position} election satisfied, closing...",
+                            position=election.position, reason="seats filled")
+                del self.open[election]
+            elif election in closing:
+                events.info("election_closed", "Closing {position} election due to {reason}",
+                            position=election.position, reason=closing[election])
+                del self.open[election]
+
+    def _result(self, election: "PositionElection") -> "ElectionResults":
+        '''
+        The election's count as it stands, tabulated again only if it's
+        dirty. None if compute_winners counts it itself (yes/no votes,
+        nobody left).
+        '''
+        if election in self._dirty:
+            self._dirty.discard(election)
+            self._results[election] = self._tabulate(election)
+        else:
+            instrument.count("tabulations reused")
+            if self._results[election] is not None:
+                audit.reused(election.position)
+        return self._results[election]
+
+    @staticmethod
+    def _tabulate(election: "PositionElection") -> "ElectionResults":
+        if len(election.candidates) == 0 or election.is_referendum():
+            return None
+        instrument.count("tabulations")
+        with instrument.phase("tabulate", position=election.position):
+            # rounds go to the audit trail as they're counted
+            return election.count(audit.rounds(election.position))
+
+    def _count_parallel(self) -> None:
+        '''
+        Tabulates the open elections that are dirty in the worker processes.
+        '''
+        dirty = [e for e in self.open if e in self._dirty]
+        self._results.update(zip(dirty, self._counter.count(dirty)))
+        for election in self.open:
+            if election in dirty:
+                # workers hand back whole counts, their rounds are written now
+                audit.count(election.position, self._results[election])
+            elif self._results[election] is not None:
+                audit.reused(election.position)
+        self._dirty.difference_update(dirty)
+        instrument.count("tabulations", len(dirty))
+        instrument.count("tabulations reused", len(self.open) - len(dirty))
+
+    def _settle(self, candidate: "Candidate", won_elecs: List["PositionElection"],
+                rankings: List[int], threshold: int, cycle_winners: dict) -> None:
+        '''
+        Gives a winner of this pass their seat, if they're owed one yet,
+        and strikes them off the other open elections.
+        '''
+        if not (threshold in rankings or len(won_elecs) == 1
+                or len(won_elecs[0].candidates) == 1):
+            events.info("winner_dropped", "{candidate} was dropped",
+                        candidate=candidate)
+            return
+        if len(candidate.part_of_joints) > 0:
+            events.info("joint_member_won", "JOINTAX: {candidate}",
+                        candidate=candidate)
+            # if their joint won something, give them that instead
+            # (prioritize not breaking joints)
+            if any(j in cycle_winners for j in candidate.part_of_joints):
+                return
+        if len(won_elecs) == 1:  # if they only won one election, they get that role
+            won_election = won_elecs[0]
+            events.info("winner_final",
+                        "\n (FORCED) {candidate} only won {position} as their #{ranking} choice (final)...",
+                        candidate=candidate.name, position=won_election.position,
+                        ranking=rankings[0], reason="only win")
+        elif len(won_elecs[0].candidates) == 1:
+            won_election = won_elecs[0]
+            events.info("winner_final",
+                        "\n {candidate} won {position} as their #{ranking} choice (final). They were the only person left...",
+                        candidate=candidate.name, position=won_election.position,
+                        ranking=rankings[0], reason="only candidate")
+        else:
+            won_election = won_elecs[rankings.index(threshold)]
+            events.info("winner_final",
+                        "\n{candidate} won {position} as their #{ranking} choice (final)...",
+                        candidate=candidate.name, position=won_election.position,
+                        ranking=threshold, reason="ranking threshold")
+        won_election.final_winners.append(candidate)
+        audit.seat(won_election.position, candidate,
+                   rankings[won_elecs.index(won_election)])
+        # if this person ran in other elections, remove them from them.
+        # a joint's members are the ones on the other ballots
+        if len(candidate.positions) > 1 or candidate.joint:
+            events.info("winner_removing", "Removing them from other elections:",
+                        candidate=candidate)
+            self.strike_off(candidate.joint_candidates if candidate.joint
+                            else [candidate], won_election)
+        else:
+            events.info("winner_single_election", "This was their only election.",
+                        candidate=candidate)
+
+    def strike_off(self, candidates: List["Candidate"],
+                   won_election: "PositionElection") -> None:
+        '''
+        Removes candidates from every open election but the one they won,
+        marking the elections they were still running in as dirty.
+        '''
+        touched = set()
+        for candidate in candidates:
+            touched.update(self._running.get(candidate, ()))
+        touched.discard(won_election)
+        for election in sorted(touched, key=self._order.__getitem__):
+            if election not in self.open:
+                continue
+            struck = [c for c in candidates if c in election.candidates]
+            for candidate in struck:
+                election.remove_candidate(candidate)
+            if len(struck) > 0:
+                self._dirty.add(election)
+                audit.removed(election.position, struck, won_election.position)
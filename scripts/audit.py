@@ -0,0 +1,332 @@
+'''
+Round-by-round audit trail of the seat allocation.
+
+Off by default, in which case every call returns straight away, so the
+calls can stay in the allocator for good. Once enabled, each thing the
+allocation does is appended to a JSON lines file as it happens: every
+round of every count (the tallies of the candidates still in it, who was
+eliminated or elected that round and the votes each gained or lost since
+the round before), counts reused from an earlier pass, the winners of each
+pass, the seats handed out and the candidates struck off. Lines are
+written straight to the file, so nothing builds up however long the run.
+
+Rounds of tabulation.py's counts are written from the count's loop, one
+by one (see rounds), so a count that fails still leaves the rounds before
+it. Other methods, worker processes and the result cache only hand back
+whole counts, whose rounds are written together once they're in.
+
+Every entry for a position starts with its name, which lets the reader
+pick one position's entries out of the log line by line, only decoding
+those, without loading the rest. Runs of several scenarios (or what-if
+questions) mark where each one starts.
+
+Usage
+-----
+    audit.enable("../results/audit.jsonl")
+    ... run the election ...
+    audit.disable()
+    print(audit.summary("../results/audit.jsonl", "President"))
+
+    python audit.py ../results/audit.jsonl President
+'''
+import argparse
+import json
+from typing import Callable, Iterator, List
+
+_writer = None
+
+
+class AuditWriter:
+    '''
+    Appends audit entries to a JSON lines file.
+    ...
+
+    Attributes
+    ----------
+        fname : str
+            The log being written.
+        threshold : int
+            Ranking threshold of the allocation pass under way.
+        entries : int
+            Entries written so far.
+
+    '''
+
+    def __init__(self, fname: str) -> None:
+        self.fname = fname
+        self.threshold = None
+        self.entries = 0
+        self._file = open(fname, "a", encoding="utf-8")
+
+    def write(self, position: str, entry: dict) -> None:
+        # the position goes first, it's what the reader looks for
+        line = {"position": position, "pass": self.threshold}
+        line.update(entry)
+        self._file.write(json.dumps(line, separators=(",", ":"), default=_plain) + "\n")
+        self.entries += 1
+
+    def mark(self, scenario: str) -> None:
+        self._file.write(json.dumps({"scenario": scenario}) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _plain(value):
+    # numpy numbers from the tabulation methods
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def enable(fname: str) -> AuditWriter:
+    global _writer
+    if _writer is not None:
+        _writer.close()
+    _writer = AuditWriter(fname)
+    return _writer
+
+
+def disable() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def enabled() -> bool:
+    return _writer is not None
+
+
+def scenario(name: str) -> None:
+    '''
+    Marks the start of a scenario's allocation in the log.
+    '''
+    if _writer is not None:
+        _writer.mark(name)
+
+
+def allocation_pass(threshold: int) -> None:
+    if _writer is not None:
+        _writer.threshold = threshold
+
+
+class RoundWriter:
+    '''
+    Writes the rounds of one count of a position, one at a time, each
+    with what changed since the one before.
+    ...
+
+    Attributes
+    ----------
+        position : str
+            The position being counted.
+        number : int
+            Rounds written so far.
+
+    '''
+
+    def __init__(self, position: str) -> None:
+        self.position = position
+        self.number = 0
+        # (tallies of the candidates still in, everyone elected so far)
+        self._previous = None
+
+    def round(self, round_: "RoundResult") -> None:
+        if _writer is None:
+            return
+        self.number += 1
+        previous = self._previous
+        tally = {}
+        eliminated = []
+        elected = []
+        for candidate_result in round_.candidate_results:
+            name = candidate_result.candidate.name
+            status = candidate_result.status
+            # eliminated candidates stay on every later round with no votes
+            if status == "Rejected" and previous is not None and name not in previous[0]:
+                continue
+            tally[name] = candidate_result.number_of_votes
+            if status == "Rejected":
+                eliminated.append(name)
+            elif status == "Elected" and (previous is None or name not in previous[1]):
+                elected.append(name)
+        entry = {"round": self.number, "tally": tally, "blank": round_.number_of_blank_votes,
+                 "eliminated": eliminated, "elected": elected}
+        if previous is not None:
+            entry["transfers"] = {name: tally.get(name, 0) - votes
+                                  for name, votes in previous[0].items()
+                                  if tally.get(name, 0) != votes}
+        _writer.write(self.position, entry)
+        self._previous = ({name: votes for name, votes in tally.items()
+                           if name not in eliminated},
+                          set(elected) | (previous[1] if previous is not None else set()))
+
+
+def rounds(position: str) -> Callable[["RoundResult"], None]:
+    '''
+    A function writing each round of a count of position as it's passed
+    one (a tabulation method's on_round), or None if there's no trail.
+    '''
+    if _writer is None:
+        return None
+    return RoundWriter(position).round
+
+
+def count(position: str, result: "ElectionResults") -> None:
+    '''
+    Writes every round of a position's count, once it's done.
+    '''
+    if _writer is None or result is None:
+        return
+    writer = RoundWriter(position)
+    for round_ in result.rounds:
+        writer.round(round_)
+
+
+def reused(position: str) -> None:
+    '''
+    Notes that a position's last count was used again, unchanged.
+    '''
+    if _writer is not None:
+        _writer.write(position, {"reused": True})
+
+
+def winners(position: str, won: List[tuple]) -> None:
+    '''
+    Writes the winners of a position in this pass, as (candidate, their
+    ranking of it), or None if nobody's left to win it.
+    '''
+    if _writer is not None:
+        _writer.write(position, {"winners": None if won is None else
+                                 [[candidate.name, ranking] for candidate, ranking in won]})
+
+
+def seat(position: str, candidate: "Candidate", ranking: int) -> None:
+    if _writer is not None:
+        _writer.write(position, {"seat": candidate.name, "ranking": ranking})
+
+
+def removed(position: str, candidates: List["Candidate"], won: str) -> None:
+    '''
+    Writes the candidates struck off a position for winning another one.
+    '''
+    if _writer is not None:
+        _writer.write(position, {"removed": [c.name for c in candidates], "won": won})
+
+
+def read(fname: str, position: str) -> Iterator[dict]:
+    '''
+    A position's entries of an audit log in order, each with the scenario
+    it belongs to (None before the first). Only the position's lines are
+    decoded, the file is read a line at a time.
+    '''
+    prefix = '{"position":' + json.dumps(position) + ","
+    current = None
+    with open(fname, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith(prefix):
+                entry = json.loads(line)
+                entry["scenario"] = current
+                yield entry
+            elif line.startswith('{"scenario":'):
+                current = json.loads(line)["scenario"]
+
+
+def describe(entry: dict) -> str:
+    '''
+    One entry as a line of text.
+    '''
+    if "round" in entry:
+        cells = []
+        for name, votes in entry["tally"].items():
+            change = entry.get("transfers", {}).get(name)
+            cells.append("{} {:g}{}".format(name, votes, "" if change is None
+                                             else " ({:+g})".format(change)))
+        text = "round {}: {}".format(entry["round"], ", ".join(cells))
+        if entry["blank"]:
+            text += ", blank {:g}".format(entry["blank"])
+        if entry["eliminated"]:
+            text += " - eliminated " + ", ".join(entry["eliminated"])
+        if entry["elected"]:
+            text += " - elected " + ", ".join(entry["elected"])
+        return text
+    if "reused" in entry:
+        return "same count as the pass before"
+    if "winners" in entry:
+        if entry["winners"] is None:
+            return "nobody left to win it"
+        return "winners: " + ", ".join("{} (#{})".format(name, ranking)
+                                       for name, ranking in entry["winners"])
+    if "seat" in entry:
+        return "seat given to {} (their #{} choice)".format(entry["seat"], entry["ranking"])
+    if "removed" in entry:
+        return "struck off: {} (won {})".format(", ".join(entry["removed"]), entry["won"])
+    return json.dumps(entry)
+
+
+def replay(fname: str, position: str) -> Iterator[str]:
+    '''
+    A position's allocation as it happened, a line of text per entry,
+    with headers for each scenario and pass.
+    '''
+    scenario_, threshold = object(), None
+    for entry in read(fname, position):
+        if entry["scenario"] != scenario_:
+            scenario_, threshold = entry["scenario"], None
+            if scenario_ is not None:
+                yield "===SCENARIO: {}===".format(scenario_)
+        if entry["pass"] != threshold:
+            threshold = entry["pass"]
+            yield "pass (ranking threshold {}):".format(threshold)
+        yield "  " + describe(entry)
+
+
+def summary(fname: str, position: str) -> str:
+    '''
+    How a position's allocation went in short: per scenario, how many
+    times it was counted and in how many rounds, who won each pass and
+    who got its seats, and who was struck off it.
+    '''
+    runs = {}
+    for entry in read(fname, position):
+        run = runs.setdefault(entry["scenario"], {"counts": 0, "rounds": 0, "passes": [],
+                                                   "seats": [], "removed": []})
+        if "round" in entry:
+            run["rounds"] += 1
+            run["counts"] += entry["round"] == 1
+        elif "winners" in entry:
+            run["passes"].append("pass {}: {}".format(entry["pass"], describe(entry)))
+        elif "seat" in entry:
+            run["seats"].append("{} (#{})".format(entry["seat"], entry["ranking"]))
+        elif "removed" in entry:
+            run["removed"].extend("{} (won {})".format(name, entry["won"])
+                                  for name in entry["removed"])
+    lines = [position]
+    for name, run in runs.items():
+        if name is not None:
+            lines.append("===SCENARIO: {}===".format(name))
+        lines.append("counted {} time(s), {} round(s) in all".format(run["counts"],
+                                                                    run["rounds"]))
+        lines.extend(run["passes"])
+        lines.append("seats: " + (", ".join(run["seats"]) or "none"))
+        if run["removed"]:
+            lines.append("struck off: " + ", ".join(run["removed"]))
+    if len(runs) == 0:
+        lines.append("(not in the log)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarise or replay one position of an audit log.")
+    parser.add_argument("log", help="audit log (AUDIT_LOG of a run)")
+    parser.add_argument("position", help="position to look at, i.e. President")
+    parser.add_argument("--replay", action="store_true",
+                        help="show every round rather than a summary")
+    args = parser.parse_args()
+    if args.replay:
+        for text in replay(args.log, args.position):
+            print(text)
+    else:
+        print(summary(args.log, args.position))
@@ -0,0 +1,307 @@
+import json
+import os
+import numpy as np
+from pyrankvote.models import DuplicateCandidatesError
+from typing import Dict, List, Iterable, Tuple
+
+
+def rank_dtype(n_candidates: int) -> np.dtype:
+    '''
+    Smallest signed integer type able to index n_candidates
+    (and hold the negative sentinel).
+    '''
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_candidates <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def pack_rankings(rankings: List[List[int]], dtype=np.int32) -> np.ndarray:
+    '''
+    Pads a list of encoded rankings into a rank array.
+    '''
+    width = max((len(r) for r in rankings), default=0)
+    ranks = np.full((len(rankings), width), BallotMatrix.SENTINEL, dtype=dtype)
+    for row, ranking in enumerate(rankings):
+        ranks[row, :len(ranking)] = ranking
+    return ranks
+
+
+def group_rows(ranks: np.ndarray,
+               weights: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Collapses identical rankings into one row each.
+    Returns the distinct rows and how many voters cast each of them.
+    '''
+    if weights is None:
+        weights = np.ones(ranks.shape[0], dtype=np.int64)
+    if ranks.shape[0] == 0:
+        return ranks, weights
+    if ranks.shape[1] == 0:
+        return ranks[:1], np.array([weights.sum()], dtype=np.int64)
+    rows, inverse = np.unique(ranks, axis=0, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=weights,
+                         minlength=rows.shape[0]).astype(np.int64)
+    return rows, counts
+
+
+class BallotMatrix:
+    '''
+    Columnar store of every ballot cast for a single position.
+    Replaces a list of Ballot objects with one integer array, which is
+    far cheaper to build, hold and count for large electorates. The arrays
+    are read-only: elections keep track of who they've struck off
+    themselves, so any number of them can count the same matrix.
+    ...
+
+    Attributes
+    ----------
+        candidates : List[Candidate]
+            Lookup table of every candidate appearing on the ballots.
+            Entries of ranks are indices into this list.
+        ranks : np.ndarray
+            (rows x longest ranking) array of candidate indices in ranked
+            order. Rows shorter than the longest ranking are padded with
+            BallotMatrix.SENTINEL.
+        weights : np.ndarray or None
+            How many voters cast each row's ranking, if identical ballots
+            have been grouped together. None means one voter per row.
+
+    '''
+    SENTINEL = -1
+
+    def __init__(self, candidates: List["Candidate"], ranks: np.ndarray,
+                 weights: np.ndarray = None, validate: bool = True) -> None:
+        self.candidates = list(candidates)
+        # read-only views, whoever passed the arrays in can still write them
+        self.ranks = _read_only(ranks)
+        self.weights = None if weights is None else _read_only(weights)
+        self._index = {c: i for i, c in enumerate(self.candidates)}
+        if validate and BallotMatrix._has_duplicates(ranks):
+            raise DuplicateCandidatesError
+
+    @classmethod
+    def from_rankings(cls, candidates: List["Candidate"],
+                      rankings: Iterable[List[int]]) -> "BallotMatrix":
+        '''
+        Builds a matrix from rankings already encoded as lists of
+        indices into candidates.
+        '''
+        return cls(candidates, pack_rankings(list(rankings),
+                                             rank_dtype(len(candidates))))
+
+    @classmethod
+    def from_blocks(cls, candidates: List["Candidate"],
+                    blocks: List[np.ndarray],
+                    weights: List[np.ndarray] = None,
+                    path: str = None) -> "BallotMatrix":
+        '''
+        Stacks rank arrays encoded piece by piece (i.e. one per chunk of
+        a streamed file), padding them to a common width. If the blocks
+        were grouped, weights holds each block's row weights. If path is
+        given, the ranks are written to that .npy file and memory-mapped
+        from it, one block at a time, instead of being held in memory.
+        '''
+        width = max((b.shape[1] for b in blocks), default=0)
+        shape = (sum(len(b) for b in blocks), width)
+        dtype = rank_dtype(len(candidates))
+        if path is None:
+            ranks = np.full(shape, cls.SENTINEL, dtype=dtype)
+        else:
+            ranks = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                              shape=shape)
+            ranks[:] = cls.SENTINEL
+        row = 0
+        for block in blocks:
+            ranks[row:row + len(block), :block.shape[1]] = block
+            row += len(block)
+        if path is not None:
+            ranks.flush()
+            ranks = np.load(path, mmap_mode="r")
+        if weights is not None:
+            weights = np.concatenate(weights) if len(weights) > 0 \
+                else np.empty(0, dtype=np.int64)
+        return cls(candidates, ranks, weights)
+
+    @classmethod
+    def from_ballots(cls, ballots: List["Ballot"]) -> "BallotMatrix":
+        '''
+        Encodes a list of Ballot objects.
+        '''
+        index = {}
+        candidates = []
+        rankings = []
+        for ballot in ballots:
+            ranking = []
+            for candidate in ballot.ranked_candidates:
+                if candidate not in index:
+                    index[candidate] = len(candidates)
+                    candidates.append(candidate)
+                ranking.append(index[candidate])
+            rankings.append(ranking)
+        return cls.from_rankings(candidates, rankings)
+
+    @staticmethod
+    def _has_duplicates(ranks: np.ndarray, block_rows: int = 1 << 16) -> bool:
+        if ranks.shape[1] < 2:
+            return False
+        # a block of rows at a time, ranks may be bigger than memory
+        for start in range(0, ranks.shape[0], block_rows):
+            ordered = np.sort(ranks[start:start + block_rows], axis=1)
+            repeats = ((ordered[:, 1:] == ordered[:, :-1])
+                       & (ordered[:, 1:] != BallotMatrix.SENTINEL))
+            if repeats.any():
+                return True
+        return False
+
+    def row_weights(self) -> np.ndarray:
+        '''
+        How many voters each row stands for.
+        '''
+        if self.weights is None:
+            return np.ones(self.ranks.shape[0], dtype=np.int64)
+        return self.weights
+
+    def grouped(self) -> "BallotMatrix":
+        '''
+        A copy with identical rankings collapsed into weighted rows.
+        '''
+        ranks, weights = group_rows(self.ranks, self.weights)
+        return BallotMatrix(self.candidates, ranks, weights, validate=False)
+
+    def __len__(self) -> int:
+        # the number of voters, as with a List[Ballot]
+        if self.weights is None:
+            return self.ranks.shape[0]
+        return int(self.weights.sum())
+
+    def __getitem__(self, voter: int) -> "Ballot":
+        row = voter
+        if self.weights is not None:
+            row = int(np.searchsorted(np.cumsum(self.weights), voter,
+                                      side="right"))
+        return self._make_ballot(self.ranks[row].tolist())
+
+    def __iter__(self):
+        return iter(self.to_ballots())
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # candidate hashes don't survive pickling, rebuild the lookup on load
+        del state["_index"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._index = {c: i for i, c in enumerate(self.candidates)}
+        # unpickled arrays come back writeable
+        self.ranks = _read_only(self.ranks)
+        if self.weights is not None:
+            self.weights = _read_only(self.weights)
+
+    def __repr__(self) -> str:
+        return "<BallotMatrix(%i ballots, %i candidates)>" % (
+            len(self), len(self.candidates))
+
+    def index(self, candidate: "Candidate") -> int:
+        '''
+        Returns the column index of a candidate, or SENTINEL if nobody
+        ranked them.
+        '''
+        return self._index.get(candidate, BallotMatrix.SENTINEL)
+
+    def first_choices(self) -> np.ndarray:
+        '''
+        The index of each row's first choice (SENTINEL for empty ballots).
+        '''
+        if self.ranks.shape[1] == 0:
+            return np.full(self.ranks.shape[0], BallotMatrix.SENTINEL,
+                           dtype=self.ranks.dtype)
+        return self.ranks[:, 0]
+
+    def to_ballots(self, excluded: Iterable["Candidate"] = ()) -> List["Ballot"]:
+        '''
+        Compatibility view: one Ballot object per voter, for pyrankvote
+        and other code written against List[Ballot]. Candidates in excluded
+        are left off the ballots (moving lower choices up).
+        '''
+        skipped = {self._index[c] for c in excluded if c in self._index}
+        ballots = [self._make_ballot(row, skipped) for row in self.ranks.tolist()]
+        if self.weights is None:
+            return ballots
+        # grouped voters share one (read-only) Ballot object
+        return [ballot for ballot, count in zip(ballots, self.weights.tolist())
+                for _ in range(count)]
+
+    def _make_ballot(self, row: List[int], skipped: set = frozenset()) -> "Ballot":
+        from election_helper import Ballot
+        # rows are validated on construction, skip Ballot's own checks
+        return Ballot._checked([self.candidates[i] for i in row
+                                if i != BallotMatrix.SENTINEL and i not in skipped])
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    if not array.flags.writeable:
+        return array
+    view = array.view()
+    view.setflags(write=False)
+    return view
+
+
+MANIFEST = "manifest.json"
+
+
+def store_paths(directory: str, number: int) -> Tuple[str, str]:
+    # numbered rather than named, position names can contain slashes
+    return (os.path.join(directory, f"{number:03d}.ranks.npy"),
+            os.path.join(directory, f"{number:03d}.weights.npy"))
+
+
+def save_matrices(matrices: Dict[str, BallotMatrix], directory: str) -> None:
+    '''
+    Writes each position's BallotMatrix to directory: a fixed-width .npy
+    rank array per position (and its row weights, if grouped), plus a
+    manifest naming the positions and their candidates. Ranks already
+    memory-mapped from their place in the store aren't rewritten.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest = []
+    for number, (position, matrix) in enumerate(matrices.items()):
+        ranks_path, weights_path = store_paths(directory, number)
+        filename = getattr(matrix.ranks, "filename", None)
+        if filename is None or os.path.abspath(filename) != os.path.abspath(ranks_path):
+            np.save(ranks_path, matrix.ranks)
+        if matrix.weights is not None:
+            np.save(weights_path, matrix.weights)
+        elif os.path.exists(weights_path):
+            os.remove(weights_path)
+        manifest.append({"position": position,
+                         "candidates": [c.name for c in matrix.candidates],
+                         "weighted": matrix.weights is not None})
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_matrices(directory: str, candidates: Dict[str, "Candidate"],
+                  mmap_mode: str = "r") -> Dict[str, BallotMatrix]:
+    '''
+    Opens a store written by save_matrices. Rank arrays are memory-mapped
+    (unless mmap_mode is None), so they're paged in from disk as they're
+    counted, and processes opening the same store share one copy.
+    Candidates are looked up by name in candidates.
+    '''
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    matrices = {}
+    for number, entry in enumerate(manifest):
+        ranks_path, weights_path = store_paths(directory, number)
+        missing = [name for name in entry["candidates"] if name not in candidates]
+        if len(missing) > 0:
+            raise KeyError(f"Ballot store {directory} ranks unknown "
+                           f"candidates: {missing}")
+        weights = np.load(weights_path) if entry["weighted"] else None
+        # rows were validated when the store was written
+        matrices[entry["position"]] = BallotMatrix(
+            [candidates[name] for name in entry["candidates"]],
+            np.load(ranks_path, mmap_mode=mmap_mode), weights, validate=False)
+    return matrices
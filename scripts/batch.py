@@ -0,0 +1,204 @@
+'''
+Runs many variations (scenarios) of one election over the same inputs.
+
+Each scenario is a dict of settings overriding a base configuration, i.e.
+other seat counts, joints, fill-ins, MAX_POSITIONS or evaluators. The
+ballot file is only read once for all the scenarios that read it the same
+way, and the nominee file once per distinct set of candidate settings.
+Ballots are never edited (elections keep their own set of who they've
+struck off), so every scenario counts the same ballots: list ballots are
+rebuilt around the scenario's candidates, and ballot matrices share their
+rank arrays. Nothing one scenario strikes off shows up in another.
+
+Settings for the run as a whole (QUIET, EVENT_LOG, AUDIT_LOG, INSTRUMENT...)
+come from the base configuration only; the audit trail marks where each
+scenario starts. The parse cache isn't used, but the result cache is (if
+RESULT_CACHE_DIR is set), so positions a scenario leaves alone aren't
+counted again.
+
+Usage
+-----
+    from batch import run_scenarios, comparison_table
+    results = run_scenarios(elections.config(), {
+        "as configured": {},
+        "STV": {"EVALUATOR": "tabulation.single_transferable_vote"},
+        "two quartermasters": {"elec_with_multi_seats": {"Quartermaster": 2}}})
+    print(comparison_table(results))
+'''
+import audit
+import cache
+import events
+import instrument
+import runner
+from election_helper import Ballot
+
+# settings whose change means the nominee file has to be parsed again
+CANDIDATE_SETTINGS = ("CANDIDACY_FILE", "CANDIDATE_START_ROW", "MAX_POSITIONS",
+                      "SURNAME_COL", "FIRSTNAME_COL", "EMAIL_COL", "ROLES_COL",
+                      "STATUS_COL", "CAND_TYPE_COL", "TERMS_COL",
+                      "joints", "fill_ins", "names_to_change")
+# settings whose change means the ballot file has to be read again
+BALLOT_SETTINGS = ("BALLOT_FILE", "VOTING_TABLE", "VOTING_START_ROW",
+                   "FINISHED_SURVEY_COLUMN", "STUDENTNUM_COLUMN",
+                   "ELIGIBILITY_CHECKER", "DUPLICATE_VOTES", "USE_RAW_VOTING_INFO",
+                   "RAW_VOTING_OFFSET", "USE_BALLOT_MATRIX", "GROUP_BALLOTS",
+                   "BALLOT_CHUNK_SIZE", "BALLOT_STORE_DIR")
+# settings for the batch as a whole, scenarios can't change them
+RUN_SETTINGS = ("PARSE_CACHE_DIR", "RESULT_CACHE_DIR", "RESULT_CACHE_SIZE",
+                "INSTRUMENT", "INSTRUMENT_MEMORY", "INSTRUMENT_JSON",
+                "INSTRUMENT_TRACE", "QUIET", "EVENT_LOG", "AUDIT_LOG")
+
+
+def _key(settings: dict, names: tuple) -> str:
+    return cache.describe([settings[name] for name in names])
+
+
+def rebind(ballots: dict, candidates: dict) -> dict:
+    '''
+    Parsed ballots ranking the given candidates (matched by name) instead
+    of the ones they were parsed with.
+    Raises KeyError if a ballot ranks someone who isn't a candidate.
+    '''
+    rebound = {}
+    for position, pos_ballots in ballots.items():
+        def find(candidate):
+            try:
+                return candidates[candidate.name]
+            except KeyError:
+                raise KeyError(f"{candidate.name} is on the {position} ballots "
+                               "but isn't a candidate in this scenario") from None
+        if isinstance(pos_ballots, list):
+            rebound[position] = [Ballot([find(c) for c in b.ranked_candidates])
+                                 for b in pos_ballots]
+            continue
+        rebound[position] = type(pos_ballots)(
+            [find(c) for c in pos_ballots.candidates], pos_ballots.ranks,
+            pos_ballots.weights, validate=False)
+    return rebound
+
+
+def run_scenarios(config: dict, scenarios: dict) -> dict:
+    '''
+    Runs every scenario of an election.
+    Returns {scenario name: {"winners", "elections", "problems"}} as
+    run_election would for each (and "pairwise" and "stability" if asked), or
+    {"error": message} for a scenario that doesn't fit the ballots (i.e.
+    they rank a joint it leaves out).
+    ...
+
+    Arguments
+    ---------
+    config : dict
+        Base settings (see runner.DEFAULTS).
+    scenarios : dict
+        Scenario names and the settings they override, in the order to run
+        them. An empty dict runs the base configuration.
+
+    '''
+    base = runner.configure(config)
+    for name, overrides in scenarios.items():
+        for setting in overrides:
+            if setting in RUN_SETTINGS:
+                raise ValueError(f"{setting} (in scenario {name}) can only be "
+                                 "set for the whole batch")
+    all_settings = {name: runner.configure(base, **overrides)
+                    for name, overrides in scenarios.items()}
+
+    results = {}
+    parsed_candidates = {}
+    parsed_ballots = {}
+    with runner.reporting(base):
+        for name, settings in all_settings.items():
+            events.info("scenario_start", "\n===SCENARIO: {scenario}===",
+                        scenario=name)
+            with instrument.phase("scenario", scenario=name):
+                results[name] = _run_scenario(name, settings, parsed_candidates,
+                                              parsed_ballots)
+
+        events.result("scenario_comparison", "\n===SCENARIO COMPARISON===\n{table}",
+                      table=comparison_table(results),
+                      winners={name: {position: [w.name for w in winners]
+                                      for position, winners in result["winners"].items()}
+                               for name, result in results.items() if "winners" in result})
+        runner.finish_instrumentation(base)
+    return results
+
+
+def _run_scenario(name: str, settings: dict, parsed_candidates: dict,
+                  parsed_ballots: dict) -> dict:
+    '''
+    Runs one scenario, reading its candidates and ballots unless an earlier
+    scenario read them the same way (parsed_* are keyed by the settings
+    that decide that, and kept between calls).
+    '''
+    audit.scenario(name)
+    runner.apply(settings)
+    candidate_key = _key(settings, CANDIDATE_SETTINGS)
+    if candidate_key not in parsed_candidates:
+        parsed_candidates[candidate_key] = runner.parse_candidates(settings)
+    candidates = parsed_candidates[candidate_key]
+    ballot_key = _key(settings, BALLOT_SETTINGS)
+    if ballot_key not in parsed_ballots:
+        parsed_ballots[ballot_key] = runner.parse_ballots(
+            settings, candidates, runner.settings_checker(settings))
+    try:
+        ballots = rebind(parsed_ballots[ballot_key], candidates)
+        elections = runner.build_elections(
+            candidates, ballots, runner.resolve_evaluator(settings["EVALUATOR"]),
+            settings["elec_with_multi_seats"])
+    except KeyError as e:
+        # the scenario doesn't fit the ballots, the others still might
+        events.error("scenario_failed", "Scenario {scenario} failed: {reason}",
+                     scenario=name, reason=e.args[0])
+        return {"error": e.args[0]}
+    if settings["PAIRWISE"]:
+        runner.count_pairwise(elections)
+    problems = runner.allocate(elections, settings["PARALLEL_PROCESSES"])
+    result = {"winners": {e.position: list(e.final_winners) for e in elections},
+              "elections": elections, "problems": problems}
+    for problem in problems:
+        events.warning("election_issue", "{scenario}: {problem}",
+                       scenario=name, problem=problem)
+    if settings["PAIRWISE"]:
+        import pairwise
+        result["pairwise"] = pairwise.report(elections)
+    if settings["STABILITY_RESAMPLES"]:
+        import stability
+        result["stability"] = stability.report(
+            elections, settings["STABILITY_RESAMPLES"], settings["STABILITY_SEED"])
+    return result
+
+
+def comparison_table(results: dict) -> str:
+    '''
+    Winners of every position side by side, one column per scenario.
+    Positions where the scenarios disagree are marked with a *.
+    '''
+    names = list(results.keys())
+    positions = []
+    for result in results.values():
+        for position in result.get("winners", {}):
+            if position not in positions:
+                positions.append(position)
+
+    rows = [["position"] + names]
+    for position in positions:
+        cells = []
+        for name in names:
+            if "error" in results[name]:
+                cells.append("(failed)")
+            else:
+                winners = results[name]["winners"].get(position)
+                cells.append("-" if winners is None or len(winners) == 0
+                             else ", ".join(w.name for w in winners))
+        # failed scenarios don't count as disagreeing
+        counted = {cell for name, cell in zip(names, cells)
+                   if "error" not in results[name]}
+        marker = " *" if len(counted) > 1 else ""
+        rows.append([position + marker] + cells)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+             for row in rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
@@ -0,0 +1,116 @@
+'''
+On-disk cache of parsed election inputs.
+
+Parsing the nominee and ballot CSVs is the slowest part of a run that
+otherwise only changes a joint or a fill-in. Parsed results are pickled
+to a file named after a hash of the input files' contents and of the
+configuration used to parse them, so a rerun with the same inputs loads
+them straight back, and any change to the inputs misses the cache.
+'''
+import hashlib
+import inspect
+import os
+import pickle
+import events
+from typing import Any, Callable, Iterable
+
+CACHE_DIR = "../cache"
+# files whose code decides what parsing produces; part of every key
+_PARSER_FILES = ("election_helper.py", "ballot_matrix.py", "eligibility.py",
+                 "parallel_parse.py", "runner.py")
+# first line of every cache file, followed by its key. Files that don't
+# start with the key asked for are never unpickled
+_HEADER = b"election-parse-cache 1 "
+
+
+def _file_digest(fname: str) -> str:
+    digest = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe(value: Any) -> str:
+    '''
+    Stable text description of a configuration value, for hashing.
+    Handles candidates (by name, positions and info), eligibility checkers
+    and their rules (by what they check, down to the source of each test),
+    functions (by their source) and nested lists, tuples and dicts.
+    '''
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{describe(k)}: {describe(v)}"
+                               for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(describe(v) for v in value) + "]"
+    if hasattr(value, "positions") and hasattr(value, "info"):
+        return (f"Candidate({value.name!r}, {describe(list(value.positions))}, "
+                f"{value.info!s}, joint={value.joint})")
+    if hasattr(value, "rules") and hasattr(value, "studentnum_column"):
+        return (f"Eligibility({value.studentnum_column}, {describe(value.rules)}, "
+                f"duplicates={value.duplicates!r})")
+    if hasattr(value, "reason") and hasattr(value, "test"):
+        return f"Rule({value.reason!r}, {value.column}, {describe(value.test)})"
+    if callable(value):
+        try:
+            return inspect.getsource(value)
+        except (OSError, TypeError):
+            return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
+
+
+def cache_key(files: Iterable[str], *config: Any) -> str:
+    '''
+    Key for a set of input files parsed with a given configuration.
+    '''
+    key = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser_files = [os.path.join(here, f) for f in _PARSER_FILES]
+    for fname in list(files) + parser_files:
+        key.update(_file_digest(fname).encode())
+    key.update(describe(list(config)).encode())
+    return key.hexdigest()
+
+
+def _path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"parsed-{key[:32]}.pickle")
+
+
+def load(key: str, cache_dir: str = CACHE_DIR) -> Any:
+    '''
+    Returns what was stored under key, or None if nothing was. A file
+    that isn't a cache file for key (another version's, a key that only
+    shares the file name, or something else altogether) is left alone.
+    '''
+    try:
+        with open(_path(key, cache_dir), "rb") as f:
+            if f.readline(len(_HEADER) + len(key) + 1) != _HEADER + key.encode() + b"\n":
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def store(key: str, data: Any, cache_dir: str = CACHE_DIR) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(key, cache_dir)
+    # write then rename, so an interrupted run never leaves half a file
+    with open(path + ".tmp", "wb") as f:
+        f.write(_HEADER + key.encode() + b"\n")
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def cached(key: str, build: Callable[[], Any], cache_dir: str = CACHE_DIR) -> Any:
+    '''
+    Loads the data stored under key, or builds and stores it.
+    '''
+    data = load(key, cache_dir)
+    if data is not None:
+        events.info("cache_loaded",
+                    "\nLoaded parsed candidates and ballots from {file}",
+                    file=_path(key, cache_dir))
+        return data
+    data = build()
+    store(key, data, cache_dir)
+    return data
@@ -0,0 +1,141 @@
+'''
+Command line front end for run_election.
+
+Settings start from the configurables of a config file (elections.py by
+default, or any file laid out like it), then the options below and any
+--set NAME=VALUE override them. Values are read as Python literals, or
+taken as plain strings if they aren't one.
+
+    python cli.py --ballots ../data/votes.csv --quiet
+    python cli.py --config ../config/2025.py --set GROUP_BALLOTS=False
+    python cli.py --evaluator tabulation.single_transferable_vote --processes 4
+    python cli.py --scenarios ../config/what-ifs.py
+    python cli.py --stability 2000 --quiet
+    python cli.py --whatif
+    python cli.py --serve 8765
+
+A scenarios file is Python defining `scenarios`, a dict of scenario names
+and the settings each overrides. They're run over the one parsed dataset
+and compared side by side (see batch.py).
+
+--whatif and --serve read the election once and then answer what-if
+questions (a candidate withdrawing, more seats...) at a prompt or as JSON
+over HTTP on localhost (see whatif.py).
+'''
+import argparse
+import ast
+import os
+import runpy
+import sys
+from typing import List
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "elections.py")
+
+
+def parse_setting(text: str) -> tuple[str, object]:
+    '''
+    NAME=VALUE as (name, value).
+    '''
+    name, sep, value = text.partition("=")
+    if sep == "":
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text}")
+    try:
+        return name.strip(), ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name.strip(), value
+
+
+def load_config(fname: str) -> dict:
+    '''
+    The settings a config file sets, without running its election.
+    '''
+    # the runner has to be importable from wherever the config lives
+    scripts = os.path.dirname(os.path.abspath(__file__))
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    from runner import DEFAULTS
+    namespace = runpy.run_path(fname, run_name="__config__")
+    return {name: value for name, value in namespace.items() if name in DEFAULTS}
+
+
+def main(argv: List[str] = None) -> dict:
+    parser = argparse.ArgumentParser(
+        description="Run an election from a config file and overrides.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG,
+                        help="file of configurables (default: elections.py)")
+    parser.add_argument("--candidates", metavar="FILE",
+                        help="candidacy CSV (CANDIDACY_FILE)")
+    parser.add_argument("--ballots", metavar="FILE",
+                        help="ballot CSV (BALLOT_FILE)")
+    parser.add_argument("--evaluator", metavar="MODULE.FUNCTION",
+                        help="counting method, i.e. tabulation.single_transferable_vote")
+    parser.add_argument("--processes", type=int,
+                        help="count in this many worker processes (PARALLEL_PROCESSES)")
+    parser.add_argument("--parse-processes", type=int, metavar="N",
+                        help="read the ballot file in N worker processes (PARSE_PROCESSES)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't use the parse or result caches "
+                             "(PARSE_CACHE_DIR = RESULT_CACHE_DIR = None)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="only print results, warnings and errors")
+    parser.add_argument("--event-log", metavar="FILE",
+                        help="also write every event to FILE as JSON lines")
+    parser.add_argument("--audit-log", metavar="FILE",
+                        help="append every round of the count to FILE (AUDIT_LOG, see audit.py)")
+    parser.add_argument("--instrument", action="store_true",
+                        help="print phase timings and counters at the end")
+    parser.add_argument("--pairwise", action="store_true",
+                        help="report head-to-heads, Condorcet winners and ties (PAIRWISE)")
+    parser.add_argument("--stability", metavar="N", type=int,
+                        help="resample each position's ballots N times and report "
+                             "how often each candidate wins (STABILITY_RESAMPLES)")
+    parser.add_argument("--scenarios", metavar="FILE",
+                        help="run the scenarios defined in FILE and compare them")
+    parser.add_argument("--whatif", action="store_true",
+                        help="read the election once, then answer what-if questions at a prompt")
+    parser.add_argument("--serve", metavar="PORT", type=int,
+                        help="read the election once, then answer what-if questions "
+                             "POSTed as JSON to localhost:PORT/query")
+    parser.add_argument("--set", metavar="NAME=VALUE", type=parse_setting,
+                        action="append", default=[], dest="settings",
+                        help="override any configurable, i.e. --set BALLOT_CHUNK_SIZE=50000")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    options = {"CANDIDACY_FILE": args.candidates, "BALLOT_FILE": args.ballots,
+               "EVALUATOR": args.evaluator, "PARALLEL_PROCESSES": args.processes,
+               "PARSE_PROCESSES": args.parse_processes,
+               "EVENT_LOG": args.event_log, "AUDIT_LOG": args.audit_log,
+               "STABILITY_RESAMPLES": args.stability}
+    config.update({name: value for name, value in options.items()
+                   if value is not None})
+    if args.no_cache:
+        config["PARSE_CACHE_DIR"] = None
+        config["RESULT_CACHE_DIR"] = None
+    if args.quiet:
+        config["QUIET"] = True
+    if args.instrument:
+        config["INSTRUMENT"] = True
+    if args.pairwise:
+        config["PAIRWISE"] = True
+    config.update(args.settings)
+
+    from runner import DEFAULTS, run_election
+    for name in config:
+        if name not in DEFAULTS:
+            parser.error(f"unknown setting {name}")
+    if args.scenarios is not None:
+        from batch import run_scenarios
+        scenarios = runpy.run_path(args.scenarios, run_name="__config__")["scenarios"]
+        return run_scenarios(config, scenarios)
+    if args.whatif or args.serve is not None:
+        import whatif
+        if args.serve is not None:
+            return whatif.serve(config, args.serve)
+        return whatif.repl(config)
+    return run_election(config)
+
+
+if __name__ == "__main__":
+    main()
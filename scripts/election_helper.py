@@ -1,10 +1,13 @@
-import pyrankvote
-from pyrankvote.models import DuplicateCandidatesError
-import numpy as np
 import csv
-from typing import List, Generator, Callable
+import os
+import random
+import sys
+from typing import List, Generator, Callable, Union
+import instrument
+import events
 from functools import reduce
 import copy
+import itertools
 
 MAX_POSITIONS = 3  # by the constitution
 # row at which to start reading data, use to bypass testing entries/headers
@@ -24,6 +27,16 @@ CAND_TYPE_COL = 2
 ROLES_COL = 19
 TERMS_COL = 18
 
+# numpy and pyrankvote (with the ballot_matrix and tabulation modules built
+# on them) take longer to import than a small election takes to count, so
+# they're only imported by the code that needs them.
+
+
+def _is_matrix(ballots) -> bool:
+    # nothing can be a BallotMatrix before ballot_matrix has been imported
+    matrix = sys.modules.get("ballot_matrix")
+    return matrix is not None and isinstance(ballots, matrix.BallotMatrix)
+
 
 class Info:
     '''
@@ -50,12 +63,17 @@ class Info:
 
     '''
     terms = [1, 2]
+    __slots__ = ("email", "will_be_student", "available_terms", "eligible")
 
     def __init__(self, email, will_be_student, available_terms) -> None:
         self.email = email
         self.will_be_student = will_be_student
         self.available_terms = available_terms
-        self.eligible = np.all([self.will_be_student])
+        self.eligible = bool(self.will_be_student)
+
+    def _aterms(self) -> List[int]:
+        return [i for indx, i in enumerate(
+            Info.terms) if self.available_terms[indx]]
 
     def __str__(self) -> str:
         if self.will_be_student:
@@ -66,16 +84,22 @@ class Info:
             e = "eligible"
         else:
             e = "not eligible"
-        aterms = [i for indx, i in enumerate(
-            Info.terms) if self.available_terms[indx]]
+        aterms = self._aterms()
         return (f"Email: {self.email}. Will {stud}be a student. Available in terms: {aterms}, {e}.")
 
+    def _key(self) -> tuple:
+        # everything that shows up in the status string
+        return (str(self.email), bool(self.will_be_student),
+                self._aterms(), bool(self.eligible))
+
     def __eq__(self, other) -> bool:
         # equality on matching status strings
         if other is None:
             return False
         if isinstance(other, str):
             return self.__str__() == other
+        if isinstance(other, Info):
+            return self._key() == other._key()
 
         return self.__str__() == other.__str__()
 
@@ -103,8 +127,11 @@ class Candidate:
         positions : tuple[str]
             Tuple of positions the candidate is running for. Like their name,
             this has to be consistent between nominations and ballots.
+            Reassign rather than edit in place, so rank() stays in sync.
 
     """
+    __slots__ = ("name", "info", "joint", "part_of_joints", "joint_candidates",
+                 "_positions", "_ranks", "_hash")
 
     def __init__(self, name: str, positions: tuple[str], info: Info,
                  joint: bool = False, part_of_joints: List["Candidate"] = [],
@@ -114,9 +141,32 @@ class Candidate:
         self.joint = joint
         self.part_of_joints = part_of_joints
         self.positions = positions
+        self._hash = hash(name)
         if joint:
             self.joint_candidates = joint_candidates
 
+    @property
+    def positions(self):
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions) -> None:
+        self._positions = positions
+        # position -> preference ranking, first listing wins like list.index
+        self._ranks = {}
+        for ind, position in enumerate(positions):
+            self._ranks.setdefault(position, ind + 1)
+
+    def rank(self, position: str) -> int:
+        '''
+        How the candidate ranked a position they're running for
+        (1 = first choice). Raises ValueError if they aren't running for it.
+        '''
+        try:
+            return self._ranks[position]
+        except KeyError:
+            raise ValueError(f"{self.name} is not running for {position}")
+
     def __str__(self) -> str:
         return self.name
 
@@ -124,14 +174,26 @@ class Candidate:
         return "<Candidate('%s')>" % self.name
 
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
+
+    def __getstate__(self) -> dict:
+        # str hashes differ between processes, so the cached one isn't kept
+        return {slot: getattr(self, slot) for slot in Candidate.__slots__
+                if slot != "_hash" and hasattr(self, slot)}
+
+    def __setstate__(self, state: dict) -> None:
+        for slot, value in state.items():
+            object.__setattr__(self, slot, value)
+        self._hash = hash(self.name)
 
     def __eq__(self, other) -> bool:
+        if other is self:
+            return True
         if other is None:
             return False
         if isinstance(other, str):
             return self.name == other
-
+        # the name decides, as it does the hash
         return self.name == other.name
 
 
@@ -145,7 +207,9 @@ class Ballot:
     A ballot (vote) where the voter has ranked all, or just some, of the candidates.
     If a voter lists one candidate multiple times, a DuplicateCandidatesError is thrown.
 
-    For a single position election. Modified code from pyrankvote.
+    For a single position election. Modified code from pyrankvote. Ballots
+    aren't edited once made: elections skip the candidates they've struck
+    off instead (see PositionElection.excluded).
 
     """
 
@@ -153,6 +217,7 @@ class Ballot:
         self.ranked_candidates: List[Candidate] = ranked_candidates
 
         if Ballot._is_duplicates(ranked_candidates):
+            from pyrankvote.models import DuplicateCandidatesError
             raise DuplicateCandidatesError
 
         if not Ballot._is_all_candidate_objects(ranked_candidates):
@@ -161,6 +226,15 @@ class Ballot:
                 "implement the same properties and methods"
             )
 
+    @classmethod
+    def _checked(cls, ranked_candidates: List[Candidate]) -> "Ballot":
+        '''
+            A ballot of a ranking that has already passed the checks.
+        '''
+        ballot = cls.__new__(cls)
+        ballot.ranked_candidates = ranked_candidates
+        return ballot
+
     def __repr__(self) -> str:
         candidate_name = ", ".join(
             [candidate.name for candidate in self.ranked_candidates]
@@ -192,9 +266,6 @@ class Ballot:
 
         return is_candidate_like
 
-    def remove_candidate(self, can: Candidate):
-        self.ranked_candidates.remove(can)
-
 
 class PositionElection:
     '''
@@ -206,23 +277,35 @@ class PositionElection:
         The name of the position being ran for
     candidates : List[Candidate]
         List of candidates running in this election
-    ballots : List[Ballot]
-        List of voter ballots for this position
+    ballots : List[Ballot] or BallotMatrix
+        Voter ballots for this position, as read. They're never edited, so
+        elections can share them. A BallotMatrix is converted to Ballot
+        objects whenever the evaluator method needs them.
+    excluded : set
+        Candidates struck off this election (see remove_candidate). Counts
+        pass over them wherever they are on the ballots.
     evaluator_method : callable List[Candidate] List[Ballot] -> ElectionResults
         The pyrankvote (or other) method for evaluating this election
-        Default of PFV.
+        Default of PFV. The methods in tabulation.py give the same results
+        and count a BallotMatrix directly.
     seats : int
         The number of seats available for this position (i.e. quartermaster
         typically has multiple.)
     '''
 
     debug = False
+    # result_cache.ResultCache results are looked up in before counting, if any
+    result_cache = None
 
-    def __init__(self, position: str, candidates: List[Candidate], ballots: List[Ballot],
+    def __init__(self, position: str, candidates: List[Candidate],
+                 ballots: Union[List[Ballot], "BallotMatrix"],
                  evaluator_method: Callable[[
-                     List[Candidate], List[Ballot], int], pyrankvote.helpers.ElectionResults]
-                 = pyrankvote.preferential_block_voting,
+                     List[Candidate], List[Ballot], int], "ElectionResults"]
+                 = None,
                  seats=1) -> None:
+        if evaluator_method is None:
+            import pyrankvote
+            evaluator_method = pyrankvote.preferential_block_voting
         self.position = position
         self.candidates = candidates
         self.starting = copy.copy(self.candidates)
@@ -231,80 +314,247 @@ class PositionElection:
         self.seats = seats
         self.final_winners = []
         self.lastwinner = None
+        self.excluded = set()
+        # first-preference counts kept between compute_winners calls,
+        # only used with a BallotMatrix and a tabulation.py method
+        self._tally = None
+        # head-to-head counts between the starting candidates, see pairwise()
+        self._pairwise = None
+        # hash of the ballots, for result cache keys
+        self._ballot_digest = None
+
+    def fork(self) -> "PositionElection":
+        '''
+            A copy of the election as it stands (who's still running, who
+            has won so far) sharing its ballots, to try another outcome on
+            without touching this one.
+        '''
+        other = copy.copy(self)
+        other.candidates = list(self.candidates)
+        other.excluded = set(self.excluded)
+        other.final_winners = list(self.final_winners)
+        # the tally is rebuilt if counted, it changes as candidates go
+        other._tally = None
+        return other
+
+    def reset(self) -> None:
+        '''
+            Puts the election back as it was before any count: everyone who
+            started running again, and no winners.
+        '''
+        self.candidates = copy.copy(self.starting)
+        self.excluded = set()
+        self.final_winners = []
+        self.lastwinner = None
+        self._tally = None
 
-    def compute_winners(self) -> zip:
+    def compute_winners(self, election_result=None) -> zip:
         '''
             Compute the winners of a position election iteration.
             Results aren't necessarily final.
+
+            election_result can be given if the ballots have already been
+            counted elsewhere (i.e. in a worker process), otherwise the
+            evaluator method is run here.
         '''
+        with instrument.phase("compute_winners", position=self.position):
+            return self._compute_winners(election_result)
+
+    def _compute_winners(self, election_result=None) -> zip:
         if len(self.candidates) == 0:
-            print("\nNo one is running for {} anymore! :("
-                  .format(self.position))
+            events.warning("election_empty",
+                           "\nNo one is running for {position} anymore! :(",
+                           position=self.position)
             if self.lastwinner is not None:
-                print("The last person to have won this position was {} with ranking {}"
-                      .format(self.lastwinner.name,
-                              self.lastcandidate.index(self.position) + 1))
+                events.info("election_last_winner",
+                            "The last person to have won this position was {winner} with ranking {ranking}",
+                            winner=self.lastwinner.name,
+                            ranking=self.lastwinner.rank(self.position))
             else:
-                print("Nobody ever won {} as a preferred position."
-                      .format(self.position))
-                print("The original candidates were {}"
-                      .format(list([c.name for c in self.starting])))
-        if No in self.ballots[0].ranked_candidates or Yes in self.ballots[0].ranked_candidates:
+                events.info("election_never_won",
+                            "Nobody ever won {position} as a preferred position.\n"
+                            "The original candidates were {candidates}",
+                            position=self.position,
+                            candidates=list([c.name for c in self.starting]))
+        if self.is_referendum() and len(self.candidates) != 0:
             sole_candidate = self.candidates[0]
-            tracker = 0
-            for b in self.ballots:
-                # if tracker ends up positive, vote passes. else no.
-                if b.ranked_candidates[0].name == "Yes":
-                    tracker += 1
-                else:
-                    tracker -= 1
-            ranking = sole_candidate.positions.index(self.position) + 1
+            tracker = self._count_referendum()
+            ranking = sole_candidate.rank(self.position)
             if tracker >= 0:
-                print("\n{} has won {} (only candidate in role, enough yes votes)!"
-                      .format(sole_candidate.name, self.position))
-                print("Their ranking for this role is #{}".format(ranking))
+                events.info("referendum_won",
+                            "\n{candidate} has won {position} (only candidate in role, enough yes votes)!\n"
+                            "Their ranking for this role is #{ranking}",
+                            candidate=sole_candidate.name, position=self.position,
+                            ranking=ranking, net_yes_votes=tracker)
                 self.lastwinner = sole_candidate
                 result: zip[Candidate, int] = zip(
                     [self.candidates[0]], [ranking])
                 return result
 
             if tracker < 0:  # god forbid
-                print("\n{} did not win {} (only candidate in role, not enough yes votes)."
-                      .format(sole_candidate.name, self.position))
-                print("Their ranking for this role is #{}".format(ranking))
+                events.info("referendum_lost",
+                            "\n{candidate} did not win {position} (only candidate in role, not enough yes votes).\n"
+                            "Their ranking for this role is #{ranking}",
+                            candidate=sole_candidate.name, position=self.position,
+                            ranking=ranking, net_yes_votes=tracker)
                 return None
 
         elif len(self.candidates) != 0:
-            election_result = self.evaluator_method(self.candidates,
-                                                    self.ballots, self.seats)
+            if election_result is None:
+                election_result = self.count()
+            instrument.count("tabulation rounds", len(election_result.rounds))
             if PositionElection.debug:
-                print(election_result)
+                events.info("election_result", "{result}", result=election_result)
             winners = election_result.get_winners()
-            rankings = list([w.positions.index(self.position) + 1
-                             for w in winners])
-            print("\nThe following {} for {}:"
-                  .format("people have won the positions"
-                          if self.seats != 1 else
-                          "person has won the position",
-                          self.position))
-            print(["{}, who ranked it #{}".format(w, r)
-                   for w, r in zip(winners, rankings)])
+            rankings = list([w.rank(self.position) for w in winners])
+            events.info("election_winners",
+                        "\nThe following {who} for {position}:\n{described}",
+                        who="people have won the positions"
+                        if self.seats != 1 else "person has won the position",
+                        position=self.position,
+                        winners=[w.name for w in winners], rankings=rankings,
+                        described=lambda: ["{}, who ranked it #{}".format(w, r)
+                                           for w, r in zip(winners, rankings)])
             return zip(winners, rankings)
 
         # generate names and emails
 
+    def pairwise(self, candidates: List[Candidate] = None) -> "PairwisePreferences":
+        '''
+            Head-to-head counts between the candidates still running (or the
+            ones given). Counted from the ballots the first time, so call it
+            before anyone is struck off to have everyone who ran, and reused
+            after: removals don't change the others' head-to-heads.
+        '''
+        if self._pairwise is None:
+            from pairwise import PairwisePreferences
+            self._pairwise = PairwisePreferences.from_ballots(self.starting,
+                                                              self.ballots)
+        return self._pairwise.restricted(self.candidates if candidates is None
+                                         else candidates)
+
+    def is_referendum(self) -> bool:
+        '''
+            Whether this is a yes/no vote on a single candidate.
+        '''
+        first = self.ballots[0].ranked_candidates
+        return No in first or Yes in first
+
+    def count(self, on_round: Callable[["RoundResult"], None] = None) -> "ElectionResults":
+        '''
+            Runs the evaluator method over the ballots as they stand, unless
+            the result cache already has the result. on_round, if given, is
+            called with every round: as it's counted with tabulation.py's
+            methods, once the count is done with others or from the cache.
+        '''
+        result = self.cached_result()
+        if result is None:
+            state = random.getstate()
+            result = self._tabulate(on_round)
+            # a count that drew on chance (a tie settled at random, a random
+            # pick for a blank) can come out otherwise next time
+            if random.getstate() == state:
+                self.cache_result(result)
+        elif on_round is not None:
+            for round_result in result.rounds:
+                on_round(round_result)
+        return result
+
+    def cached_result(self) -> "ElectionResults":
+        '''
+            The result cache's result for the candidates still running, or
+            None if it doesn't have one (or there's no result cache).
+        '''
+        if PositionElection.result_cache is None:
+            return None
+        return PositionElection.result_cache.get(self._count_key(), self.candidates)
+
+    def cache_result(self, result: "ElectionResults") -> None:
+        '''
+            Keeps a result counted for the candidates still running in the
+            result cache, if there is one. Only for results that didn't
+            come down to chance.
+        '''
+        if PositionElection.result_cache is not None:
+            PositionElection.result_cache.put(self._count_key(), result)
+
+    def _count_key(self) -> str:
+        from result_cache import ballot_digest, count_key
+        if self._ballot_digest is None:
+            self._ballot_digest = ballot_digest(self.ballots)
+        return count_key(self.evaluator_method, self.candidates, self.seats,
+                         self._ballot_digest)
+
+    def _tabulate(self, on_round: Callable[["RoundResult"], None] = None) -> "ElectionResults":
+        if self._counts_natively():
+            import tabulation
+            if self._tally is None:
+                self._tally = tabulation.Tally(self.candidates, self.ballots)
+            return self.evaluator_method(self.candidates, self.ballots,
+                                         self.seats, tally=self._tally,
+                                         on_round=on_round)
+        result = self.evaluator_method(self.candidates,
+                                       self._evaluator_ballots(), self.seats)
+        if on_round is not None:
+            for round_result in result.rounds:
+                on_round(round_result)
+        return result
+
+    def _count_referendum(self) -> int:
+        '''
+            Net yes votes of a single-candidate (Yes/No) election.
+            If this ends up positive, the vote passes.
+        '''
+        if _is_matrix(self.ballots):
+            voted_yes = self.ballots.first_choices() == self.ballots.index(Yes)
+            yes = self.ballots.row_weights()[voted_yes].sum()
+            return int(2 * yes - len(self.ballots))
+        tracker = 0
+        for b in self.ballots:
+            if b.ranked_candidates[0].name == "Yes":
+                tracker += 1
+            else:
+                tracker -= 1
+        return tracker
+
+    def _counts_natively(self) -> bool:
+        if not _is_matrix(self.ballots):
+            return False
+        import tabulation
+        return self.evaluator_method in tabulation.NATIVE_METHODS
+
+    def _evaluator_ballots(self) -> Union[List[Ballot], "BallotMatrix"]:
+        '''
+            The ballots in a form the evaluator method can count, without
+            the candidates struck off.
+        '''
+        if self._counts_natively():
+            # tabulation.py passes over anyone not running
+            return self.ballots
+        if _is_matrix(self.ballots):
+            return self.ballots.to_ballots(self.excluded)
+        if len(self.excluded) == 0:
+            return self.ballots
+        return [Ballot._checked([c for c in ballot.ranked_candidates
+                                 if c not in self.excluded])
+                for ballot in self.ballots]
+
     def remove_candidate(self, candidate: Candidate) -> None:
         '''
             Removes a candidate from the election. Useful if they won
-            a different role. 
+            a different role. The ballots stay as they are, the candidate
+            is excluded from every count from now on.
         '''
         if candidate in self.candidates:
             self.candidates.remove(candidate)
-            for ballot in self.ballots:
-                if candidate.name in ballot.ranked_candidates:
-                    ballot.ranked_candidates.remove(candidate)
-            print("{} removed from {} election and ballots"
-                  .format(candidate, self.position))
+            self.excluded.add(candidate)
+            if self._tally is not None:
+                # only the ballots counting towards them get looked at
+                self._tally.remove_candidate(candidate)
+            instrument.count("candidates removed")
+            events.info("candidate_removed",
+                        "{candidate} removed from {position} election and ballots",
+                        candidate=candidate, position=self.position)
 
     def __str__(self) -> str:
         return ("===~Election for {}~===\n".format(self.position)
@@ -316,13 +566,34 @@ class PositionElection:
         return "<PositionElection('%s')>" % self.position
 
 
+def read_chunks(fname: str, start_row: int = 0,
+                chunk_size: int = 10000) -> Generator[List[List[str]], None, None]:
+    '''
+    Reads a csv file from start_row onwards, chunk_size rows at a time,
+    so that only one chunk of raw rows is ever held in memory.
+    '''
+    with open(fname, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+        rows = itertools.islice(reader, start_row, None)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+
 def get_ballots(fname: str, position_cols, candidates,
-                eligibility_checker=None) -> dict[str, List[Ballot]]:
+                eligibility_checker=None, as_matrix: bool = False,
+                chunk_size: int = None, group: bool = False,
+                store: str = None, processes: int = None
+                ) -> dict[str, Union[List[Ballot], "BallotMatrix"]]:
     '''
     Reads a provided qualtrics csv to get the master database of voter ballots
     to run the election off of.
 
-    Returns a dictionary of positions with a list of their respective ballots
+    Returns a dictionary of positions with a list of their respective ballots,
+    or with a BallotMatrix of them if as_matrix (or group) is set.
     ...
 
     Arguments
@@ -336,66 +607,269 @@ def get_ballots(fname: str, position_cols, candidates,
     candidates : dict{name : Candidate}
         Reference list of candidates to build ballots with
 
-    eligibility_checker : callable (str -> Bool)
+    eligibility_checker : callable (str -> Bool) or eligibility.Eligibility
         Optional function to check and filter voter eligiblity.
         Input is a line of the CSV corresponding to a ballot submission.
         It is highly recommended for this function to report why it
-        rejects a given ballot for transparency.
+        rejects a given ballot for transparency. An Eligibility checks
+        whole chunks of lines at once instead, and resolves repeat
+        submissions.
+
+    as_matrix : bool
+        Encode each position's ballots straight into a BallotMatrix
+        instead of building a Ballot object per voter per position.
+
+    chunk_size : int
+        If given, stream the file chunk_size rows at a time instead of
+        reading it all in first. Each chunk is filtered and encoded, then
+        thrown away, so memory use doesn't grow with the raw export.
+
+    group : bool
+        Collapse identical rankings into one weighted row of a BallotMatrix
+        (implies as_matrix). With only a handful of candidates per position
+        this leaves a few dozen rows however many people voted.
+
+    store : str
+        Directory to write the ballot matrices to (implies as_matrix), see
+        ballot_matrix.save_matrices. The matrices returned are memory-mapped
+        from there. With chunk_size and without group, each chunk's rows
+        are written out as they're read, so the electorate never has to
+        fit in memory at once.
+
+    processes : int
+        Read the file in byte ranges spread over this many worker
+        processes instead (see parallel_parse.py), when building matrices
+        with an eligibility.Eligibility or no checker. The ranges take the
+        place of chunks.
 
     '''
     master_ballots = {}
-    print("\nExtracting ballots from file: {}"
-          .format(fname))
-    with open(fname, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=',', quotechar='"',
-                            quoting=csv.QUOTE_MINIMAL)
-        data = list(reader)
-        f.close()
-
-    if eligibility_checker is not None:
-        print("\nEligiblity-checking function supplied, filtering...")
-        lines = list(filter(eligibility_checker, data[VOTING_START_ROW:]))
-        print("...Done")
+    as_matrix = as_matrix or group or store is not None
+    if as_matrix:
+        from ballot_matrix import BallotMatrix, save_matrices, load_matrices, store_paths
+    # ungrouped chunks go straight to disk when building a store
+    spill = store if store is not None and not group else None
+    if store is not None:
+        os.makedirs(store, exist_ok=True)
+    # per-position candidate tables, only used when building matrices
+    matrix_candidates = {}
+    # rankings of the current chunk, and rank arrays of finished chunks
+    # (along with their row weights if grouping)
+    matrix_pending = {}
+    matrix_blocks = {}
+    matrix_weights = {}
+    events.info("ballots_reading", "\nExtracting ballots from file: {file}",
+                file=fname)
+    parallel = processes is not None and as_matrix and (
+        eligibility_checker is None or hasattr(eligibility_checker, "filter_columns"))
+    if processes is not None and not parallel:
+        events.info("ballots_parallel_unavailable",
+                    "Reading ballots in one process, reading in parallel needs "
+                    "ballot matrices and an eligibility.Eligibility (or no) checker.")
+    if parallel:
+        events.info("ballots_parallel",
+                    "\nReading ballots in byte ranges over {processes} processes.",
+                    processes=processes)
+        if eligibility_checker is not None:
+            events.info("ballots_filtering",
+                        "Eligiblity-checking function supplied, filtering once read.")
+        else:
+            events.info("ballots_unfiltered",
+                        "No eligiblity-checking function supplied, using raw lines.")
+        from parallel_parse import read_ranges
+        from ballot_matrix import group_rows
+        matrix_candidates, ranks, invalid, n_ballots = read_ranges(
+            fname, position_cols, candidates, VOTING_START_ROW,
+            eligibility_checker, processes)
+        events.info("ballots_building", "Building ballot database:")
+        master_ballots = dict.fromkeys(matrix_candidates)
+        for position, position_ranks in ranks.items():
+            if group:
+                position_ranks, counts = group_rows(position_ranks)
+                matrix_weights[position] = [counts]
+            matrix_blocks[position] = [position_ranks]
+        # the ranges are read in memory, there are no blocks to spill
+        spill = None
     else:
-        print("\nNo eligiblity-checking function supplied, using raw lines.")
-        lines = data[VOTING_START_ROW:]
-
-    print("Building ballot database:")
-    for line in lines:
-        # for each ballot:
-        # MODIFY THESE IN ORDER TO HANDLE DIFFERENT FORMATS
-        # for roles, edit the file in the config folder.
-        # extract votes for each position
-        for position, column in position_cols:
-            # for each position in each ballot:
-            # get ordered list of names in ranked order
-            # generate a Ballot object.
-            # choices should be a list of names voted for.
-            column += -1
-            choices = line[int(column)].split(",")
-            candidate_choices = []
-            if "Abstain" in choices or "" in choices:
-                continue
+        if chunk_size is None:
+            with open(fname, newline='', encoding='utf-8') as f:
+                reader = csv.reader(f, delimiter=',', quotechar='"',
+                                    quoting=csv.QUOTE_MINIMAL)
+                data = list(reader)
+                f.close()
+
+            if eligibility_checker is not None:
+                events.info("ballots_filtering",
+                            "\nEligiblity-checking function supplied, filtering...")
+                if hasattr(eligibility_checker, "filter_chunks"):
+                    # columnar checks (see eligibility.py)
+                    lines = list(itertools.chain.from_iterable(
+                        eligibility_checker.filter_chunks([data[VOTING_START_ROW:]])))
+                else:
+                    lines = list(filter(eligibility_checker, data[VOTING_START_ROW:]))
+                events.info("ballots_filtered", "...Done")
             else:
-                for choice in choices:
-                    try:
-                        candidate_choices.append(candidates[choice])
-                    except KeyError:
-                        print(
-                            f"Invalid candidate pulled with {position} at column {column} ({choice})")
-                        print(
-                            "If this is a joint candidacy, double check that they're acknowledged in the list of joints in elections.py")
-                        print("Ballot database construction failed, aborting...")
-                        exit()
-            pos_ballot = Ballot(candidate_choices)
-            if position not in master_ballots.keys():
-                master_ballots.update({position: [pos_ballot]})
+                events.info("ballots_unfiltered",
+                            "\nNo eligiblity-checking function supplied, using raw lines.")
+                lines = data[VOTING_START_ROW:]
+            chunks = [lines]
+        else:
+            events.info("ballots_streaming",
+                        "\nStreaming ballots {chunk_size} rows at a time.",
+                        chunk_size=chunk_size)
+            chunks = read_chunks(fname, VOTING_START_ROW, chunk_size)
+            if eligibility_checker is not None:
+                events.info("ballots_filtering",
+                            "Eligiblity-checking function supplied, filtering as we go.")
+                if hasattr(eligibility_checker, "filter_chunks"):
+                    chunks = eligibility_checker.filter_chunks(
+                        chunks, lambda: read_chunks(fname, VOTING_START_ROW, chunk_size))
+                else:
+                    chunks = (filter(eligibility_checker, chunk) for chunk in chunks)
             else:
-                master_ballots[position].append(pos_ballot)
-    print(f"...Ballot extraction done. {len(master_ballots)} people voted!")
+                events.info("ballots_unfiltered",
+                            "No eligiblity-checking function supplied, using raw lines.")
+
+        events.info("ballots_building", "Building ballot database:")
+        # voting table columns come in as text, and count from 1. each column
+        # gets a table of the cells seen in it so far, decoded: a column holds
+        # only a few distinct rankings however many people voted
+        columns = [(position, int(column) - 1, {}) for position, column in position_cols]
+        if as_matrix:
+            # a position's candidate table is only kept once somebody votes in it
+            tables = {position: ({}, []) for position, _ in position_cols}
+        # (position, column, name) -> ballots naming someone who isn't a candidate
+        invalid = {}
+        n_ballots = 0
+        for n_ballots, line in enumerate(itertools.chain.from_iterable(
+                _flush_after(chunks, matrix_pending, matrix_blocks,
+                             matrix_weights if group else None, spill)), 1):
+            # for each ballot:
+            # MODIFY THESE IN ORDER TO HANDLE DIFFERENT FORMATS
+            # for roles, edit the file in the config folder.
+            # extract votes for each position
+            for position, column, decoded in columns:
+                # for each position in each ballot:
+                # get ordered list of names in ranked order
+                # generate a Ballot object.
+                cell = line[column]
+                try:
+                    ranking, bad = decoded[cell]
+                except KeyError:
+                    ranking, bad = decoded[cell] = _decode_cell(
+                        cell, candidates, *(tables[position] if as_matrix else ()))
+                if ranking is None:
+                    for choice in bad:
+                        invalid[(position, column, choice)] = \
+                            invalid.get((position, column, choice), 0) + 1
+                    continue
+                elif as_matrix:
+                    if position not in matrix_pending:
+                        matrix_candidates[position] = tables[position][1]
+                        matrix_pending[position] = []
+                        matrix_blocks[position] = []
+                        matrix_weights[position] = []
+                        master_ballots[position] = None
+                    # rankings are only read from here on, so cells share them
+                    matrix_pending[position].append(ranking)
+                    continue
+                # ballots are never edited (elections keep who's struck off),
+                # so voters who filled in the same cell share its ranking
+                pos_ballot = Ballot._checked(ranking)
+                if position not in master_ballots.keys():
+                    master_ballots.update({position: [pos_ballot]})
+                else:
+                    master_ballots[position].append(pos_ballot)
+    if len(invalid) > 0:
+        for (position, column, choice), count in invalid.items():
+            events.error("ballot_invalid_candidate",
+                         "Invalid candidate pulled with {position} at column {column} ({choice}) on {ballots} ballot(s)",
+                         position=position, column=column, choice=choice, ballots=count)
+        raise ValueError(
+            f"{len(invalid)} name(s) on the ballots aren't candidates, ballot "
+            "database construction failed. If this is a joint candidacy, double "
+            "check that they're acknowledged in the list of joints in elections.py")
+    for number, (position, pos_candidates) in enumerate(matrix_candidates.items()):
+        master_ballots[position] = BallotMatrix.from_blocks(
+            pos_candidates, matrix_blocks[position],
+            matrix_weights[position] if group else None,
+            store_paths(store, number)[0] if spill is not None else None)
+        if group:
+            # chunks were grouped separately, merge across them
+            master_ballots[position] = master_ballots[position].grouped()
+        if spill is not None:
+            for block in matrix_blocks[position]:
+                os.remove(block.filename)
+    if store is not None:
+        events.info("ballots_storing", "Writing ballot store to {store}",
+                    store=store)
+        save_matrices(master_ballots, store)
+        master_ballots = load_matrices(store, candidates)
+    instrument.count("ballots processed", n_ballots)
+    events.info("ballots_read",
+                "...Ballot extraction done. {positions} people voted!",
+                positions=len(master_ballots), ballots=n_ballots)
     return master_ballots
 
 
+def _decode_cell(cell: str, candidates: dict, indices: dict = None,
+                 matrix_candidates: List[Candidate] = None) -> tuple:
+    '''
+    Decodes a ballot cell ("Name A,Name B") into the ranking it holds, as
+    a list of candidates checked like a Ballot's, or with indices as their
+    columns in the position's matrix (new candidates are added to indices
+    and matrix_candidates).
+    Returns (ranking, []), (None, []) for an abstention, or (None, names)
+    with the names on it that aren't candidates.
+    '''
+    choices = cell.split(",")
+    if "Abstain" in choices or "" in choices:
+        return None, []
+    bad = [choice for choice in choices if choice not in candidates]
+    if len(bad) > 0:
+        return None, list(dict.fromkeys(bad))
+    if indices is None:
+        ranking = [candidates[choice] for choice in choices]
+        # raises as it would for any voter casting it
+        Ballot(ranking)
+        return ranking, []
+    for choice in choices:
+        if choice not in indices:
+            indices[choice] = len(indices)
+            matrix_candidates.append(candidates[choice])
+    return [indices[choice] for choice in choices], []
+
+
+def _flush_after(chunks, pending: dict[str, List[List[int]]],
+                 blocks: dict[str, List["np.ndarray"]],
+                 weights: dict[str, List["np.ndarray"]] = None,
+                 spill: str = None):
+    '''
+    Passes chunks through, packing the rankings encoded from each one
+    into a rank array once it has been read. If weights is given, each
+    chunk's identical rankings are grouped before being kept. If spill is
+    given, the arrays are kept as memory-mapped files in that directory.
+    '''
+    for chunk in chunks:
+        yield chunk
+        for number, (position, rankings) in enumerate(pending.items()):
+            if len(rankings) > 0:
+                # only ever reached when building matrices
+                import numpy as np
+                from ballot_matrix import pack_rankings, group_rows
+                ranks = pack_rankings(rankings)
+                if weights is not None:
+                    ranks, counts = group_rows(ranks)
+                    weights[position].append(counts)
+                if spill is not None:
+                    path = os.path.join(
+                        spill, f".block-{number:03d}-{len(blocks[position])}.npy")
+                    np.save(path, ranks)
+                    ranks = np.load(path, mmap_mode="r")
+                blocks[position].append(ranks)
+                pending[position] = []
+
+
 def get_candidates(fname: str,
                    joint_candidates: List[tuple[List[str],
                                                 List[str], str]] = [],
@@ -424,16 +898,13 @@ def get_candidates(fname: str,
         and election csv files.
 
     '''
-    print("Generating candidate list from list of nominees...")
-    with open(fname, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=',', quotechar='"',
-                            quoting=csv.QUOTE_MINIMAL)
-        data = list(reader)
-        f.close()
+    events.info("candidates_reading",
+                "Generating candidate list from list of nominees...", file=fname)
     # election-relevant columns only start after column 18 and row 4.
     # dummy candidate for yes/no/abstain single-candidate elections...
     candidates = {"Yes": Yes, "No": No}
-    for line in data[CANDIDATE_START_ROW:]:
+    for line in itertools.chain.from_iterable(
+            read_chunks(fname, CANDIDATE_START_ROW)):
         # MODIFY THESE TO HANDLE DIFFERENT FORMATS
         surname, firstname = line[SURNAME_COL], line[FIRSTNAME_COL]
         if firstname == "":  # fullname should be in surname in thie case
@@ -448,7 +919,9 @@ def get_candidates(fname: str,
         terms = line[TERMS_COL].split(",")  # what terms they're available for
 
         if cand_type == "Survey Preview":
-            print(f"Discarded {name}, was survey preview")
+            events.info("application_discarded",
+                        "Discarded {name}, was survey preview",
+                        name=name, reason="survey preview")
             continue
 
         if status == "Yes":
@@ -462,12 +935,18 @@ def get_candidates(fname: str,
             else:
                 terms[ind] = False
         if roles == '':
-            print(f"\nApplication for {name} discarded due to no roles",
-                  f"(is a student: {status}, email: {email})")
+            events.warning("application_discarded",
+                           "\nApplication for {name} discarded due to no roles "
+                           "(is a student: {status}, email: {email})",
+                           name=name, status=status, email=email,
+                           reason="no roles")
             continue
         if not status:
-            print(f"\nApplication for {name} discarded as they're not a student",
-                  f"(is a student: {status}, email: {email})")
+            events.warning("application_discarded",
+                           "\nApplication for {name} discarded as they're not a student "
+                           "(is a student: {status}, email: {email})",
+                           name=name, status=status, email=email,
+                           reason="not a student")
             continue
 
         info = Info(email, status, terms)
@@ -479,48 +958,60 @@ def get_candidates(fname: str,
                 positions[ind] = nts[position]
         changed = False
         if name in candidates.keys():
-            print(f"\n{name} has submitted multiple applications.")
+            events.info("application_repeated",
+                        "\n{name} has submitted multiple applications.", name=name)
             if (candidates[name].positions != positions):
-                print("Different positions in new application, using these")
-                print(f"({candidates[name].positions} -> {positions})")
+                events.info("application_updated",
+                            "Different positions in new application, using these\n"
+                            "({old} -> {new})",
+                            name=name, field="positions",
+                            old=candidates[name].positions, new=positions)
                 candidates[name].positions = positions
                 changed = True
             if (candidates[name].info != info):
-                print("Different info in new application, using this")
-                print(f"({candidates[name].info} -> {info})")
+                events.info("application_updated",
+                            "Different info in new application, using this\n"
+                            "({old} -> {new})",
+                            name=name, field="info",
+                            old=candidates[name].info, new=info)
                 candidates[name].info = info
                 changed = True
             if not changed:
-                print("No relevant differences from previous application.")
+                events.info("application_unchanged",
+                            "No relevant differences from previous application.",
+                            name=name)
         else:
-            candidates.update(
-                {name: Candidate(name, positions, info)})
+            candidate = Candidate(name, positions, info)
+            candidates.update({name: candidate})
 
-    print(f"\n{len(candidates)} total candidates.")
+    events.info("candidates_read", "\n{total} total candidates.",
+                total=len(candidates))
     # handle joint candidates, needs some tricky logic if they run for other different things individually
-    print("Handling known pairs of candidates:")
-    print(joint_candidates)
+    events.info("joints_reading", "Handling known pairs of candidates:\n{joints}",
+                joints=joint_candidates)
     for joint in joint_candidates:
         candidate_names = joint[0]
         positions = joint[1]
         joint_name = joint[2]
-        print(f"\nHandling {joint_name}")
+        events.info("joint_handling", "\nHandling {joint}", joint=joint_name)
 
         def find_cand(name):
             try:
                 return candidates[name]
             except KeyError:
-                print(
-                    f"{name} not found individually in list of candidates (could mean they didn't apply for other positions)")
+                events.info("joint_member_missing",
+                            "{name} not found individually in list of candidates (could mean they didn't apply for other positions)",
+                            name=name, joint=joint_name)
                 return None
         relevant_candidates = list(filter(lambda x: x is not None,
                                           list([find_cand(i) for i in candidate_names])))
         if len(relevant_candidates) == 0:
-            print(
-                f"Skipping {joint_name} as there don't seem to be any constituent candidates in the database.")
+            events.warning("joint_skipped",
+                           "Skipping {joint} as there don't seem to be any constituent candidates in the database.",
+                           joint=joint_name)
             continue
-        terms = np.unique(reduce(lambda x, y: x + y,  # treat the joint candidacy's availability as the sum of their combined availabilities
-                                 [c.info.terms for c in relevant_candidates]))
+        terms = sorted(set(reduce(lambda x, y: x + y,  # treat the joint candidacy's availability as the sum of their combined availabilities
+                                  [c.info.terms for c in relevant_candidates])))
         emails = [c.info.email for c in relevant_candidates]
         joint_candidate = Candidate(
             joint_name, positions, Info(emails, True, terms),
@@ -528,9 +1019,12 @@ def get_candidates(fname: str,
         for can in relevant_candidates:  # remove the joint candidacy's positions from each individual candidate
             can.part_of_joints = [joint_candidate]
             for position in positions:
-                can.positions[can.positions.index(position)] = "DUMMY"
+                dummied = list(can.positions)
+                dummied[dummied.index(position)] = "DUMMY"
+                can.positions = dummied
         candidates.update({joint_name: joint_candidate})
-        print(f"{joint_name} -> {positions}")
-    print("... Candidate building done.")
+        events.info("joint_added", "{joint} -> {positions}",
+                    joint=joint_name, positions=positions)
+    events.info("candidates_built", "... Candidate building done.")
 
     return candidates
@@ -0,0 +1,257 @@
+'''
+Columnar eligibility checks for ballot submissions.
+
+Instead of calling a function on every line of the export, the columns
+the rules need are pulled out of a whole chunk of lines at once and each
+rule is checked on its column as an array. Submissions that pass are then
+checked for repeat student numbers through a dict of student number to
+row, so somebody who submitted twice is only counted once: by default
+their latest submission (the lowest one in the export) counts.
+
+Rejections are collected rather than printed one by one, and reported
+together once the ballots have been read, by reason and student number.
+
+Usage
+-----
+    checker = Eligibility(studentnum_column=17, rules=[finished(6)],
+                          duplicates="latest")
+    lines = list(itertools.chain.from_iterable(checker.filter_chunks([lines])))
+'''
+import itertools
+from collections import Counter
+from operator import itemgetter
+from typing import Callable, Iterable, List
+import numpy as np
+import events
+
+# student numbers listed per reason in the report (the event has them all)
+LISTED = 20
+# what to do with several eligible submissions under one student number:
+# count the latest or the first of them, drop them all, or (None) count all
+DUPLICATE_POLICIES = ("latest", "first", "drop", None)
+
+
+class Rule:
+    '''
+    One requirement every counted submission has to meet.
+    ...
+
+    Attributes
+    ----------
+        reason : str
+            Why a submission failing it is rejected, i.e. "incomplete".
+        column : int
+            The column of the export it looks at.
+        test : callable (np.ndarray -> np.ndarray)
+            Takes the column's values (an object array of strings) for a
+            chunk of lines and returns whether each one passes.
+
+    '''
+    __slots__ = ("reason", "column", "test")
+
+    def __init__(self, reason: str, column: int,
+                 test: Callable[[np.ndarray], np.ndarray]) -> None:
+        self.reason = reason
+        self.column = column
+        self.test = test
+
+    def __repr__(self) -> str:
+        return "Rule(%r, %i, %s)" % (self.reason, self.column,
+                                     getattr(self.test, "__name__", self.test))
+
+
+def finished(column: int) -> Rule:
+    '''
+    Only finished surveys count.
+    '''
+    def is_finished(values: np.ndarray) -> np.ndarray:
+        return values == "TRUE"
+    return Rule("incomplete", column, is_finished)
+
+
+class Eligibility:
+    '''
+    Decides which submissions of a ballot export count.
+    ...
+
+    Attributes
+    ----------
+        studentnum_column : int
+            Column holding each submission's student number. Blank student
+            numbers are never treated as repeats.
+        rules : List[Rule]
+            Requirements checked before looking for repeats, so an
+            unfinished resubmission never knocks out a finished one.
+        duplicates : str or None
+            One of DUPLICATE_POLICIES.
+        rejected : dict
+            {reason: [student numbers]} of the submissions rejected so far.
+        counted : int
+            Submissions that passed so far.
+
+    '''
+
+    def __init__(self, studentnum_column: int, rules: List[Rule] = (),
+                 duplicates: str = "latest") -> None:
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicates must be one of {DUPLICATE_POLICIES}, "
+                             f"not {duplicates!r}")
+        self.studentnum_column = studentnum_column
+        self.rules = list(rules)
+        self.duplicates = duplicates
+        self._reset()
+
+    def __repr__(self) -> str:
+        return "Eligibility(studentnum_column=%i, rules=%r, duplicates=%r)" % (
+            self.studentnum_column, self.rules, self.duplicates)
+
+    def _reset(self) -> None:
+        self.rejected = {}
+        self.counted = 0
+        # student numbers already counted, for "first" across chunks
+        self._seen = set()
+        # decisions for every line, when worked out in a pass beforehand
+        self._decided = None
+        self._offset = 0
+
+    def needed_columns(self) -> set:
+        '''
+        Columns of the export decide() looks at.
+        '''
+        needed = {rule.column for rule in self.rules}
+        if self.duplicates is not None:
+            needed.add(self.studentnum_column)
+        return needed
+
+    def _columns(self, lines: List[List[str]]) -> dict:
+        # object arrays just point at the strings already read
+        columns = {}
+        for column in self.needed_columns():
+            values = np.empty(len(lines), dtype=object)
+            values[:] = list(map(itemgetter(column), lines))
+            columns[column] = values
+        return columns
+
+    def _reject(self, reason: str, failed: np.ndarray, columns: dict,
+                lines: List[List[str]]) -> None:
+        rows = np.flatnonzero(failed)
+        if len(rows) == 0:
+            return
+        if self.studentnum_column in columns:
+            numbers = columns[self.studentnum_column][rows].tolist()
+        else:
+            # only pulled out when looking for repeats
+            numbers = [lines[row][self.studentnum_column] for row in rows.tolist()]
+        self.rejected.setdefault(reason, []).extend(numbers)
+
+    def decide(self, columns: dict, n: int,
+               lines: List[List[str]] = None) -> np.ndarray:
+        '''
+        Whether each of n submissions counts, given the columns the rules
+        look at (and the student numbers, if looking for repeats; otherwise
+        the lines they came from). Records why the others don't.
+        '''
+        passed = np.ones(n, dtype=bool)
+        for rule in self.rules:
+            failed = passed & ~rule.test(columns[rule.column])
+            self._reject(rule.reason, failed, columns, lines)
+            passed &= ~failed
+        if self.duplicates is not None:
+            repeats = self._repeats(columns[self.studentnum_column], passed)
+            self._reject("duplicate", repeats, columns, lines)
+            passed &= ~repeats
+        self.counted += int(passed.sum())
+        return passed
+
+    def _repeats(self, numbers: np.ndarray, passed: np.ndarray) -> np.ndarray:
+        '''
+        Submissions that lose out to another one under the same student
+        number.
+        '''
+        rows = np.flatnonzero(passed & (numbers != ""))
+        keys = numbers[rows].tolist()
+        repeats = np.zeros(len(numbers), dtype=bool)
+        if self.duplicates == "drop":
+            times = Counter(keys)
+            repeats[rows] = [times[key] > 1 for key in keys]
+            return repeats
+        if self.duplicates == "latest":
+            # later rows overwrite earlier ones
+            kept = dict(zip(keys, rows.tolist()))
+        else:
+            kept = dict(zip(reversed(keys), reversed(rows.tolist())))
+            if len(self._seen) > 0:
+                kept = {key: row for key, row in kept.items() if key not in self._seen}
+            self._seen.update(kept)
+        repeats[rows] = True
+        repeats[np.fromiter(kept.values(), dtype=np.intp, count=len(kept))] = False
+        return repeats
+
+    def scan(self, chunks: Iterable[List[List[str]]]) -> None:
+        '''
+        Decides on every submission of a file read in chunks, keeping only
+        the columns needed. Needed before filtering chunk by chunk when
+        the latest submission counts (or repeats are dropped), since a
+        later chunk can overrule an earlier one.
+        '''
+        parts = [self._columns(chunk) for chunk in chunks]
+        columns = {column: np.concatenate([part[column] for part in parts])
+                   if len(parts) > 0 else np.empty(0, dtype=object)
+                   for column in self.needed_columns()}
+        self._decided = self.decide(columns, sum(len(part[self.studentnum_column])
+                                                 for part in parts))
+
+    def filter_columns(self, columns: dict, n: int) -> np.ndarray:
+        '''
+        Decides on all n submissions of a file at once, given the columns
+        it looks at (and the student numbers) for every one of them, and
+        reports the rejections. Returns whether each one counts.
+        '''
+        self._reset()
+        passed = self.decide(columns, n)
+        self.report()
+        return passed
+
+    def select(self, lines: List[List[str]]) -> List[List[str]]:
+        '''
+        The submissions of a chunk of lines that count, in order.
+        '''
+        if self._decided is not None:
+            keep = self._decided[self._offset:self._offset + len(lines)]
+        else:
+            keep = self.decide(self._columns(lines), len(lines), lines)
+        self._offset += len(lines)
+        return list(itertools.compress(lines, keep.tolist()))
+
+    def filter_chunks(self, chunks: Iterable[List[List[str]]],
+                      reread: Callable[[], Iterable[List[List[str]]]] = None):
+        '''
+        Passes each chunk through with only the submissions that count,
+        reporting the rejections at the end. Without reread the chunks are
+        taken to be the whole file in one; with it, reread() gives the
+        chunks again for a first pass if the policy on repeats needs one.
+        '''
+        self._reset()
+        if reread is not None and self.duplicates in ("latest", "drop"):
+            self.scan(reread())
+        for chunk in chunks:
+            yield self.select(chunk)
+        self.report()
+
+    def report(self) -> None:
+        '''
+        Reports how many submissions count, and who was rejected and why.
+        '''
+        events.info("ballots_eligibility",
+                    "\n{counted} ballots counted, {rejected} rejected{listing}",
+                    counted=self.counted,
+                    rejected=sum(len(numbers) for numbers in self.rejected.values()),
+                    reasons=self.rejected, listing=self._listing)
+
+    def _listing(self) -> str:
+        listing = ""
+        for reason, numbers in self.rejected.items():
+            shown = ", ".join(number or "(none)" for number in numbers[:LISTED])
+            more = f" and {len(numbers) - LISTED} more" if len(numbers) > LISTED else ""
+            listing += f"\n  {reason} ({len(numbers)}): {shown}{more}"
+        return listing
@@ -0,0 +1,198 @@
+'''
+Structured events for everything a run reports.
+
+Code reports what happened with emit() (or info(), warning(), ...): a
+level, a kind naming the event, a message template and the fields that
+fill it in. The template is only formatted if a sink actually wants text,
+and an event below every sink's level is dropped after one comparison, so
+reporting from inside loops costs next to nothing when it's filtered out.
+A field that takes work to build (a table, a listing) can be given as a
+function of no arguments instead, called only once a sink takes the event.
+
+Sinks decide where events go. By default there is one ConsoleSink printing
+the messages as the scripts always have; JsonlSink writes one JSON object
+per event for other programs to read.
+
+Usage
+-----
+    events.info("candidate_removed", "{candidate} removed from {position}",
+                candidate=candidate, position=position)
+    events.info("seats_filled", "{table}", table=lambda: make_table(elections))
+    events.quiet()  # only results, warnings and errors on the console
+    events.add_sink(events.JsonlSink("run.jsonl"))
+'''
+import json
+import sys
+import time
+from typing import List
+
+DEBUG = 10
+INFO = 20
+RESULT = 25  # outcomes worth seeing even in quiet mode
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", RESULT: "result",
+               WARNING: "warning", ERROR: "error"}
+
+
+class Event:
+    '''
+    Something that happened during a run.
+    ...
+
+    Attributes
+    ----------
+        level : int
+            How important it is (DEBUG ... ERROR).
+        kind : str
+            What happened, i.e. "candidate_removed".
+        template : str
+            Message template, filled in by str.format with fields.
+        fields : dict
+            Structured details of the event, as given: some may be
+            functions building the value (see values).
+        time : float
+            When it happened (seconds since the epoch).
+
+    '''
+    __slots__ = ("level", "kind", "template", "fields", "time", "_values", "_text")
+
+    def __init__(self, level: int, kind: str, template: str, fields: dict) -> None:
+        self.level = level
+        self.kind = kind
+        self.template = template
+        self.fields = fields
+        self.time = time.time()
+        self._values = None
+        self._text = None
+
+    def values(self) -> dict:
+        '''
+        The fields with any given as functions built, once.
+        '''
+        if self._values is None:
+            self._values = {name: value() if callable(value) else value
+                            for name, value in self.fields.items()}
+        return self._values
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.template.format(**self.values())
+        return self._text
+
+
+class ConsoleSink:
+    '''
+    Prints event messages, as the scripts' plain output.
+    Writes to stream, or whatever sys.stdout is at the time if None.
+    '''
+
+    def __init__(self, level: int = INFO, stream=None) -> None:
+        self.level = level
+        self.stream = stream
+
+    def handle(self, event: Event) -> None:
+        print(event.text(), file=self.stream if self.stream is not None
+              else sys.stdout)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlSink:
+    '''
+    Writes each event as a line of JSON: its time, level, kind, message
+    and, under "fields", its fields (anything not JSON-serializable, like a
+    Candidate, as str).
+    '''
+
+    def __init__(self, fname: str, level: int = DEBUG) -> None:
+        self.level = level
+        self._file = open(fname, "w", encoding="utf-8")
+
+    def handle(self, event: Event) -> None:
+        record = {"time": event.time, "level": LEVEL_NAMES.get(event.level, event.level),
+                  "kind": event.kind, "message": event.text().strip("\n"),
+                  "fields": event.values()}
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+_sinks = [ConsoleSink()]
+# lowest level any sink takes, anything under it is dropped straight away
+_threshold = INFO
+
+
+def _update_threshold() -> None:
+    global _threshold
+    _threshold = min((sink.level for sink in _sinks), default=ERROR + 1)
+
+
+def sinks() -> List[object]:
+    return list(_sinks)
+
+
+def add_sink(sink) -> None:
+    _sinks.append(sink)
+    _update_threshold()
+
+
+def remove_sink(sink) -> None:
+    _sinks.remove(sink)
+    sink.close()
+    _update_threshold()
+
+
+def set_level(sink, level: int) -> None:
+    sink.level = level
+    _update_threshold()
+
+
+def quiet(level: int = RESULT) -> None:
+    '''
+    Only shows events of at least level (results, warnings and errors by
+    default) on the console. Other sinks are left as they are.
+    '''
+    for sink in _sinks:
+        if isinstance(sink, ConsoleSink):
+            sink.level = level
+    _update_threshold()
+
+
+def close() -> None:
+    '''
+    Closes every sink but the console, to flush files at the end of a run.
+    '''
+    for sink in [s for s in _sinks if not isinstance(s, ConsoleSink)]:
+        remove_sink(sink)
+
+
+def emit(level: int, kind: str, template: str, **fields) -> None:
+    if level < _threshold:
+        return
+    event = Event(level, kind, template, fields)
+    for sink in _sinks:
+        if level >= sink.level:
+            sink.handle(event)
+
+
+def debug(kind: str, template: str, **fields) -> None:
+    emit(DEBUG, kind, template, **fields)
+
+
+def info(kind: str, template: str, **fields) -> None:
+    emit(INFO, kind, template, **fields)
+
+
+def result(kind: str, template: str, **fields) -> None:
+    emit(RESULT, kind, template, **fields)
+
+
+def warning(kind: str, template: str, **fields) -> None:
+    emit(WARNING, kind, template, **fields)
+
+
+def error(kind: str, template: str, **fields) -> None:
+    emit(ERROR, kind, template, **fields)
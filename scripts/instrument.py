@@ -0,0 +1,197 @@
+'''
+Phase timings and counters for a run.
+
+Off by default, in which case phase() hands back one shared do-nothing
+context and count() returns straight away, so the calls can stay in the
+code for good. Once enabled, every phase records its wall time (and, if
+asked for, the memory it allocated and its peak), nested inside whatever
+phase was running, and counters add up. The results can be written as
+JSON, or as a trace for chrome://tracing or ui.perfetto.dev.
+
+Usage
+-----
+    instrument.enable(trace_memory=True)
+    with instrument.phase("parse ballots", file=fname):
+        ...
+    instrument.count("ballots processed", n)
+    instrument.write_json("run.json")
+'''
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+from typing import List
+
+_NULL_PHASE = contextlib.nullcontext()
+_recorder = None
+
+
+class Recorder:
+    '''
+    Collects the phases and counters of a run.
+    ...
+
+    Attributes
+    ----------
+        phases : List[dict]
+            Finished phases in the order they started, each
+            {"name", "args", "depth", "start", "seconds"}, plus
+            "allocated_bytes" and "peak_bytes" when tracing memory.
+            Start is in seconds since the recorder was made.
+        counters : dict[str, int]
+            Running totals by name.
+        trace_memory : bool
+            Whether allocations are traced (with tracemalloc, which slows
+            pure-Python code down noticeably).
+
+    '''
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.phases = []
+        self.counters = {}
+        self.trace_memory = trace_memory
+        self._origin = time.perf_counter()
+        self._open = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, name: str, **args) -> None:
+        record = {"name": name, "args": args, "depth": len(self._open)}
+        # keep our place in the list, phases are listed by when they began
+        self.phases.append(None)
+        record["_slot"] = len(self.phases) - 1
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if len(self._open) > 0:
+                # the parent's peak so far, before it's reset for this phase
+                parent = self._open[-1]
+                parent["_peak"] = max(parent["_peak"], peak)
+            record["_memory"] = current
+            record["_peak"] = current
+            tracemalloc.reset_peak()
+        record["start"] = time.perf_counter() - self._origin
+        self._open.append(record)
+
+    def stop(self) -> None:
+        end = time.perf_counter() - self._origin
+        record = self._open.pop()
+        record["seconds"] = end - record["start"]
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, record.pop("_peak"))
+            # both relative to what was allocated when the phase started
+            before = record.pop("_memory")
+            record["allocated_bytes"] = current - before
+            record["peak_bytes"] = peak - before
+            if len(self._open) > 0:
+                parent = self._open[-1]
+                parent["_peak"] = max(parent["_peak"], peak)
+        self.phases[record.pop("_slot")] = record
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> str:
+        '''
+        Human-readable table of the phases and counters.
+        '''
+        lines = ["\n===INSTRUMENTATION==="]
+        for record in self.phases:
+            if record is None:
+                continue
+            label = "  " * record["depth"] + record["name"]
+            if record["args"]:
+                label += " (" + ", ".join(f"{k}={v}" for k, v in
+                                          record["args"].items()) + ")"
+            line = f"{label:<60} {record['seconds']:>9.4f}s"
+            if "peak_bytes" in record:
+                line += (f" {record['allocated_bytes'] / 2 ** 20:>9.2f} MiB kept"
+                         f" {record['peak_bytes'] / 2 ** 20:>9.2f} MiB peak")
+            lines.append(line)
+        for name, total in self.counters.items():
+            lines.append(f"{name}: {total}")
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {"phases": [p for p in self.phases if p is not None],
+                "counters": dict(self.counters)}
+
+    def to_trace(self) -> dict:
+        '''
+        The run in Chrome's trace event format.
+        '''
+        pid = os.getpid()
+        events = []
+        for record in self.phases:
+            if record is None:
+                continue
+            args = {k: str(v) for k, v in record["args"].items()}
+            for key in ("allocated_bytes", "peak_bytes"):
+                if key in record:
+                    args[key] = record[key]
+            events.append({"name": record["name"], "ph": "X", "pid": pid,
+                           "tid": 0, "ts": record["start"] * 1e6,
+                           "dur": record["seconds"] * 1e6, "args": args})
+        end = max((e["ts"] + e["dur"] for e in events), default=0)
+        events.append({"name": "counters", "ph": "C", "pid": pid, "tid": 0,
+                       "ts": end, "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def enable(trace_memory: bool = False) -> Recorder:
+    '''
+    Starts recording, dropping anything recorded before.
+    '''
+    global _recorder
+    _recorder = Recorder(trace_memory)
+    return _recorder
+
+
+def disable() -> None:
+    global _recorder
+    if _recorder is not None and _recorder.trace_memory:
+        tracemalloc.stop()
+    _recorder = None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def recorder() -> Recorder:
+    return _recorder
+
+
+@contextlib.contextmanager
+def _phase(name: str, args: dict):
+    _recorder.start(name, **args)
+    try:
+        yield
+    finally:
+        _recorder.stop()
+
+
+def phase(name: str, **args):
+    '''
+    Context manager timing a phase of the run. Keyword arguments are kept
+    with it (i.e. which position was counted).
+    '''
+    if _recorder is None:
+        return _NULL_PHASE
+    return _phase(name, args)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _recorder is not None:
+        _recorder.count(name, n)
+
+
+def write_json(fname: str) -> None:
+    with open(fname, "w", encoding="utf-8") as f:
+        json.dump(_recorder.to_json(), f, indent=1, default=str)
+
+
+def write_trace(fname: str) -> None:
+    with open(fname, "w", encoding="utf-8") as f:
+        json.dump(_recorder.to_trace(), f, default=str)
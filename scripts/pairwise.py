@@ -0,0 +1,221 @@
+'''
+Head-to-head (pairwise) preference counts between a position's candidates.
+
+For every pair of candidates, how many voters ranked one above the other,
+a candidate ranked anywhere counting as above one left off the ballot. The
+counts come from one pass over the rank array, a rank column at a time,
+and never change as candidates are struck off: removing someone doesn't
+move anyone else above or below each other. So they're worked out once
+per position, before the count, and reused for Condorcet checks, tie
+diagnostics and tie-breaks without going back to the ballots.
+
+Usage
+-----
+    prefs = election.pairwise()
+    prefs.condorcet_winner()        # Candidate("Nick Riviera") or None
+    prefs.head_to_head(a, b)        # (voters preferring a, preferring b)
+    print(prefs.table())
+'''
+import numpy as np
+from typing import List, Union
+import events
+import instrument
+from ballot_matrix import BallotMatrix
+
+# rows of the rank array counted at once, ranks may be bigger than memory
+BLOCK_ROWS = 1 << 16
+
+
+def preference_matrix(candidates: List["Candidate"],
+                      ballots: Union[List["Ballot"], BallotMatrix]) -> np.ndarray:
+    '''
+    (candidates x candidates) array, [i, j] being how many voters ranked
+    candidates[i] above candidates[j]. Anyone on the ballots who isn't
+    among candidates is passed over.
+    '''
+    matrix = ballots if isinstance(ballots, BallotMatrix) \
+        else BallotMatrix.from_ballots(ballots)
+    n = len(candidates)
+    # rank entries to candidate slots; n (dropped at the end) is everyone
+    # else, and the last entry is what padding looks up
+    lookup = np.full(len(matrix.candidates) + 1, n, dtype=np.intp)
+    for slot, candidate in enumerate(candidates):
+        column = matrix.index(candidate)
+        if column != BallotMatrix.SENTINEL:
+            lookup[column] = slot
+
+    above = np.zeros((n + 1, n + 1))
+    weights = matrix.row_weights()
+    for start in range(0, matrix.ranks.shape[0], BLOCK_ROWS):
+        ranks = np.asarray(matrix.ranks[start:start + BLOCK_ROWS])
+        block_weights = weights[start:start + BLOCK_ROWS].astype(float)
+        rows = np.arange(len(ranks))
+        unranked = np.ones((len(ranks), n + 1))
+        for k in range(ranks.shape[1]):
+            slots = lookup[ranks[:, k]]
+            unranked[rows, slots] = 0.0
+            # this choice is above everyone the ballot hasn't ranked yet
+            chosen = np.zeros((len(ranks), n + 1))
+            chosen[rows, slots] = block_weights
+            above += chosen.T @ unranked
+    return np.rint(above[:n, :n]).astype(np.int64)
+
+
+class PairwisePreferences:
+    '''
+    Pairwise preference counts between the candidates of one position.
+    ...
+
+    Attributes
+    ----------
+        candidates : List[Candidate]
+            The candidates, in the order of the rows and columns of wins.
+        wins : np.ndarray
+            (candidates x candidates) array, [i, j] being how many voters
+            ranked candidates[i] above candidates[j].
+
+    '''
+
+    def __init__(self, candidates: List["Candidate"], wins: np.ndarray) -> None:
+        self.candidates = list(candidates)
+        self.wins = wins
+        self._index = {c: i for i, c in enumerate(self.candidates)}
+
+    @classmethod
+    def from_ballots(cls, candidates: List["Candidate"],
+                     ballots: Union[List["Ballot"], BallotMatrix]) -> "PairwisePreferences":
+        with instrument.phase("pairwise"):
+            return cls(candidates, preference_matrix(candidates, ballots))
+
+    def __repr__(self) -> str:
+        return "<PairwisePreferences(%i candidates)>" % len(self.candidates)
+
+    def restricted(self, candidates: List["Candidate"]) -> "PairwisePreferences":
+        '''
+        The same counts between fewer candidates (i.e. those still running).
+        '''
+        slots = [self._index[c] for c in candidates]
+        return PairwisePreferences(candidates, self.wins[np.ix_(slots, slots)])
+
+    def margins(self) -> np.ndarray:
+        '''
+        [i, j] is how many more voters prefer candidates[i] to candidates[j]
+        than the other way around.
+        '''
+        return self.wins - self.wins.T
+
+    def head_to_head(self, a: "Candidate", b: "Candidate") -> tuple[int, int]:
+        '''
+        Voters preferring a to b, and b to a.
+        '''
+        i, j = self._index[a], self._index[b]
+        return int(self.wins[i, j]), int(self.wins[j, i])
+
+    def copeland_scores(self) -> np.ndarray:
+        '''
+        Head-to-heads each candidate wins, a tie counting as half.
+        '''
+        margins = self.margins()
+        ties = (margins == 0).sum(axis=1) - 1  # not against themselves
+        return (margins > 0).sum(axis=1) + ties / 2.0
+
+    def condorcet_winner(self) -> "Candidate":
+        '''
+        The candidate beating every other head to head, if there is one.
+        '''
+        beaten = (self.margins() > 0).sum(axis=1)
+        for slot in np.flatnonzero(beaten == len(self.candidates) - 1):
+            return self.candidates[slot]
+        return None
+
+    def condorcet_loser(self) -> "Candidate":
+        '''
+        The candidate losing to every other head to head, if there is one.
+        '''
+        if len(self.candidates) < 2:
+            return None
+        lost = (self.margins() < 0).sum(axis=1)
+        for slot in np.flatnonzero(lost == len(self.candidates) - 1):
+            return self.candidates[slot]
+        return None
+
+    def smith_set(self) -> List["Candidate"]:
+        '''
+        The fewest candidates who each beat or tie everyone outside them;
+        just the Condorcet winner if there is one, otherwise a cycle.
+        '''
+        if len(self.candidates) == 0:
+            return []
+        margins = self.margins()
+        order = np.argsort(-self.copeland_scores(), kind="stable")
+        for size in range(1, len(order) + 1):
+            inside, outside = order[:size], order[size:]
+            if (margins[np.ix_(inside, outside)] >= 0).all():
+                return [self.candidates[slot] for slot in inside]
+        return [self.candidates[slot] for slot in order]
+
+    def break_tie(self, tied: List["Candidate"]) -> List["Candidate"]:
+        '''
+        Tied candidates ordered by their head-to-heads among themselves:
+        most won first, then by total margin over the others. Any still
+        level keep their order.
+        '''
+        among = self.restricted(tied)
+        margins = among.margins().sum(axis=1)
+        order = np.lexsort((np.arange(len(tied)), -margins, -among.copeland_scores()))
+        return [tied[slot] for slot in order]
+
+    def table(self, candidates: List["Candidate"] = None) -> str:
+        '''
+        Head-to-head counts as text, row candidates against column
+        candidates (numbered as in the rows).
+        '''
+        prefs = self if candidates is None else self.restricted(candidates)
+        names = [str(c) for c in prefs.candidates]
+        width = max([len(str(int(prefs.wins.max(initial=0))))] +
+                    [len(str(len(names)))])
+        name_width = max((len(name) for name in names), default=0)
+        lines = [" " * (name_width + 6) + "  ".join(
+            str(number).rjust(width) for number in range(1, len(names) + 1))]
+        for i, name in enumerate(names):
+            cells = ["-".rjust(width) if i == j else str(int(prefs.wins[i, j])).rjust(width)
+                     for j in range(len(names))]
+            lines.append(f"{i + 1:>2}. {name.ljust(name_width)}  " + "  ".join(cells))
+        return "\n".join(lines)
+
+
+def report(elections: List["PositionElection"]) -> dict:
+    '''
+    Reports each position's Condorcet winner (or the cycle at the top when
+    there isn't one) among everyone who ran, and the head-to-heads of
+    winners who tied for the seats.
+    Returns {position: PairwisePreferences}.
+    '''
+    events.result("pairwise_header", "\n===HEAD TO HEAD===")
+    found = {}
+    for election in elections:
+        if election.is_referendum() or len(election.starting) < 2:
+            continue
+        prefs = election.pairwise(election.starting)
+        found[election.position] = prefs
+        winner = prefs.condorcet_winner()
+        if winner is not None:
+            events.result("condorcet_winner", "{position}: {winner} beats everyone head to head",
+                          position=election.position, winner=winner.name,
+                          elected=[w.name for w in election.final_winners])
+        else:
+            top = [c.name for c in prefs.smith_set()]
+            events.result("condorcet_cycle", "{position}: no Condorcet winner, cycle between {listing}",
+                          position=election.position, smith_set=top,
+                          elected=[w.name for w in election.final_winners],
+                          listing=", ".join(top))
+
+        if len(election.final_winners) > election.seats:
+            tied = prefs.break_tie(list(dict.fromkeys(election.final_winners)))
+            events.warning("tie_head_to_head",
+                           "{position} winners head to head (best first: {order}):\n{table}",
+                           position=election.position,
+                           order=", ".join(c.name for c in tied),
+                           table=prefs.table(tied),
+                           wins=prefs.restricted(tied).wins.tolist())
+    return found
@@ -0,0 +1,190 @@
+'''
+Counts every open position election of an allocation iteration at once,
+spread over a pool of worker processes.
+
+Each election's ballots are copied into shared memory once, when the
+ParallelCounter is made. After that, a count only sends the workers which
+candidates are still running, and gets back the rounds with candidates as
+integer ids, which are then put back together in the order the elections
+were given.
+'''
+import multiprocessing
+import random
+from multiprocessing import shared_memory
+import numpy as np
+from pyrankvote.helpers import CandidateResult, ElectionResults, RoundResult
+from typing import List
+from ballot_matrix import BallotMatrix
+import tabulation
+
+
+class ParallelCounter:
+    '''
+    Pool of worker processes sharing a set of elections' ballots.
+    ...
+
+    Attributes
+    ----------
+        processes : int
+            Number of worker processes.
+
+    Usage
+    -----
+        counter = ParallelCounter(elections, 4)
+        results = counter.count(elections)  # in the same order as elections
+        ...
+        counter.close()
+
+    '''
+
+    def __init__(self, elections: List["PositionElection"], processes: int) -> None:
+        self.processes = processes
+        self._blocks = []
+        # election -> (ranks descriptor, weights descriptor, candidates)
+        self._shared = {}
+        for election in elections:
+            if isinstance(election.ballots, BallotMatrix):
+                matrix = election.ballots
+            else:
+                matrix = BallotMatrix.from_ballots(election.ballots)
+            self._shared[election] = (self._share(matrix.ranks),
+                                      self._share(matrix.row_weights()),
+                                      list(matrix.candidates))
+        # workers are forked where possible, so they don't rerun the
+        # script that made them
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "fork" if "fork" in methods else None)
+        self._pool = context.Pool(processes)
+
+    def _share(self, array: np.ndarray) -> tuple:
+        '''
+        Copies an array into a new shared memory block. Returns what a
+        worker needs to find it: (block name, shape, dtype). Arrays
+        memory-mapped read-only from a .npy file aren't copied, workers
+        map the same file instead: (None, file name, None).
+        '''
+        if isinstance(array, np.memmap) and array.filename is not None \
+                and array.mode == "r":
+            return (None, array.filename, None)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[:] = array
+        self._blocks.append(block)
+        return (block.name, array.shape, array.dtype.str)
+
+    def count(self, elections: List["PositionElection"]) -> List[ElectionResults]:
+        '''
+        Counts the given elections in parallel. Returns their results in
+        the same order, with None for elections that don't need counting
+        (yes/no votes, or nobody left running). Results already in the
+        elections' result cache aren't counted again.
+        '''
+        tasks = []
+        counted = []
+        results = {}
+        for election in elections:
+            if len(election.candidates) == 0 or election.is_referendum():
+                continue
+            results[election] = election.cached_result()
+            if results[election] is not None:
+                continue
+            ranks, weights, matrix_candidates = self._shared[election]
+            # candidates travel as integer ids: their column in the shared
+            # matrix counting from 1, or a new id if nobody ranked them
+            columns = {c: i for i, c in enumerate(matrix_candidates, 1)}
+            ids = []
+            for candidate in election.candidates:
+                ids.append(columns.get(candidate,
+                                       len(matrix_candidates) + 1 + len(ids)))
+            tasks.append((ranks, weights, len(matrix_candidates), ids,
+                          election.seats, election.evaluator_method))
+            counted.append((election, dict(zip(ids, election.candidates))))
+
+        stripped = self._pool.map(_count, tasks) if len(tasks) > 0 else []
+        for (election, by_id), (rounds, chance) in zip(counted, stripped):
+            results[election] = _restore(rounds, by_id)
+            if not chance:
+                election.cache_result(results[election])
+        return [results.get(election) for election in elections]
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self) -> "ParallelCounter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _attach(descriptor: tuple, blocks: list) -> np.ndarray:
+    '''
+    The array a descriptor from ParallelCounter._share points to. Shared
+    memory attached on the way is added to blocks, for the caller to close.
+    '''
+    name, shape, dtype = descriptor
+    if name is None:
+        # a read-only .npy file, shape holds its file name
+        return np.load(shape, mmap_mode="r")
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _count(task) -> tuple:
+    '''
+    Worker side of ParallelCounter.count: counts one election over the
+    shared ballots, with integer ids standing in for candidates.
+    Returns (rounds, whether the count drew on chance).
+    '''
+    blocks = []
+    state = random.getstate()
+    try:
+        return _count_attached(task, blocks), random.getstate() != state
+    finally:
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # a count that failed can leave the arrays in its traceback,
+                # the block is unmapped when the traceback goes
+                pass
+
+
+def _count_attached(task, blocks: list) -> List[tuple]:
+    ranks, weights, n_columns, ids, seats, method = task
+    # candidates are stood in for by their column number, counting from 1:
+    # pyrankvote skips a candidate that's falsy when handing votes on
+    matrix = BallotMatrix(range(1, n_columns + 1), _attach(ranks, blocks),
+                          _attach(weights, blocks), validate=False)
+    if method in tabulation.NATIVE_METHODS:
+        result = method(ids, matrix, seats)
+    else:
+        # ballots given to pyrankvote can only name running candidates
+        running = set(ids)
+        ballots = matrix.to_ballots()
+        for ballot in ballots:
+            ballot.ranked_candidates = [c for c in ballot.ranked_candidates
+                                        if c in running]
+        result = method(ids, ballots, seats)
+    return [([tuple(r) for r in round_.candidate_results],
+             round_.number_of_blank_votes) for round_ in result.rounds]
+
+
+def _restore(rounds: List[tuple], by_id: dict) -> ElectionResults:
+    '''
+    Rebuilds a worker's ElectionResults around the real candidates.
+    '''
+    results = ElectionResults()
+    for candidate_results, blank_votes in rounds:
+        results.register_round_results(RoundResult(
+            [CandidateResult(by_id[i], votes, status)
+             for i, votes, status in candidate_results],
+            blank_votes))
+    return results
@@ -0,0 +1,248 @@
+'''
+Reads a large ballot export in several worker processes at once.
+
+The file is cut into byte ranges that each start and end on a record
+boundary. A newline only ends a record when an even number of quotes came
+before it since the last boundary (quoted cells can hold newlines, and a
+quote inside one is written twice), so boundaries are found with one pass
+counting quotes rather than by parsing. Each worker reads and parses its
+own range, decodes the ranking cells into candidate indices of its own
+and hands back per-position rank arrays, along with the columns the
+eligibility rules look at.
+
+Back in the calling process, each range's indices are mapped onto the
+position's candidate table and the arrays are stacked in file order. The
+eligibility rules are then checked over the whole file's columns at once,
+and the rows that don't count are dropped. Candidate tables end up in the
+order of the first ballot naming each candidate, as when reading the file
+in one go, so the matrices are the same as get_ballots builds alone.
+
+Usage
+-----
+    tables, ranks, invalid, n_ballots = read_ranges(
+        "../data/votes.csv", [("President", 20)], candidates, start_row=3,
+        eligibility_checker=checker, processes=4)
+'''
+import csv
+import io
+import mmap
+import multiprocessing
+from typing import List, Tuple
+import numpy as np
+import instrument
+from ballot_matrix import BallotMatrix, pack_rankings
+from election_helper import _decode_cell
+
+# ranges per worker process, so a slow range doesn't hold the rest up
+RANGES_PER_PROCESS = 4
+# bytes counted at a time when looking for boundaries
+SCAN_BLOCK = 1 << 24
+
+
+def _count_quotes(data: mmap.mmap, start: int, end: int) -> int:
+    count = 0
+    for block in range(start, end, SCAN_BLOCK):
+        count += data[block:min(block + SCAN_BLOCK, end)].count(b'"')
+    return count
+
+
+def _record_end(data: mmap.mmap, start: int, quotes: int = 0) -> int:
+    '''
+    Where the record running on from start ends, given the quotes since
+    the record began. The end of the file if it doesn't.
+    '''
+    while True:
+        newline = data.find(b"\n", start)
+        if newline == -1:
+            return len(data)
+        quotes += _count_quotes(data, start, newline)
+        if quotes % 2 == 0:
+            return newline + 1
+        start = newline + 1
+
+
+def byte_ranges(fname: str, start_row: int = 0,
+                parts: int = 1) -> List[Tuple[int, int]]:
+    '''
+    Splits a csv file from start_row onwards into about parts byte ranges
+    of whole records, in order. Assumes cells are quoted whenever they
+    hold a quote, as Qualtrics (and the csv module) write them.
+    '''
+    with open(fname, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return []
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with data:
+        start = 0
+        for _ in range(start_row):
+            start = _record_end(data, start)
+        first, size = start, len(data) - start
+        ranges = []
+        for part in range(1, parts + 1):
+            if start >= len(data):
+                break
+            target = max(first + size * part // parts, start)
+            # the boundary after target, counting quotes from this range's start
+            end = len(data) if part == parts else \
+                _record_end(data, target, _count_quotes(data, start, target))
+            if end > start:
+                ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(task) -> tuple:
+    '''
+    Worker side of read_ranges: parses one byte range, decoding the
+    ranking cells with indices into tables of its own.
+    Returns (rows, {column: [cells]} of the eligibility columns,
+    [(names, rows, ranks)] per position, [(row, position number, name)]
+    of the names that aren't candidates).
+    '''
+    fname, start, end, columns, names, eligibility_columns = task
+    with open(fname, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    lines = csv.reader(io.StringIO(text, newline=""), delimiter=",", quotechar='"',
+                       quoting=csv.QUOTE_MINIMAL)
+    tables = [({}, []) for _ in columns]
+    decoded = [{} for _ in columns]
+    voted = [[] for _ in columns]
+    rankings = [[] for _ in columns]
+    kept = {column: [] for column in eligibility_columns}
+    invalid = []
+    row = -1
+    for row, line in enumerate(lines):
+        for column, cells in kept.items():
+            cells.append(line[column])
+        for number, column in enumerate(columns):
+            cell = line[column]
+            try:
+                ranking, bad = decoded[number][cell]
+            except KeyError:
+                ranking, bad = decoded[number][cell] = _decode_cell(
+                    cell, names, *tables[number])
+            if ranking is None:
+                invalid.extend((row, number, choice) for choice in bad)
+                continue
+            voted[number].append(row)
+            rankings[number].append(ranking)
+    positions = [(tables[number][1], np.array(voted[number], dtype=np.int64),
+                  pack_rankings(rankings[number]))
+                 for number in range(len(columns))]
+    return row + 1, kept, positions, invalid
+
+
+def _stack(blocks: List[np.ndarray]) -> np.ndarray:
+    width = max((block.shape[1] for block in blocks), default=0)
+    ranks = np.full((sum(len(block) for block in blocks), width),
+                    BallotMatrix.SENTINEL, dtype=np.int32)
+    row = 0
+    for block in blocks:
+        ranks[row:row + len(block), :block.shape[1]] = block
+        row += len(block)
+    return ranks
+
+
+def _merge(parts: List[tuple], keep: np.ndarray) -> Tuple[list, np.ndarray, int]:
+    '''
+    One position's ranges put together: (names, rows, ranks) per range,
+    in order, with the rows counted from the range's start. Drops the rows
+    keep leaves out (if given) and renumbers the candidates by the first
+    ballot naming them.
+    Returns (candidate names, rank array, first row with a ballot) or
+    None if nobody counted voted.
+    '''
+    names = {}
+    rows = []
+    blocks = []
+    for offset, (local_names, local_rows, local_ranks) in parts:
+        # local index -> index in names; the sentinel (-1) maps to itself
+        lookup = np.array([names.setdefault(name, len(names)) for name in local_names]
+                          + [BallotMatrix.SENTINEL], dtype=np.int32)
+        rows.append(local_rows + offset)
+        blocks.append(lookup[local_ranks])
+    rows = np.concatenate(rows)
+    ranks = _stack(blocks)
+    if keep is not None:
+        counted = keep[rows]
+        rows = rows[counted]
+        ranks = ranks[counted]
+    if len(rows) == 0:
+        return None
+    # rankings are filled from the left, trim what only the dropped rows used
+    ranks = ranks[:, :int((ranks != BallotMatrix.SENTINEL).sum(axis=1).max())]
+    listed = ranks[ranks != BallotMatrix.SENTINEL]
+    seen, first = np.unique(listed, return_index=True)
+    order = seen[np.argsort(first)]
+    renumber = np.full(len(names) + 1, BallotMatrix.SENTINEL, dtype=np.int32)
+    renumber[order] = np.arange(len(order), dtype=np.int32)
+    by_index = list(names)
+    return [by_index[i] for i in order.tolist()], renumber[ranks], int(rows[0])
+
+
+def read_ranges(fname: str, position_cols: List[tuple], candidates: dict,
+                start_row: int = 0, eligibility_checker: "Eligibility" = None,
+                processes: int = 2) -> tuple:
+    '''
+    Reads the ballots of a file in byte ranges spread over processes.
+    Returns ({position: [Candidate]}, {position: rank array}, {(position,
+    column, name): ballots} of names that aren't candidates, ballots
+    counted), with positions in the order get_ballots would find them.
+    ...
+
+    Arguments
+    ---------
+    position_cols : list[tuple(str, int)]
+        Positions and their column numbers, counting from 1.
+    eligibility_checker : eligibility.Eligibility
+        Optional filter, checked on the whole file once it's been read.
+
+    '''
+    columns = [int(column) - 1 for _, column in position_cols]
+    eligibility_columns = set()
+    if eligibility_checker is not None:
+        eligibility_columns = eligibility_checker.needed_columns() \
+            | {eligibility_checker.studentnum_column}
+    names = {name: name for name in candidates}
+    with instrument.phase("find byte ranges"):
+        ranges = byte_ranges(fname, start_row, processes * RANGES_PER_PROCESS)
+    tasks = [(fname, start, end, columns, names, eligibility_columns)
+             for start, end in ranges]
+    # workers are forked where possible, as for counting (see parallel.py)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with instrument.phase("parse byte ranges", ranges=len(ranges)):
+        with context.Pool(processes) as pool:
+            results = pool.map(_read_range, tasks)
+
+    offsets = np.cumsum([0] + [rows for rows, _, _, _ in results]).tolist()
+    n_rows = offsets[-1]
+    keep = None
+    if eligibility_checker is not None:
+        joined = {}
+        for column in eligibility_columns:
+            values = np.empty(n_rows, dtype=object)
+            values[:] = [cell for _, kept, _, _ in results for cell in kept[column]]
+            joined[column] = values
+        keep = eligibility_checker.filter_columns(joined, n_rows)
+
+    invalid = {}
+    for offset, (_, _, _, bad) in zip(offsets, results):
+        for row, number, choice in bad:
+            if keep is None or keep[offset + row]:
+                key = (position_cols[number][0], columns[number], choice)
+                invalid[key] = invalid.get(key, 0) + 1
+    merged = []
+    for number, (position, _) in enumerate(position_cols):
+        position_ranges = [(offset, positions[number])
+                           for offset, (_, _, positions, _) in zip(offsets, results)]
+        found = _merge(position_ranges, keep)
+        if found is not None:
+            merged.append((found[2], number, position, found[0], found[1]))
+    # positions come in as somebody first votes in them, column by column
+    merged.sort(key=lambda found: found[:2])
+    tables = {position: [candidates[name] for name in names]
+              for _, _, position, names, _ in merged}
+    ranks = {position: position_ranks for _, _, position, _, position_ranks in merged}
+    return tables, ranks, invalid, int(n_rows if keep is None else keep.sum())
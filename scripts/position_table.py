@@ -2,8 +2,27 @@ import csv
 # grab position table
 fname = "../config/VOTING.csv"
 
-with open(fname, newline='', encoding='utf-8') as f:
-    reader = csv.reader(f, delimiter=',', quotechar='"',
-                        quoting=csv.QUOTE_MINIMAL)
-    columns = list(reader)[1:]
-    f.close()
+# tables read so far, by file name
+_tables = {}
+
+
+def load(table: str = None) -> list:
+    '''
+    The position names and ballot column numbers in a position table
+    (fname by default), read the first time they're asked for.
+    '''
+    if table is None:
+        table = fname
+    if table not in _tables:
+        with open(table, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=',', quotechar='"',
+                                quoting=csv.QUOTE_MINIMAL)
+            _tables[table] = list(reader)[1:]
+    return _tables[table]
+
+
+def __getattr__(name: str):
+    # columns used to be read in on import, it's now read on first use
+    if name == "columns":
+        return load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
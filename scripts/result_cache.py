@@ -0,0 +1,207 @@
+'''
+On-disk cache of tabulation results, shared between runs.
+
+A position's count only depends on who is still running (in order), its
+ballots as they were read, its seats and the counting method. Results are
+stored under a hash of those, so a rerun that only changes a joint or a
+fill-in gets every untouched position's rounds straight back instead of
+counting it again, as does an allocation pass counting a position it
+counted with the same candidates before.
+
+Entries are small pickles of the rounds with candidates by name, put back
+together around the election's own candidates when loaded, after a line
+holding their key. Counts that came down to chance aren't kept. The cache is
+kept under a size limit by deleting the least recently used entries; an
+entry's modification time is when it was last used, so this carries over
+between runs.
+
+Usage
+-----
+    results = ResultCache("../cache", max_bytes=64 << 20)
+    key = count_key(evaluator, candidates, seats, ballot_digest(ballots))
+    result = results.get(key, candidates)
+    if result is None:
+        result = evaluator(candidates, ballots, seats)
+        results.put(key, result)
+'''
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import List, Union
+import numpy as np
+from pyrankvote.helpers import CandidateResult, ElectionResults, RoundResult
+import cache
+import instrument
+from ballot_matrix import BallotMatrix
+
+DEFAULT_MAX_BYTES = 64 << 20
+PREFIX = "result-"
+# first line of every entry, followed by its key. Entries that don't start
+# with the key asked for are never unpickled (see cache.py)
+HEADER = b"election-result-cache 1 "
+# files whose code decides what a count produces; part of every key
+_COUNTING_FILES = ("tabulation.py", "ballot_matrix.py")
+
+
+def ballot_digest(ballots: Union[List["Ballot"], BallotMatrix]) -> str:
+    '''
+    Hash of a position's ballots, with candidates by name.
+    '''
+    digest = hashlib.sha256()
+    if isinstance(ballots, BallotMatrix):
+        digest.update(repr([c.name for c in ballots.candidates]).encode())
+        digest.update(np.ascontiguousarray(ballots.ranks).tobytes())
+        digest.update(np.ascontiguousarray(ballots.row_weights()).tobytes())
+    else:
+        for ballot in ballots:
+            digest.update("\x1f".join(c.name for c in ballot.ranked_candidates).encode())
+            digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+_code_digest = None
+# method -> its description (its source), looked up once
+_methods = {}
+
+
+def _counting_code() -> str:
+    global _code_digest
+    if _code_digest is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        _code_digest = cache.cache_key([os.path.join(here, f) for f in _COUNTING_FILES])
+    return _code_digest
+
+
+def count_key(method, candidates: List["Candidate"], seats: int,
+              ballots_digest: str) -> str:
+    '''
+    Key of counting ballots (by their ballot_digest) for candidates, in
+    that order, with a method.
+    '''
+    if method not in _methods:
+        _methods[method] = cache.describe(method)
+    key = hashlib.sha256(_counting_code().encode())
+    key.update(_methods[method].encode())
+    key.update(cache.describe([seats, [c.name for c in candidates],
+                               ballots_digest]).encode())
+    return key.hexdigest()
+
+
+class ResultCache:
+    '''
+    Directory of tabulation results, least recently used first out.
+    ...
+
+    Attributes
+    ----------
+        directory : str
+            Where the entries are kept (they can share it with the parse cache).
+        max_bytes : int
+            Size the entries are kept under.
+        size : int
+            Size of the entries now.
+
+    '''
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # entry path -> size, least recently used first
+        self._entries = OrderedDict()
+        self.size = 0
+        try:
+            names = [name for name in os.listdir(directory)
+                     if name.startswith(PREFIX) and name.endswith(".pickle")]
+        except OSError:
+            names = []
+        found = []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self.size += size
+
+    def __repr__(self) -> str:
+        return "<ResultCache(%s, %i entries, %i/%i bytes)>" % (
+            self.directory, len(self._entries), self.size, self.max_bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{PREFIX}{key[:32]}.pickle")
+
+    def get(self, key: str, candidates: List["Candidate"]) -> ElectionResults:
+        '''
+        The result stored under key, around the given candidates, or None.
+        '''
+        path = self._path(key)
+        if path not in self._entries:
+            return None
+        try:
+            with open(path, "rb") as f:
+                if f.readline(len(HEADER) + len(key) + 1) != HEADER + key.encode() + b"\n":
+                    # another key sharing the file name, or not an entry at all
+                    return None
+                rounds = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._forget(path)
+            return None
+        by_name = {c.name: c for c in candidates}
+        try:
+            result = _restore(rounds, by_name)
+        except KeyError:
+            return None
+        self._entries.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        instrument.count("tabulation cache hits")
+        return result
+
+    def put(self, key: str, result: ElectionResults) -> None:
+        '''
+        Stores a result under key, making room for it if needed.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        data = HEADER + key.encode() + b"\n" + pickle.dumps(
+            _strip(result), protocol=pickle.HIGHEST_PROTOCOL)
+        # write then rename, so an interrupted run never leaves half a file
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.size -= self._entries.pop(path, 0)
+        self._entries[path] = len(data)
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+            instrument.count("tabulation cache evictions")
+
+    def _forget(self, path: str) -> None:
+        self.size -= self._entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _strip(result: ElectionResults) -> List[tuple]:
+    return [([(r.candidate.name, r.number_of_votes, r.status)
+              for r in round_.candidate_results],
+             round_.number_of_blank_votes) for round_ in result.rounds]
+
+
+def _restore(rounds: List[tuple], by_name: dict) -> ElectionResults:
+    results = ElectionResults()
+    for candidate_results, blank_votes in rounds:
+        results.register_round_results(RoundResult(
+            [CandidateResult(by_name[name], votes, status)
+             for name, votes, status in candidate_results],
+            blank_votes))
+    return results
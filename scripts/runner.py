@@ -0,0 +1,404 @@
+'''
+Runs a whole election from a configuration, for using the counting from
+other tools. elections.py is this with the club's configurables filled in,
+and cli.py runs it from the command line.
+
+Nothing is read when this is imported, and numpy and pyrankvote (with
+everything built on them) are only imported once a run needs them, so
+small elections start quickly.
+
+Usage
+-----
+    from runner import run_election
+    results = run_election({"CANDIDACY_FILE": "../data/nominees.csv",
+                            "BALLOT_FILE": "../data/votes.csv",
+                            "QUIET": True})
+    results["winners"]["President"]
+'''
+import contextlib
+import importlib
+from typing import Callable, List
+import election_helper
+import events
+import instrument
+import position_table
+from allocator import Allocator
+from election_helper import get_candidates, get_ballots
+from election_helper import PositionElection
+
+# election_helper's settings, set on it at the start of a run
+HELPER_SETTINGS = ("MAX_POSITIONS", "CANDIDATE_START_ROW", "VOTING_START_ROW",
+                   "SURNAME_COL", "FIRSTNAME_COL", "EMAIL_COL", "ROLES_COL",
+                   "STATUS_COL", "CAND_TYPE_COL", "TERMS_COL")
+
+# every setting a run takes and its default, as described in elections.py.
+# CANDIDACY_FILE and BALLOT_FILE have to be given.
+DEFAULTS = {
+    "CANDIDACY_FILE": None,
+    "BALLOT_FILE": None,
+    "VOTING_TABLE": position_table.fname,
+    "MAX_POSITIONS": 3,
+    "CANDIDATE_START_ROW": 1,
+    "VOTING_START_ROW": 3,
+    "SURNAME_COL": 0,
+    "FIRSTNAME_COL": 1,
+    "EMAIL_COL": 5,
+    "ROLES_COL": 2,
+    "STATUS_COL": 6,
+    "CAND_TYPE_COL": 7,
+    "TERMS_COL": 8,
+    "FINISHED_SURVEY_COLUMN": 6,
+    "STUDENTNUM_COLUMN": 17,
+    # None checks FINISHED_SURVEY_COLUMN, otherwise a function of a CSV line
+    # or an eligibility.Eligibility
+    "ELIGIBILITY_CHECKER": None,
+    # which of a student number's submissions count, see eligibility.py
+    "DUPLICATE_VOTES": "latest",
+    "USE_RAW_VOTING_INFO": True,
+    "RAW_VOTING_OFFSET": -18,
+    "USE_BALLOT_MATRIX": True,
+    "GROUP_BALLOTS": True,
+    "BALLOT_CHUNK_SIZE": None,
+    "BALLOT_STORE_DIR": None,
+    # read the ballot file in this many worker processes, see parallel_parse.py
+    "PARSE_PROCESSES": None,
+    # a counting method or its dotted name, imported when the run starts
+    "EVALUATOR": "tabulation.preferential_block_voting",
+    "PARALLEL_PROCESSES": None,
+    # count every position's head-to-heads before allocating, see pairwise.py
+    "PAIRWISE": False,
+    # resample each position's ballots this many times afterwards, see stability.py
+    "STABILITY_RESAMPLES": None,
+    "STABILITY_SEED": 0,
+    "PARSE_CACHE_DIR": None,
+    # counts of each position are kept here between runs, see result_cache.py
+    "RESULT_CACHE_DIR": None,
+    "RESULT_CACHE_SIZE": 64 << 20,
+    "INSTRUMENT": False,
+    "INSTRUMENT_MEMORY": False,
+    "INSTRUMENT_JSON": None,
+    "INSTRUMENT_TRACE": None,
+    "QUIET": False,
+    "EVENT_LOG": None,
+    # every round of every count is appended here as JSON lines, see audit.py
+    "AUDIT_LOG": None,
+    "joints": [],
+    "elec_with_multi_seats": {},
+    "fill_ins": [],
+    "names_to_change": {},
+}
+
+
+def resolve_evaluator(evaluator) -> Callable:
+    '''
+    A counting method given either as itself or by its dotted name
+    (i.e. "tabulation.single_transferable_vote").
+    '''
+    if callable(evaluator):
+        return evaluator
+    module, _, name = evaluator.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def settings_checker(settings: dict) -> Callable:
+    '''
+    The ballot filter settings ask for.
+    '''
+    if settings["ELIGIBILITY_CHECKER"] is not None:
+        return settings["ELIGIBILITY_CHECKER"]
+    return eligibility_checker(settings["FINISHED_SURVEY_COLUMN"],
+                               settings["STUDENTNUM_COLUMN"],
+                               settings["DUPLICATE_VOTES"])
+
+
+def eligibility_checker(finished_column: int, studentnum_column: int,
+                        duplicates: str = "latest") -> "Eligibility":
+    '''
+    The default ballot filter: only ballots of finished surveys count, and
+    only one per student number (see eligibility.DUPLICATE_POLICIES).
+    '''
+    from eligibility import Eligibility, finished
+    return Eligibility(studentnum_column, [finished(finished_column)], duplicates)
+
+
+def configure(config: dict = None, **overrides) -> dict:
+    '''
+    DEFAULTS updated with config and then overrides, checking every name.
+    '''
+    settings = dict(DEFAULTS)
+    for name, value in dict(config or {}, **overrides).items():
+        if name not in DEFAULTS:
+            raise KeyError(f"Unknown election setting {name}")
+        settings[name] = value
+    if settings["CANDIDACY_FILE"] is None or settings["BALLOT_FILE"] is None:
+        raise ValueError("CANDIDACY_FILE and BALLOT_FILE have to be set")
+    return settings
+
+
+def apply(settings: dict) -> None:
+    '''
+    Sets election_helper's settings, which its parsing reads.
+    '''
+    for name in HELPER_SETTINGS:
+        setattr(election_helper, name, settings[name])
+
+
+@contextlib.contextmanager
+def reporting(settings: dict):
+    '''
+    Sets up instrumentation, quiet mode, the event log, the audit trail and
+    the result cache for a run, and puts the console back the way it was afterwards.
+    '''
+    console_levels = [(sink, sink.level) for sink in events.sinks()]
+    if settings["INSTRUMENT"]:
+        instrument.enable(trace_memory=settings["INSTRUMENT_MEMORY"])
+    if settings["RESULT_CACHE_DIR"] is not None:
+        from result_cache import ResultCache
+        PositionElection.result_cache = ResultCache(settings["RESULT_CACHE_DIR"],
+                                                    settings["RESULT_CACHE_SIZE"])
+    if settings["QUIET"]:
+        events.quiet()
+    if settings["EVENT_LOG"] is not None:
+        events.add_sink(events.JsonlSink(settings["EVENT_LOG"]))
+    if settings["AUDIT_LOG"] is not None:
+        import audit
+        audit.enable(settings["AUDIT_LOG"])
+    try:
+        yield
+    finally:
+        if settings["AUDIT_LOG"] is not None:
+            audit.disable()
+        PositionElection.result_cache = None
+        if settings["INSTRUMENT"]:
+            instrument.disable()
+        events.close()
+        for sink, level in console_levels:
+            events.set_level(sink, level)
+
+
+def finish_instrumentation(settings: dict) -> dict:
+    '''
+    Prints and writes out what was recorded, if anything.
+    Returns the records as JSON-ready data, or None.
+    '''
+    if not settings["INSTRUMENT"]:
+        return None
+    print(instrument.recorder().summary())
+    if settings["INSTRUMENT_JSON"] is not None:
+        instrument.write_json(settings["INSTRUMENT_JSON"])
+    if settings["INSTRUMENT_TRACE"] is not None:
+        instrument.write_trace(settings["INSTRUMENT_TRACE"])
+    return instrument.recorder().to_json()
+
+
+def run_election(config: dict = None, **overrides) -> dict:
+    '''
+    Parses the candidates and ballots, counts every position and allocates
+    the seats, reporting as it goes through events.
+    Returns {"winners": {position: [Candidate]}, "elections": [PositionElection],
+    "problems": [str], "instrumentation": dict or None}, and with
+    STABILITY_RESAMPLES set "stability": {position: {name: share won}},
+    with PAIRWISE "pairwise": {position: PairwisePreferences}.
+    ...
+
+    Arguments
+    ---------
+    config : dict
+        Settings by name (see DEFAULTS), anything left out is defaulted.
+    overrides
+        More settings, taking precedence over config.
+
+    '''
+    settings = configure(config, **overrides)
+    apply(settings)
+    with reporting(settings):
+        return _run(settings)
+
+
+def _run(settings: dict) -> dict:
+    candidates, ballots = load_inputs(settings)
+    elections = build_elections(candidates, ballots,
+                                resolve_evaluator(settings["EVALUATOR"]),
+                                settings["elec_with_multi_seats"])
+    if settings["PAIRWISE"]:
+        count_pairwise(elections)
+    problems = allocate(elections, settings["PARALLEL_PROCESSES"])
+    report(elections, problems)
+    results = {"winners": {e.position: list(e.final_winners) for e in elections},
+               "elections": elections, "problems": problems}
+    if settings["PAIRWISE"]:
+        import pairwise
+        results["pairwise"] = pairwise.report(elections)
+    if settings["STABILITY_RESAMPLES"]:
+        import stability
+        results["stability"] = stability.report(elections,
+                                                 settings["STABILITY_RESAMPLES"],
+                                                 settings["STABILITY_SEED"])
+    results["instrumentation"] = finish_instrumentation(settings)
+    return results
+
+
+def load_inputs(settings: dict) -> tuple[dict, dict]:
+    '''
+    Candidates and ballots of the run, from the cache if they're there.
+    '''
+    checker = settings_checker(settings)
+
+    def parse_inputs():
+        return parse(settings, checker)
+
+    with instrument.phase("parse inputs"):
+        # a ballot store is already on disk, pickling it would load it all
+        if settings["PARSE_CACHE_DIR"] is None or settings["BALLOT_STORE_DIR"] is not None:
+            candidates, ballots = parse_inputs()
+        else:
+            import cache
+            parse_settings = [
+                {name: settings[name] for name in HELPER_SETTINGS},
+                settings["FINISHED_SURVEY_COLUMN"], settings["STUDENTNUM_COLUMN"],
+                settings["DUPLICATE_VOTES"], checker, settings["USE_RAW_VOTING_INFO"],
+                settings["RAW_VOTING_OFFSET"], settings["USE_BALLOT_MATRIX"],
+                settings["GROUP_BALLOTS"], settings["joints"], settings["fill_ins"],
+                settings["names_to_change"]]
+            key = cache.cache_key([settings["CANDIDACY_FILE"], settings["BALLOT_FILE"],
+                                   settings["VOTING_TABLE"]], *parse_settings)
+            candidates, ballots = cache.cached(key, parse_inputs,
+                                               settings["PARSE_CACHE_DIR"])
+    return candidates, ballots
+
+
+def parse(settings: dict, checker: Callable = None) -> tuple[dict, dict]:
+    '''
+    Reads the candidates and ballots named in settings.
+    Returns ({name: Candidate}, {position: ballots}).
+    '''
+    candidates = parse_candidates(settings)
+    return candidates, parse_ballots(settings, candidates, checker)
+
+
+def parse_candidates(settings: dict) -> dict:
+    '''
+    Reads the candidates named in settings, fill-ins included.
+    '''
+    with instrument.phase("parse candidates", file=settings["CANDIDACY_FILE"]):
+        candidates = get_candidates(settings["CANDIDACY_FILE"],
+                                    joint_candidates=settings["joints"],
+                                    nts=settings["names_to_change"])
+
+    for fill_in in settings["fill_ins"]:
+        candidates.update({fill_in.name: fill_in})
+    return candidates
+
+
+def parse_ballots(settings: dict, candidates: dict, checker: Callable = None) -> dict:
+    '''
+    Reads the ballots named in settings, for the given candidates.
+    '''
+    with instrument.phase("parse ballots", file=settings["BALLOT_FILE"]):
+        pos_columns = position_table.load(settings["VOTING_TABLE"])
+        use_matrix = settings["USE_BALLOT_MATRIX"]
+        if settings["USE_RAW_VOTING_INFO"]:
+            shifted_pos_columns = [
+                [n[0], int(n[1]) + settings["RAW_VOTING_OFFSET"]] for n in pos_columns]
+            return get_ballots(settings["BALLOT_FILE"], shifted_pos_columns,
+                               candidates, as_matrix=use_matrix,
+                               chunk_size=settings["BALLOT_CHUNK_SIZE"],
+                               store=settings["BALLOT_STORE_DIR"],
+                               group=use_matrix and settings["GROUP_BALLOTS"],
+                               processes=settings["PARSE_PROCESSES"])
+        return get_ballots(settings["BALLOT_FILE"], pos_columns,
+                           candidates, checker, as_matrix=use_matrix,
+                           chunk_size=settings["BALLOT_CHUNK_SIZE"],
+                           store=settings["BALLOT_STORE_DIR"],
+                           group=use_matrix and settings["GROUP_BALLOTS"],
+                           processes=settings["PARSE_PROCESSES"])
+
+
+def build_elections(candidates: dict, ballots: dict, evaluator: Callable,
+                    elec_with_multi_seats: dict = {}) -> List[PositionElection]:
+    '''
+    One PositionElection per position anyone voted in.
+    '''
+    # build dictionary of positions and their candidiates
+    candidates_by_pos = {}
+    for c in candidates.values():
+        for pos in c.positions:
+            if pos not in candidates_by_pos.keys():
+                candidates_by_pos.update({pos: [c]})
+            else:
+                candidates_by_pos[pos].append(c)
+
+    for position in ballots.keys():
+        if position not in candidates_by_pos:
+            raise KeyError(f"{position} has ballots but nobody is running for it "
+                           "(check MAX_POSITIONS and names_to_change)")
+
+    events.info("elections_building", "Building elections:")
+
+    elections = []
+
+    with instrument.phase("build elections"):
+        for position in ballots.keys():
+            pos_ballots = ballots[position]
+            pos_candidates = candidates_by_pos[position]
+            # handle elections with multiple seats.
+            if position in elec_with_multi_seats.keys():
+                seats = elec_with_multi_seats[position]
+            else:
+                seats = 1
+            elec = PositionElection(position, pos_candidates, pos_ballots,
+                                    evaluator_method=evaluator,
+                                    seats=seats)
+            events.info("election_built", "\n{election}", election=elec,
+                        position=position, seats=seats)
+            elections.append(elec)
+    events.info("elections_built", "...done")
+    return elections
+
+
+def count_pairwise(all_elections: List[PositionElection]) -> None:
+    '''
+    Counts every position's head-to-heads while all its candidates are
+    still on the ballots (they're kept on the elections for later).
+    '''
+    for election in all_elections:
+        if not election.is_referendum():
+            election.pairwise()
+
+
+def allocate(all_elections: List[PositionElection],
+             processes: int = None) -> List[str]:
+    '''
+    Counts the elections over and over, giving each winner the seat they
+    ranked highest and taking them out of the rest, lowering the ranking
+    threshold every pass (see allocator.Allocator). The seats end up in
+    each election's final_winners.
+    Returns the problems met along the way.
+    '''
+    return Allocator(all_elections, processes).run()
+
+
+def report(all_elections: List[PositionElection], problems: List[str]) -> None:
+    '''
+    Reports the final winners of every election, and any problems.
+    '''
+    events.result("results_header", "\n===FINAL ELECTION RESULTS===")
+    for election in all_elections:
+        winners = election.final_winners
+        events.result("final_result", "\n\n{position}:{listing}",
+                      position=election.position,
+                      winners=lambda: [w.name for w in winners],
+                      emails=lambda: [w.info.email for w in winners],
+                      listing=lambda: "".join("\n{} ({})".format(w, w.info.email)
+                                              for w in winners))
+        if len(winners) > election.seats:
+            events.warning("seats_overfilled",
+                           "\n(More than {seats} seats filled due to a tie somewhere in the voting. or pyrankvote being dumb.\n"
+                           "Fiddle with the maximum number of positions or take a look at raw vote counts)",
+                           position=election.position, seats=election.seats)
+
+    if len(problems) != 0:
+        events.warning("issues_header", "\n===ELECTION ISSUES===")
+
+        for problem in problems:
+            events.warning("election_issue", "{problem}", problem=problem)
@@ -0,0 +1,321 @@
+'''
+Bootstrap estimate of how fragile each position's result is.
+
+A position's ballots are resampled with replacement (as many ballots as
+were cast, drawn from the ones that were) thousands of times and counted
+again. How often each candidate wins across the resamples says how
+safely they won.
+
+Ballots are grouped first, so a resample is just a new weight for each
+distinct ranking. Single-seat preferential block voting or instant runoff
+counts, which is most positions, are run for a whole batch of resamples
+at once, following tabulation.py's rules (majority of the ballots still
+in play, rejecting everyone who can't catch up, ties broken on second,
+third... choices). Every round only recounts the rankings whose choice
+dropped out, for each set of candidates the batch still has running.
+Ties that would come down to chance go to the candidate listed first.
+
+Other counts (several seats, STV) run the evaluator's tabulation.py
+namesake on each resample, which is slower but never builds Ballot
+objects. Yes/No referendums just compare counts.
+
+Each position is looked at as it stood when its seats were decided: the
+candidates still running in it then, not everyone who applied.
+
+Usage
+-----
+    shares = stability.bootstrap(election, resamples=2000, seed=0)
+    # {Candidate("Nick Riviera"): 0.91, Candidate("Troy McClure"): 0.09}
+'''
+import numpy as np
+from typing import Callable, List
+import events
+import instrument
+import tabulation
+from ballot_matrix import BallotMatrix, group_rows
+from election_helper import PositionElection, Yes
+
+# most resamples counted together
+BATCH = 256
+# pyrankvote's slack on vote comparisons
+ROUNDING_ERROR = 1e-6
+# evaluators the batched count reproduces for a single seat
+_SINGLE_SEAT_METHODS = ("preferential_block_voting", "instant_runoff_voting")
+
+
+def slot_ballots(election: PositionElection) -> tuple[List, np.ndarray, np.ndarray]:
+    '''
+    An election's ballots as distinct rankings of its running candidates.
+    Returns (candidates, ranks, weights): ranks holds indices into
+    candidates, -1 padded at the end of each row.
+    '''
+    matrix = tabulation.as_ballot_matrix(election.ballots)
+    tally = tabulation.Tally(election.candidates, matrix)
+    ranks = tally.slot_ranks(np.arange(len(tally.weights)))
+    # candidates no longer running leave gaps, close them up
+    order = np.argsort(ranks < 0, axis=1, kind="stable")
+    ranks = np.take_along_axis(ranks, order, axis=1)
+    width = int((ranks >= 0).sum(axis=1).max(initial=0))
+    ranks, weights = group_rows(np.ascontiguousarray(ranks[:, :width]),
+                                tally.weights)
+    return tally.candidates, ranks, weights
+
+
+def resample(weights: np.ndarray, resamples: int,
+             rng: np.random.Generator) -> np.ndarray:
+    '''
+    (resamples x rows) weights, each row a bootstrap resample of the voters.
+    '''
+    # drawing voters and counting them per row is a lot quicker than a
+    # multinomial over thousands of rows
+    owner = np.repeat(np.arange(len(weights)), weights.astype(np.int64))
+    if len(owner) == 0:
+        return np.zeros((resamples, len(weights)), dtype=np.int64)
+    drawn = owner[rng.integers(0, len(owner), size=(resamples, len(owner)))]
+    drawn += (np.arange(resamples) * len(weights))[:, None]
+    return np.bincount(drawn.ravel(), minlength=resamples * len(weights)
+                       ).reshape(resamples, len(weights))
+
+
+def _choices(ranks: np.ndarray, running: np.ndarray, x: int = 0) -> np.ndarray:
+    '''
+    Each row's x-th choice among the running candidates, -1 if it has
+    none left.
+    '''
+    still = running[ranks]
+    hit = still & (np.cumsum(still, axis=1, dtype=np.int16) == x + 1)
+    picked = ranks[np.arange(len(ranks)), hit.argmax(axis=1)]
+    return np.where(hit.any(axis=1), picked, -1)
+
+
+def _votes(weights: np.ndarray, choices: np.ndarray, n_slots: int) -> np.ndarray:
+    '''
+    (resamples x n_slots) votes the rows give the slots they chose.
+    '''
+    matrix = np.zeros((len(choices), n_slots))
+    found = np.flatnonzero(choices >= 0)
+    matrix[found, choices[found]] = 1.0
+    return weights @ matrix
+
+
+def _count_round(choices: Callable, depth: int, weights: np.ndarray,
+                 members: np.ndarray, votes: np.ndarray,
+                 running: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    One round of the count for resamples (members) that still have the
+    same candidates running, given their first choice votes. choices(running, x)
+    is every row's x-th choice, depth the longest ranking.
+    Returns who each resample elects and who it rejects, as
+    (resamples x n_slots) booleans.
+    '''
+    n_slots = votes.shape[1]
+    places = np.arange(n_slots)
+    # every ballot still in play has a vote for someone running
+    majority = np.ceil(votes.sum(axis=1) / 2.0)
+    race = np.broadcast_to(running[:n_slots], votes.shape)
+
+    # order the running candidates by votes, the rest after them
+    keys = [np.broadcast_to(places, votes.shape), -votes, ~race]
+    order = np.lexsort(keys)
+    ranked_votes = np.take_along_axis(votes, order, axis=1)
+    ranked_running = np.take_along_axis(race, order, axis=1)
+
+    elect = ranked_running & (ranked_votes - ROUNDING_ERROR >= majority[:, None])
+    # votes of everyone from each place down, against the place above
+    remaining = np.cumsum((ranked_votes * ranked_running)[:, ::-1], axis=1)[:, ::-1]
+    above = np.concatenate((np.zeros((len(votes), 1)), ranked_votes[:, :-1]), axis=1)
+    reject = (ranked_running & ~elect & (places >= 1)
+              & (remaining - ROUNDING_ERROR <= above))
+
+    # who is which of two tied candidates only matters if one of them is
+    # rejected and the other isn't; the count then orders them by second,
+    # third... choices, and by who's listed first after that
+    split = (ranked_running[:, 1:] & (ranked_votes[:, 1:] == ranked_votes[:, :-1])
+             & (reject[:, 1:] != reject[:, :-1])).any(axis=1)
+    tied = np.flatnonzero(split)
+    if len(tied) > 0:
+        # rankings run out before the candidates do, later choices count nobody
+        later = [-_votes(weights[members[tied]], choices(running, x), n_slots)
+                 for x in range(min(n_slots, depth) - 1, 0, -1)]
+        order[tied] = np.lexsort([keys[0][tied]] + later
+                                 + [key[tied] for key in keys[1:]])
+
+    won = np.zeros_like(elect)
+    np.put_along_axis(won, order, elect, axis=1)
+    out = np.zeros_like(reject)
+    np.put_along_axis(out, order, reject, axis=1)
+    return won, out
+
+
+def single_seat_winners(ranks: np.ndarray, weights: np.ndarray, n_slots: int,
+                        cache: dict = None) -> np.ndarray:
+    '''
+    Winners of a single-seat preferential block voting count for every
+    resample at once.
+    Returns a (resamples x n_slots) boolean array, more than one winner
+    in a row meaning a tie for the majority.
+    ...
+
+    Arguments
+    ---------
+    ranks : np.ndarray
+        (rows x ranking length) candidate slots, -1 padded.
+    weights : np.ndarray
+        (resamples x rows) voters behind each row in each resample.
+    n_slots : int
+        Number of candidates.
+    cache : dict, optional
+        Choices already worked out for these ranks, shared between calls
+        (batches of resamples) to save working them out again.
+
+    '''
+    n = weights.shape[0]
+    weights = weights.astype(float)
+    if ranks.shape[1] == 0:
+        ranks = np.full((ranks.shape[0], 1), -1, dtype=ranks.dtype)
+    # padding (-1) looks up the trailing False
+    in_race = np.zeros((n, n_slots + 1), dtype=bool)
+    in_race[:, :n_slots] = True
+    # who was running when each resample's votes were last counted
+    counted = in_race.copy()
+    elected = np.zeros((n, n_slots), dtype=bool)
+    open_ = np.ones(n, dtype=bool)
+    cache = {} if cache is None else cache
+
+    def choices(running, x=0):
+        key = (x, running.tobytes())
+        if key not in cache:
+            cache[key] = _choices(ranks, running, x)
+        return cache[key]
+
+    votes = _votes(weights, choices(in_race[0]), n_slots)
+    while open_.any():
+        live = np.flatnonzero(open_)
+        # resamples mostly knock out the same candidates, so only a few
+        # distinct sets of them are still running at any point
+        pairs, group = np.unique(np.hstack((counted[live], in_race[live])),
+                                 axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        for g, pair in enumerate(pairs):
+            members = live[group == g]
+            before, running = pair[:n_slots + 1], pair[n_slots + 1:]
+            # only ballots whose choice dropped out move their votes
+            was = choices(before)
+            moved = np.flatnonzero((was >= 0) & ~running[was])
+            now = votes[members]
+            now[:, before[:n_slots] & ~running[:n_slots]] = 0.0
+            if len(moved) > 0:
+                now += _votes(weights[np.ix_(members, moved)],
+                              choices(running)[moved], n_slots)
+            votes[members] = now
+
+            won, out = _count_round(choices, ranks.shape[1], weights, members,
+                                    now, running)
+            race = running[:n_slots] & ~(won | out)
+            # the last one standing takes the seat
+            last = ~won.any(axis=1) & (race.sum(axis=1) == 1)
+            won[last] = race[last]
+            race[last] = False
+
+            elected[members] = won
+            counted[members] = running
+            in_race[members, :n_slots] = race
+            open_[members[won.any(axis=1) | ~race.any(axis=1)]] = False
+    return elected
+
+
+def _referendum_passes(election: PositionElection, resamples: int,
+                       rng: np.random.Generator) -> float:
+    '''
+    Share of resamples in which a referendum gets at least as many yes
+    votes as no votes.
+    '''
+    matrix = tabulation.as_ballot_matrix(election.ballots)
+    weights = matrix.row_weights()
+    n = int(weights.sum())
+    if n == 0:
+        return 1.0
+    yes = int(weights[matrix.first_choices() == matrix.index(Yes)].sum())
+    drawn = rng.binomial(n, yes / n, size=resamples)
+    return float((2 * drawn - n >= 0).mean())
+
+
+def _native(evaluator: Callable) -> Callable:
+    '''
+    The tabulation.py method counting the same way as evaluator, if any.
+    '''
+    if evaluator in tabulation.NATIVE_METHODS:
+        return evaluator
+    native = getattr(tabulation, getattr(evaluator, "__name__", ""), None)
+    return native if native in tabulation.NATIVE_METHODS else None
+
+
+def bootstrap(election: PositionElection, resamples: int = 1000,
+              seed: int = None) -> dict:
+    '''
+    Share of resamples each running candidate of an election wins in
+    (a referendum's candidate wins if the yes votes hold). Shares add up
+    to the number of seats, less any resamples nobody won.
+    '''
+    rng = np.random.default_rng(seed)
+    if election.is_referendum():
+        return {election.candidates[0]: _referendum_passes(election, resamples, rng)}
+    candidates, ranks, weights = slot_ballots(election)
+    wins = np.zeros(len(candidates))
+
+    evaluator = election.evaluator_method
+    name = getattr(evaluator, "__name__", "")
+    batched = election.seats == 1 and name in _SINGLE_SEAT_METHODS
+    native = _native(evaluator)
+    cache = {}
+    # keep each batch's (resamples x voters) draws to a few million cells
+    batch = max(1, min(BATCH, (1 << 22) // max(1, int(weights.sum()))))
+    for start in range(0, resamples, batch):
+        drawn = resample(weights, min(batch, resamples - start), rng)
+        if batched:
+            wins += single_seat_winners(ranks, drawn, len(candidates), cache).sum(axis=0)
+            continue
+        for row_weights in drawn:
+            keep = row_weights > 0
+            matrix = BallotMatrix(candidates, ranks[keep], row_weights[keep],
+                                  validate=False)
+            try:
+                if native is not None:
+                    result = native(list(election.candidates), matrix, election.seats)
+                else:
+                    result = evaluator(list(election.candidates), matrix.to_ballots(),
+                                       election.seats)
+            except RuntimeError:
+                # a count pyrankvote's rules can't finish, nobody wins it
+                continue
+            for winner in result.get_winners():
+                wins[candidates.index(winner)] += 1
+    return {c: float(w / resamples) for c, w in zip(candidates, wins)}
+
+
+def report(elections: List[PositionElection], resamples: int,
+           seed: int = None) -> dict:
+    '''
+    Bootstraps every election that still has candidates and reports how
+    often each of them wins.
+    Returns {position: {candidate name: share of resamples won}}.
+    '''
+    events.result("stability_header",
+                  "\n===WINNER STABILITY ({resamples} resamples)===",
+                  resamples=resamples)
+    shares = {}
+    for election in elections:
+        if len(election.candidates) == 0:
+            continue
+        with instrument.phase("bootstrap", position=election.position):
+            won = bootstrap(election, resamples, seed)
+        ranked = sorted(won.items(), key=lambda item: -item[1])
+        shares[election.position] = {c.name: share for c, share in ranked}
+        events.result("stability", "{position}: {listing}",
+                      position=election.position,
+                      shares=shares[election.position],
+                      winners=[w.name for w in election.final_winners],
+                      listing=", ".join(f"{c.name} {share:.1%}"
+                                        for c, share in ranked if share > 0)
+                      or "nobody wins")
+    return shares
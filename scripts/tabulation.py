@@ -0,0 +1,707 @@
+'''
+Native ranked-choice counting over BallotMatrix rank arrays.
+
+The methods here follow pyrankvote's counting rules round for round
+(including its tie-breaking and vote transfer behaviour) so they give the
+same winners and the same ElectionResults, but every per-ballot step is
+done with numpy over whole arrays instead of looping over Ballot objects.
+Any of them can be passed to PositionElection as its evaluator_method.
+They also take an on_round function, called with each RoundResult as soon
+as the round is counted (i.e. to write an audit trail as the count goes).
+'''
+import functools
+import math
+import random
+import numpy as np
+from pyrankvote.helpers import (CandidateResult, CandidateStatus,
+                                CompareMethodIfEqual, ElectionResults,
+                                NoCandidatesLeftInRaceError, RoundResult,
+                                almost_equal)
+from typing import Callable, List, Union
+from ballot_matrix import BallotMatrix
+
+HOPEFUL, ELECTED, REJECTED, WITHDRAWN = 0, 1, 2, 3
+_STATUS_NAMES = {HOPEFUL: CandidateStatus.Hopeful,
+                 ELECTED: CandidateStatus.Elected,
+                 REJECTED: CandidateStatus.Rejected}
+
+
+def nth_in_race(ranks: np.ndarray, in_race: np.ndarray, x: int) -> np.ndarray:
+    '''
+    For every row of ranks, the x-th (0-indexed) candidate still in the
+    race, or -1 if the ballot runs out before then.
+
+    Arguments
+    ---------
+    ranks : np.ndarray
+        (ballots x ranking length) array of candidate slots, -1 for padding.
+    in_race : np.ndarray
+        Boolean array over candidate slots, with one extra trailing False
+        entry that padding (-1) looks up.
+    x : int
+        Which in-race preference to pick.
+    '''
+    if ranks.shape[1] == 0:
+        return np.full(ranks.shape[0], -1, dtype=np.intp)
+    running = in_race[ranks]
+    hit = running & (np.cumsum(running, axis=1) == x + 1)
+    found = hit.any(axis=1)
+    column = hit.argmax(axis=1)
+    picked = ranks[np.arange(ranks.shape[0]), column]
+    return np.where(found, picked, -1)
+
+
+def _add_each(total: float, value: float, times: int) -> float:
+    '''
+    total with value added to it times over, one at a time. pyrankvote
+    hands transferred votes on a ballot at a time, and value * times can
+    round differently from that in the last place, enough to change a
+    printed total.
+    '''
+    if times == 0:
+        return total
+    # add.accumulate adds strictly left to right, unlike sum
+    steps = np.full(times + 1, value)
+    steps[0] = total
+    return float(np.add.accumulate(steps)[-1])
+
+
+def _credit(distribution: "Distribution", weights: np.ndarray,
+            choice: np.ndarray, rows: np.ndarray,
+            votes_pr_voter: float) -> None:
+    '''
+    Credits each row's ballot to the slot in choice (-1 skipped).
+    '''
+    valid = choice >= 0
+    choice, rows = choice[valid], rows[valid]
+    if len(rows) == 0:
+        return
+    voters = np.bincount(choice, weights=weights[rows],
+                         minlength=len(distribution.votes))
+    if votes_pr_voter == 1.0:
+        distribution.votes += voters
+    else:
+        for slot in np.flatnonzero(voters):
+            distribution.votes[slot] = _add_each(distribution.votes[slot],
+                                                 votes_pr_voter, int(voters[slot]))
+    order = np.argsort(choice, kind="stable")
+    choice, rows = choice[order], rows[order]
+    slots, starts = np.unique(choice, return_index=True)
+    holdings = distribution.holdings
+    for slot, chunk in zip(slots, np.split(rows, starts[1:])):
+        holdings[slot] = np.concatenate((holdings[slot], chunk))
+
+
+class Distribution:
+    '''
+    Where every ballot's votes currently sit.
+    ...
+
+    Attributes
+    ----------
+        votes : np.ndarray
+            Votes held by each candidate slot.
+        holdings : List[np.ndarray]
+            For each slot, the rows of the ballots it holds votes from.
+            Arrays are replaced rather than modified in place, so copies
+            of a Distribution can share them.
+        number_of_exhausted_ballots : int
+            Ballots that ran out of candidates (counted once per time
+            they ran out, as pyrankvote does).
+        number_of_blank_votes : float
+            Votes lost to exhausted ballots.
+
+    '''
+
+    def __init__(self, n_slots: int) -> None:
+        self.votes = np.zeros(n_slots, dtype=np.float64)
+        self.holdings = [np.empty(0, dtype=np.intp) for _ in range(n_slots)]
+        self.number_of_exhausted_ballots = 0
+        self.number_of_blank_votes = 0.0
+
+    def copy(self) -> "Distribution":
+        other = Distribution.__new__(Distribution)
+        other.votes = self.votes.copy()
+        other.holdings = list(self.holdings)
+        other.number_of_exhausted_ballots = self.number_of_exhausted_ballots
+        other.number_of_blank_votes = self.number_of_blank_votes
+        return other
+
+
+class Tally:
+    '''
+    A position's ballots translated to candidate slots, along with their
+    first-preference distribution. PositionElection keeps one between
+    counts: striking a candidate off only moves the ballots that candidate
+    held, instead of redistributing every ballot from scratch.
+    ...
+
+    Attributes
+    ----------
+        candidates : List[Candidate]
+            Candidates running when the tally was made. Their position in
+            this list is their slot.
+        ranks : np.ndarray or None
+            Ballot rankings translated to candidate slots, -1 marking
+            padding and anyone not running. None if the ballots are
+            memory-mapped: rows are then translated a block at a time as
+            they're needed, rather than copying the whole file into memory.
+        weights : np.ndarray
+            How many voters each ballot row stands for.
+        running : np.ndarray
+            Boolean mask of the slots that haven't been removed.
+
+    '''
+    # rows translated at a time when the ballots are memory-mapped
+    BLOCK_ROWS = 1 << 16
+
+    def __init__(self, candidates: List["Candidate"], ballots: BallotMatrix) -> None:
+        # duplicate candidates collapse into one slot, as in pyrankvote's dict
+        self.candidates = list(dict.fromkeys(candidates))
+        self.slots = {c: i for i, c in enumerate(self.candidates)}
+
+        lookup = np.full(len(ballots.candidates) + 1, -1, dtype=np.intp)
+        for column, candidate in enumerate(ballots.candidates):
+            lookup[column] = self.slots.get(candidate, -1)
+        # padding (-1) indexes the trailing -1 of lookup
+        self._lookup = lookup
+        self._columns = ballots.ranks
+        if isinstance(ballots.ranks, np.memmap):
+            self.ranks = None
+        else:
+            self.ranks = lookup[ballots.ranks]
+        self.weights = ballots.row_weights()
+        self.running = np.ones(len(self.candidates), dtype=bool)
+        self._distributions = {}
+
+    def running_lookup(self) -> np.ndarray:
+        return np.append(self.running, False)
+
+    def slot_ranks(self, rows: np.ndarray) -> np.ndarray:
+        '''
+        The given ballot rows, translated to candidate slots.
+        '''
+        if self.ranks is not None:
+            return self.ranks[rows]
+        return self._lookup[self._columns[rows]]
+
+    def _blocks(self):
+        '''
+        Yields (first row, slot-translated ranks) covering every ballot row.
+        '''
+        if self.ranks is not None:
+            yield 0, self.ranks
+            return
+        for start in range(0, self._columns.shape[0], Tally.BLOCK_ROWS):
+            yield start, self._lookup[self._columns[start:start + Tally.BLOCK_ROWS]]
+
+    def nth_choices(self, in_race: np.ndarray, x: int) -> np.ndarray:
+        '''
+        nth_in_race over every ballot row.
+        '''
+        choice = np.empty(len(self.weights), dtype=np.intp)
+        for start, ranks in self._blocks():
+            choice[start:start + len(ranks)] = nth_in_race(ranks, in_race, x)
+        return choice
+
+    def number_in_race(self, in_race: np.ndarray) -> np.ndarray:
+        '''
+        How many in-race candidates each ballot row ranks.
+        '''
+        lengths = np.empty(len(self.weights), dtype=np.intp)
+        for start, ranks in self._blocks():
+            lengths[start:start + len(ranks)] = in_race[ranks].sum(axis=1)
+        return lengths
+
+    def first_votes(self, votes_per_voter: int) -> Distribution:
+        '''
+        Distribution of each ballot's first votes_per_voter choices
+        among the running candidates. Kept up to date by remove_candidate.
+        '''
+        if votes_per_voter not in self._distributions:
+            self._distributions[votes_per_voter] = self._distribute(
+                votes_per_voter)
+        return self._distributions[votes_per_voter]
+
+    def _distribute(self, k: int, pick_random_if_blank: bool = False) -> Distribution:
+        distribution = Distribution(len(self.candidates))
+        running = self.running_lookup()
+        rows = np.arange(len(self.weights))
+        lengths = self.number_in_race(running)
+        blanks = np.maximum(k - lengths, 0)
+
+        for x in range(k):
+            choice = self.nth_choices(running, x)
+            _credit(distribution, self.weights, choice, rows, 1.0)
+
+        blank_rows = np.flatnonzero(blanks)
+        if pick_random_if_blank:
+            for row in blank_rows:
+                for _ in range(blanks[row]):
+                    slot = random.choice(np.flatnonzero(self.running))
+                    _credit(distribution, self.weights,
+                            np.array([slot]), np.array([row]), 1.0)
+        else:
+            weights = self.weights[blank_rows]
+            distribution.number_of_exhausted_ballots += int(weights.sum())
+            distribution.number_of_blank_votes += float(
+                (blanks[blank_rows] * weights).sum())
+        return distribution
+
+    def remove_candidate(self, candidate: "Candidate") -> None:
+        '''
+        Strikes a candidate off every ballot. Only the ballots counting
+        towards them are looked at: each hands its vote on to its next
+        running choice, or becomes (more) blank.
+        '''
+        slot = self.slots.get(candidate)
+        if slot is None or not self.running[slot]:
+            return
+        self.running[slot] = False
+        running = self.running_lookup()
+        for k, distribution in self._distributions.items():
+            rows = distribution.holdings[slot]
+            weights = self.weights[rows]
+            distribution.votes[slot] = 0.0
+            distribution.holdings[slot] = np.empty(0, dtype=np.intp)
+
+            ranks = self.slot_ranks(rows)
+            choice = nth_in_race(ranks, running, k - 1)
+            _credit(distribution, self.weights, choice, rows, 1.0)
+
+            lost = choice < 0
+            distribution.number_of_blank_votes += float(weights[lost].sum())
+            # ballots that had no blanks before now count as exhausted
+            newly_exhausted = lost & (running[ranks].sum(axis=1) == k - 1)
+            distribution.number_of_exhausted_ballots += int(
+                weights[newly_exhausted].sum())
+
+
+class MatrixElectionManager:
+    '''
+    Array counterpart of pyrankvote.helpers.ElectionManager.
+
+    Candidates are referred to by their slot in a Tally. Rather than
+    keeping a list of Ballot objects behind every candidate, each slot
+    holds an array of ballot row numbers (repeated rows allowed, as
+    pyrankvote allows the same ballot to be counted twice for a candidate).
+    Passing a Tally that is kept between counts saves redistributing the
+    first preferences every time.
+    '''
+
+    def __init__(self, candidates: List["Candidate"], ballots: BallotMatrix,
+                 number_of_votes_pr_voter: int = 1,
+                 compare_method_if_equal=CompareMethodIfEqual.MostSecondChoiceVotes,
+                 pick_random_if_blank: bool = False,
+                 tally: Tally = None) -> None:
+        if tally is None:
+            tally = Tally(candidates, ballots)
+        self.candidates = tally.candidates
+        self._tally = tally
+        self.weights = tally.weights
+        self._slots = tally.slots
+
+        in_race = list(dict.fromkeys(tally.slots[c] for c in candidates))
+        if sorted(in_race) != list(np.flatnonzero(tally.running)):
+            raise ValueError("Tally does not match the candidates running")
+
+        self._status = np.full(len(self.candidates), WITHDRAWN, dtype=np.int8)
+        self._status[in_race] = HOPEFUL
+        self._candidates_in_race = in_race
+        self._elected_candidates = []  # sorted asc by election round
+        self._rejected_candidates = []  # sorted desc by election round
+        self._second_choice_counts = {}
+
+        self._number_of_candidates = len(candidates)
+        self._number_of_votes_pr_voter = number_of_votes_pr_voter
+        self._compare_method_if_equal = compare_method_if_equal
+        self._pick_random_if_blank = pick_random_if_blank
+
+        if pick_random_if_blank:
+            # random picks can't be reused between counts
+            self._distribution = tally._distribute(number_of_votes_pr_voter,
+                                                   pick_random_if_blank)
+        else:
+            self._distribution = tally.first_votes(
+                number_of_votes_pr_voter).copy()
+        self._votes = self._distribution.votes
+        self._holdings = self._distribution.holdings
+        self._sort_candidates_in_race()
+
+    def _in_race_lookup(self) -> np.ndarray:
+        return np.append(self._status == HOPEFUL, False)
+
+    def _slot(self, candidate: "Candidate") -> int:
+        slot = self._slots.get(candidate)
+        if slot is None or self._status[slot] == WITHDRAWN:
+            raise RuntimeError("Candidate not found in electionManager")
+        return slot
+
+    # METHODS WITH SIDE-EFFECTS
+
+    def elect_candidate(self, candidate: "Candidate") -> None:
+        slot = self._slot(candidate)
+        self._status[slot] = ELECTED
+        self._elected_candidates.append(slot)
+        self._candidates_in_race.remove(slot)
+        self._second_choice_counts = {}
+
+    def reject_candidate(self, candidate: "Candidate") -> None:
+        slot = self._slot(candidate)
+        self._status[slot] = REJECTED
+        self._rejected_candidates.append(slot)
+        self._candidates_in_race.remove(slot)
+        self._second_choice_counts = {}
+
+    def transfer_votes(self, candidate: "Candidate",
+                       number_of_trans_votes: float) -> None:
+        slot = self._slot(candidate)
+        if round(number_of_trans_votes, 4) == 0.000:
+            return
+        if self._status[slot] == HOPEFUL:
+            raise RuntimeError(
+                "ElectionManager can not transfer votes from a candidate "
+                "that is still in the race (candidateStatus == Hopeful)"
+            )
+
+        rows = self._holdings[slot]
+        voters = self.weights[rows].sum()  # voters/ballots, not votes!
+        votes_pr_voter = number_of_trans_votes / float(voters)
+
+        in_race = self._in_race_lookup()
+        choice = nth_in_race(self._tally.slot_ranks(rows), in_race,
+                             self._number_of_votes_pr_voter - 1)
+        if self._pick_random_if_blank:
+            hopeful = np.flatnonzero(in_race[:-1])
+            if len(hopeful) > 0:
+                for i in np.flatnonzero(choice < 0):
+                    choice[i] = random.choice(hopeful)
+        _credit(self._distribution, self.weights, choice, rows, votes_pr_voter)
+
+        exhausted = int(self.weights[rows[choice < 0]].sum())
+        self._distribution.number_of_exhausted_ballots += exhausted
+        self._distribution.number_of_blank_votes = _add_each(
+            self._distribution.number_of_blank_votes, votes_pr_voter, exhausted)
+
+        self._votes[slot] -= number_of_trans_votes
+        self._holdings[slot] = np.empty(0, dtype=np.intp)
+
+        self._sort_candidates_in_race()
+
+    # METHODS WITHOUT SIDE-EFFECTS
+
+    def get_number_of_non_exhausted_votes(self) -> float:
+        return (self.weights.sum() * self._number_of_votes_pr_voter
+                - self._distribution.number_of_blank_votes)
+
+    def get_number_of_non_exhausted_ballots(self) -> int:
+        return (int(self.weights.sum())
+                - self._distribution.number_of_exhausted_ballots)
+
+    def get_number_of_candidates_in_race(self) -> int:
+        return len(self._candidates_in_race)
+
+    def get_number_of_elected_candidates(self) -> int:
+        return len(self._elected_candidates)
+
+    def get_number_of_votes(self, candidate: "Candidate") -> float:
+        return float(self._votes[self._slot(candidate)])
+
+    def get_candidates_in_race(self) -> List["Candidate"]:
+        return [self.candidates[slot] for slot in self._candidates_in_race]
+
+    def get_candidate_with_least_votes_in_race(self) -> "Candidate":
+        if len(self._candidates_in_race) == 0:
+            raise NoCandidatesLeftInRaceError("No candidates left in race")
+        return self.candidates[self._candidates_in_race[-1]]
+
+    def get_results(self) -> RoundResult:
+        slots = (self._elected_candidates + self._candidates_in_race
+                 + self._rejected_candidates[::-1])
+        candidate_results = [
+            CandidateResult(self.candidates[slot], float(self._votes[slot]),
+                            _STATUS_NAMES[self._status[slot]])
+            for slot in slots
+        ]
+        return RoundResult(candidate_results,
+                           self._distribution.number_of_blank_votes)
+
+    # INTERNAL METHODS
+
+    def _sort_candidates_in_race(self) -> None:
+        self._candidates_in_race = sorted(
+            self._candidates_in_race,
+            key=functools.cmp_to_key(self._cmp_slots),
+        )
+
+    def _cmp_slots(self, slot1: int, slot2: int) -> int:
+        c1_votes = self._votes[slot1]
+        c2_votes = self._votes[slot2]
+
+        if not almost_equal(c1_votes, c2_votes):
+            return -1 if c1_votes > c2_votes else 1
+
+        if self._compare_method_if_equal == CompareMethodIfEqual.MostSecondChoiceVotes:
+            return -1 if self._slot1_has_most_second_choices(slot1, slot2, 1) else 1
+
+        if self._compare_method_if_equal == CompareMethodIfEqual.Random:
+            return random.choice([1, -1])
+
+        raise SystemError("Compare method unknown/not implemented.")
+
+    def _slot1_has_most_second_choices(self, slot1: int, slot2: int,
+                                       x: int) -> bool:
+        if x >= self._number_of_candidates:
+            return random.choice([True, False])
+
+        counts = self._nth_choice_counts(x)
+        if counts[slot1] == counts[slot2]:
+            return self._slot1_has_most_second_choices(slot1, slot2, x + 1)
+        return counts[slot1] > counts[slot2]
+
+    def _nth_choice_counts(self, x: int) -> np.ndarray:
+        '''
+        Number of ballots whose x-th in-race choice is each slot. Cached
+        until a candidate's status changes.
+        '''
+        if x not in self._second_choice_counts:
+            choice = self._tally.nth_choices(self._in_race_lookup(), x)
+            valid = choice >= 0
+            self._second_choice_counts[x] = np.bincount(
+                choice[valid], weights=self.weights[valid],
+                minlength=len(self.candidates))
+        return self._second_choice_counts[x]
+
+
+def as_ballot_matrix(ballots: Union[List["Ballot"], BallotMatrix]) -> BallotMatrix:
+    if isinstance(ballots, BallotMatrix):
+        return ballots
+    return BallotMatrix.from_ballots(ballots)
+
+
+def preferential_block_voting(
+    candidates: List["Candidate"],
+    ballots: Union[List["Ballot"], BallotMatrix],
+    number_of_seats: int,
+    compare_method_if_equal=CompareMethodIfEqual.MostSecondChoiceVotes,
+    pick_random_if_blank=False,
+    tally: Tally = None,
+    on_round: Callable[[RoundResult], None] = None,
+) -> ElectionResults:
+    '''
+    Preferential block voting, counted the same way as
+    pyrankvote.preferential_block_voting.
+    '''
+    rounding_error = 1e-6
+
+    manager = MatrixElectionManager(
+        candidates,
+        as_ballot_matrix(ballots),
+        number_of_votes_pr_voter=number_of_seats,
+        compare_method_if_equal=compare_method_if_equal,
+        pick_random_if_blank=pick_random_if_blank,
+        tally=tally,
+    )
+    election_results = ElectionResults()
+
+    while True:
+        majority_limit = math.ceil(manager.get_number_of_non_exhausted_ballots() / 2.0)
+
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        candidates_in_race = manager.get_candidates_in_race()
+        candidates_in_race_votes = [
+            manager.get_number_of_votes(candidate) for candidate in candidates_in_race
+        ]
+
+        votes_remaining = sum(candidates_in_race_votes)
+        last_votes = 0.0
+        candidates_to_elect = []
+        candidates_to_reject = []
+
+        for i, candidate in enumerate(candidates_in_race):
+            votes_for_candidate = candidates_in_race_votes[i]
+            is_last_candidate = i == len(candidates_in_race) - 1
+
+            # Elect candidates with a majority
+            if (votes_for_candidate - rounding_error) >= majority_limit:
+                candidates_to_elect.append(candidate)
+
+            # Reject candidates that even with redistribution can't change the results
+            elif i >= seats_left and (votes_remaining - rounding_error) <= last_votes:
+                candidates_to_reject.append(candidate)
+
+            elif is_last_candidate:
+                raise RuntimeError("Illigal state")
+
+            last_votes = votes_for_candidate
+            votes_remaining -= votes_for_candidate
+
+        for candidate in candidates_to_elect:
+            manager.elect_candidate(candidate)
+
+        for candidate in candidates_to_reject[::-1]:
+            manager.reject_candidate(candidate)
+
+        # If same number of seats left as there are candidates, elect all candidates
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        if manager.get_number_of_candidates_in_race() <= seats_left:
+            for candidate in manager.get_candidates_in_race():
+                candidates_to_elect.append(candidate)
+                manager.elect_candidate(candidate)
+
+        # If no seats left, reject the rest of the candidates
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        if seats_left == 0:
+            for candidate in manager.get_candidates_in_race()[::-1]:
+                candidates_to_reject.append(candidate)
+                manager.reject_candidate(candidate)
+
+        round_result = manager.get_results()
+        election_results.register_round_results(round_result)
+        if on_round is not None:
+            on_round(round_result)
+
+        if manager.get_number_of_candidates_in_race() == 0:
+            break
+
+        # transfer votes of rejected candidates to the next choice
+        for candidate in candidates_to_reject:
+            number_of_votes = manager.get_number_of_votes(candidate)
+            manager.transfer_votes(candidate, number_of_votes)
+
+    return election_results
+
+
+def instant_runoff_voting(
+    candidates: List["Candidate"],
+    ballots: Union[List["Ballot"], BallotMatrix],
+    number_of_seats: int = 1,
+    compare_method_if_equal=CompareMethodIfEqual.MostSecondChoiceVotes,
+    pick_random_if_blank=False,
+    tally: Tally = None,
+    on_round: Callable[[RoundResult], None] = None,
+) -> ElectionResults:
+    '''
+    Instant runoff voting, i.e. preferential block voting for one seat.
+    number_of_seats is only accepted so this fits the evaluator_method
+    signature; IRV always fills a single seat.
+    '''
+    return preferential_block_voting(
+        candidates,
+        ballots,
+        number_of_seats=1,
+        compare_method_if_equal=compare_method_if_equal,
+        pick_random_if_blank=pick_random_if_blank,
+        tally=tally,
+        on_round=on_round,
+    )
+
+
+def single_transferable_vote(
+    candidates: List["Candidate"],
+    ballots: Union[List["Ballot"], BallotMatrix],
+    number_of_seats: int,
+    compare_method_if_equal=CompareMethodIfEqual.MostSecondChoiceVotes,
+    pick_random_if_blank=False,
+    tally: Tally = None,
+    on_round: Callable[[RoundResult], None] = None,
+) -> ElectionResults:
+    '''
+    Single transferable vote with the Droop quota, counted the same way
+    as pyrankvote.single_transferable_vote.
+    '''
+    rounding_error = 1e-6
+
+    manager = MatrixElectionManager(
+        candidates,
+        as_ballot_matrix(ballots),
+        number_of_votes_pr_voter=1,
+        compare_method_if_equal=compare_method_if_equal,
+        pick_random_if_blank=pick_random_if_blank,
+        tally=tally,
+    )
+    election_results = ElectionResults()
+
+    voters, seats = manager.get_number_of_non_exhausted_ballots(), number_of_seats
+    votes_needed_to_win = voters / float((seats + 1))  # Droop quota
+
+    while True:
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        candidates_in_race = manager.get_candidates_in_race()
+        candidates_in_race_votes = [
+            manager.get_number_of_votes(candidate) for candidate in candidates_in_race
+        ]
+
+        votes_remaining = sum(candidates_in_race_votes)
+        last_votes = 0.0
+        candidates_to_elect = []
+        candidates_to_reject = []
+
+        for i, candidate in enumerate(candidates_in_race):
+            votes_for_candidate = candidates_in_race_votes[i]
+            is_last_candidate = i == len(candidates_in_race) - 1
+
+            # Elect candidates with more votes than the quota
+            if (votes_for_candidate - rounding_error) >= votes_needed_to_win:
+                candidates_to_elect.append(candidate)
+
+            # Reject candidates that even with redistribution can't change the results
+            elif i >= seats_left and (votes_remaining - rounding_error) <= last_votes:
+                if len(candidates_to_elect) > 0:
+                    # don't reject anyone while elected candidates
+                    # still have surplus votes to hand on
+                    break
+                else:
+                    candidates_to_reject.append(candidate)
+
+            elif is_last_candidate:
+                raise RuntimeError("Illegal state")
+
+            last_votes = votes_for_candidate
+            votes_remaining -= votes_for_candidate
+
+        for candidate in candidates_to_elect:
+            manager.elect_candidate(candidate)
+
+        for candidate in candidates_to_reject[::-1]:
+            manager.reject_candidate(candidate)
+
+        # If same number of seats left as there are candidates, elect all candidates
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        if manager.get_number_of_candidates_in_race() <= seats_left:
+            for candidate in manager.get_candidates_in_race():
+                candidates_to_elect.append(candidate)
+                manager.elect_candidate(candidate)
+
+        # If no seats left, reject the rest of the candidates
+        seats_left = number_of_seats - manager.get_number_of_elected_candidates()
+        if seats_left == 0:
+            for candidate in manager.get_candidates_in_race()[::-1]:
+                candidates_to_reject.append(candidate)
+                manager.reject_candidate(candidate)
+
+        round_result = manager.get_results()
+        election_results.register_round_results(round_result)
+        if on_round is not None:
+            on_round(round_result)
+
+        if manager.get_number_of_candidates_in_race() == 0:
+            break
+
+        # hand on surplus votes of elected candidates
+        for candidate in candidates_to_elect:
+            votes_for_candidate = manager.get_number_of_votes(candidate)
+            excess_votes = votes_for_candidate - votes_needed_to_win
+            manager.transfer_votes(candidate, excess_votes)
+
+        # transfer all votes of rejected candidates
+        for candidate in candidates_to_reject:
+            votes_for_candidate = manager.get_number_of_votes(candidate)
+            manager.transfer_votes(candidate, votes_for_candidate)
+
+    return election_results
+
+
+# methods that count a BallotMatrix directly, without Ballot objects
+NATIVE_METHODS = (preferential_block_voting, instant_runoff_voting,
+                  single_transferable_vote)
@@ -0,0 +1,303 @@
+'''
+Answers "what if" questions about an election without starting over.
+
+The candidates and ballots are read once, and the elections counted once
+as configured. Each question then works on forks of those elections
+(see PositionElection.fork), put back to before the count, with a
+candidate withdrawn, a position given more seats or another counting
+method, and allocates the seats again. The ballots stay in memory and are
+never touched. With the result cache on, positions a question doesn't
+change aren't counted again either, so answers take milliseconds rather
+than a run from cold.
+
+Questions can be asked at a prompt (repl) or as JSON over HTTP on
+localhost (serve), both started from cli.py. Changes to the candidates
+themselves (joints, fill-ins, name changes) need the nominees read again,
+use batch scenarios for those.
+
+Usage
+-----
+    python cli.py --whatif
+    > withdraw Nick Riviera from Treasurer; seats Quartermaster 4
+
+    python cli.py --serve 8765
+    curl -d '{"withdraw": [["Nick Riviera", "Treasurer"]]}' localhost:8765/query
+'''
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, TextIO
+import audit
+import events
+import runner
+
+# what a question can change, everything else is as configured
+QUESTION_KEYS = ("withdraw", "seats", "evaluator")
+PROMPT = "> "
+HELP = """\
+withdraw NAME [from POSITION]   take a candidate out (of every position by default)
+seats POSITION N                give a position N seats
+evaluator MODULE.FUNCTION       count with another method
+base                            the results as configured
+help, quit
+Join changes with ; to ask about them together. A line starting with { is
+taken as a JSON question, as for the HTTP endpoint."""
+
+
+class WhatIf:
+    '''
+    An election read once, for asking what would happen if things changed.
+    ...
+
+    Attributes
+    ----------
+        settings : dict
+            The configured settings (see runner.DEFAULTS).
+        candidates : dict
+            {name: Candidate} as read.
+        elections : List[PositionElection]
+            The elections as configured, counted.
+        base : dict
+            The answer with nothing changed.
+
+    '''
+
+    def __init__(self, settings: dict) -> None:
+        self.settings = settings
+        self.candidates, ballots = runner.load_inputs(settings)
+        self.elections = runner.build_elections(
+            self.candidates, ballots, runner.resolve_evaluator(settings["EVALUATOR"]),
+            settings["elec_with_multi_seats"])
+        self.base = None
+        # the configured count is done on the elections themselves, so the
+        # forks share what it worked out (i.e. ballot digests)
+        start = time.perf_counter()
+        audit.scenario("as configured")
+        problems = runner.allocate(self.elections, settings["PARALLEL_PROCESSES"])
+        self.base = self._answer(self.elections, problems, start)
+
+    def ask(self, question: dict) -> dict:
+        '''
+        Allocates the seats again with the changes in question, a dict of
+        any of:
+            "withdraw": [name or [name, position]], a name alone withdraws
+                them from every position they run for
+            "seats": {position: seats}
+            "evaluator": a counting method's dotted name
+        Returns {"winners": {position: [name]}, "changed": [positions whose
+        winners differ from the base], "problems": [str], "milliseconds"}.
+        Raises ValueError if the question doesn't fit the election.
+        '''
+        start = time.perf_counter()
+        for key in question:
+            if key not in QUESTION_KEYS:
+                raise ValueError(f"can't ask about {key}, only {', '.join(QUESTION_KEYS)} "
+                                 "(use batch scenarios for other changes)")
+        if not isinstance(question.get("seats", {}), dict):
+            raise ValueError("seats are given as {position: seats}")
+        if not isinstance(question.get("withdraw", []), list):
+            raise ValueError("withdraw is a list of names or [name, position]")
+        forks = [e.fork() for e in self.elections]
+        for fork in forks:
+            fork.reset()
+        by_position = {fork.position: fork for fork in forks}
+
+        evaluator = question.get("evaluator")
+        if evaluator is not None:
+            try:
+                method = runner.resolve_evaluator(evaluator)
+            except (ImportError, AttributeError, ValueError):
+                raise ValueError(f"no counting method {evaluator}")
+            for fork in forks:
+                fork.evaluator_method = method
+        for position, seats in question.get("seats", {}).items():
+            if position not in by_position:
+                raise ValueError(f"no election for {position}")
+            if not isinstance(seats, int) or isinstance(seats, bool) or seats < 1:
+                raise ValueError(f"{position} needs a whole number of seats, not {seats!r}")
+            by_position[position].seats = seats
+        for withdrawal in question.get("withdraw", []):
+            if isinstance(withdrawal, str):
+                name, position = withdrawal, None
+            elif isinstance(withdrawal, list) and 1 <= len(withdrawal) <= 2:
+                name, position = (withdrawal + [None])[:2]
+            else:
+                raise ValueError(f"withdraw a name or [name, position], not {withdrawal!r}")
+            if name not in self.candidates:
+                raise ValueError(f"no candidate {name}")
+            candidate = self.candidates[name]
+            if position is None:
+                running = [f for f in forks if candidate in f.candidates]
+            elif position not in by_position:
+                raise ValueError(f"no election for {position}")
+            else:
+                running = [by_position[position]]
+            if not any(candidate in f.candidates for f in running):
+                raise ValueError(f"{name} isn't running for {position or 'anything'}")
+            for fork in running:
+                fork.remove_candidate(candidate)
+
+        audit.scenario(json.dumps(question))
+        problems = runner.allocate(forks, self.settings["PARALLEL_PROCESSES"])
+        return self._answer(forks, problems, start)
+
+    def _answer(self, elections: List["PositionElection"], problems: List[str],
+                start: float) -> dict:
+        winners = {e.position: [w.name for w in e.final_winners] for e in elections}
+        changed = [] if self.base is None else [
+            position for position, names in winners.items()
+            if names != self.base["winners"].get(position)]
+        return {"winners": winners, "changed": changed, "problems": problems,
+                "milliseconds": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def parse_question(line: str) -> dict:
+    '''
+    A question typed at the prompt (see HELP) as a dict for WhatIf.ask.
+    Raises ValueError if it can't be read.
+    '''
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"bad JSON: {e}")
+    question = {}
+    for change in filter(None, (part.strip() for part in line.split(";"))):
+        command, _, rest = change.partition(" ")
+        rest = rest.strip()
+        if command == "withdraw" and rest:
+            name, sep, position = rest.partition(" from ")
+            question.setdefault("withdraw", []).append(
+                [name.strip(), position.strip()] if sep else name.strip())
+        elif command == "seats" and rest:
+            # positions can have spaces in them, the number is last
+            position, _, seats = rest.rpartition(" ")
+            try:
+                question.setdefault("seats", {})[position.strip()] = int(seats)
+            except ValueError:
+                raise ValueError(f"seats wants a position and a number, not {rest}")
+        elif command == "evaluator" and rest:
+            question["evaluator"] = rest
+        else:
+            raise ValueError(f"don't know how to ask {change!r} (try help)")
+    return question
+
+
+def format_answer(answer: dict) -> str:
+    '''
+    An answer as lines of winners by position, changes marked with a *.
+    '''
+    width = max((len(position) for position in answer["winners"]), default=0) + 2
+    lines = []
+    for position, names in answer["winners"].items():
+        marker = " *" if position in answer["changed"] else ""
+        lines.append((position + marker).ljust(width) + (", ".join(names) or "-"))
+    lines.extend("problem: " + problem.strip() for problem in answer["problems"])
+    lines.append("({} ms)".format(answer["milliseconds"]))
+    return "\n".join(lines)
+
+
+def _load(config: dict) -> dict:
+    settings = runner.configure(config)
+    runner.apply(settings)
+    return settings
+
+
+def _ready(session: WhatIf, where: str) -> None:
+    events.result("whatif_ready", "\n===AS CONFIGURED===\n{table}\n\nReady for questions {where}",
+                  table=format_answer(session.base), where=where,
+                  winners=session.base["winners"])
+    # the counts behind each answer only go to the event log, if any
+    events.quiet(events.WARNING)
+
+
+def repl(config: dict, stdin: TextIO = None, stdout: TextIO = None) -> None:
+    '''
+    Reads the election in config, then answers questions typed at a
+    prompt until quit (or the end of stdin).
+    '''
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    settings = _load(config)
+    with runner.reporting(settings):
+        session = WhatIf(settings)
+        _ready(session, "(try help)")
+        while True:
+            stdout.write(PROMPT)
+            stdout.flush()
+            line = stdin.readline()
+            if line == "" or line.strip() in ("quit", "exit"):
+                break
+            line = line.strip()
+            if line == "":
+                continue
+            if line == "help":
+                stdout.write(HELP + "\n")
+                continue
+            try:
+                answer = session.base if line == "base" else session.ask(parse_question(line))
+            except ValueError as e:
+                stdout.write(f"error: {e.args[0]}\n")
+                continue
+            except Exception as e:
+                # a count that falls over shouldn't take the session with it
+                stdout.write(f"error: counting failed ({type(e).__name__}: {e})\n")
+                continue
+            stdout.write(format_answer(answer) + "\n")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    session = None
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") in ("", "/base"):
+            self._reply(200, self.session.base)
+        else:
+            self._reply(404, {"error": "GET / for the base results, POST /query to ask"})
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/query":
+            self._reply(404, {"error": "POST questions to /query"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            question = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(question, dict):
+                raise ValueError("a question is a JSON object")
+            self._reply(200, self.session.ask(question))
+        except ValueError as e:
+            self._reply(400, {"error": e.args[0] if e.args else str(e)})
+        except Exception as e:
+            self._reply(500, {"error": f"counting failed ({type(e).__name__}: {e})"})
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        events.info("whatif_request", "{request}", request=format % args)
+
+
+def serve(config: dict, port: int = 8765, host: str = "127.0.0.1") -> None:
+    '''
+    Reads the election in config, then answers questions POSTed as JSON
+    to /query (see WhatIf.ask) until interrupted. GET / gives the base.
+    Only listens on localhost by default. Questions are answered one at
+    a time.
+    '''
+    settings = _load(config)
+    with runner.reporting(settings):
+        session = WhatIf(settings)
+        handler = type("Handler", (_Handler,), {"session": session})
+        with HTTPServer((host, port), handler) as server:
+            _ready(session, "at http://{}:{}/query".format(*server.server_address[:2]))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,47 @@
+'''
+Shared set-up for the tests. The scripts aren't a package, so their
+directory is put on the import path here, as running them from scripts/
+would (see benchmarks/__init__.py).
+'''
+import os
+import random
+import sys
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture
+def random_ballots():
+    '''
+    Makes (candidates, ballots) for a small random election from a seed:
+    a handful of candidates and up to a few hundred ballots, some blank,
+    some ranking everybody.
+    '''
+    from pyrankvote import Ballot, Candidate
+
+    def make(seed: int, max_candidates: int = 7, max_ballots: int = 300):
+        rng = random.Random(seed)
+        candidates = [Candidate(f"Candidate {i}") for i in range(rng.randint(2, max_candidates))]
+        ballots = [Ballot(rng.sample(candidates, rng.randint(0, len(candidates))))
+                   for _ in range(rng.randint(5, max_ballots))]
+        return candidates, ballots
+    return make
+
+
+@pytest.fixture(scope="session")
+def generated_election(tmp_path_factory):
+    '''
+    Settings for a small election written by benchmarks/generate.py: a
+    dozen nominees running for three positions each, and 200 ballots.
+    '''
+    from benchmarks import generate
+    directory = str(tmp_path_factory.mktemp("election"))
+    generated = generate.generate(directory, 200, n_candidates=12, seed=0)
+    return {"CANDIDACY_FILE": os.path.join(directory, "data", generate.NOMINEE_FILE),
+            "BALLOT_FILE": os.path.join(directory, "data", generate.BALLOT_FILE),
+            "VOTING_TABLE": os.path.join(directory, "config", "VOTING.csv"),
+            "joints": generated["joints"], "QUIET": True}
@@ -0,0 +1,54 @@
+import pyrankvote
+import pytest
+import audit
+import tabulation
+from ballot_matrix import BallotMatrix
+from election_helper import PositionElection
+
+
+@pytest.fixture
+def log(tmp_path):
+    fname = str(tmp_path / "audit.jsonl")
+    audit.enable(fname)
+    yield fname
+    audit.disable()
+
+
+def _election(evaluator):
+    a, b, c, d = (pyrankvote.Candidate(name) for name in "ABCD")
+    rankings = [[a, b]] * 4 + [[b, c]] * 3 + [[c, a]] * 2 + [[d, c]] * 2
+    ballots = BallotMatrix.from_ballots([pyrankvote.Ballot(r) for r in rankings])
+    return PositionElection("President", [a, b, c, d], ballots, evaluator)
+
+
+def test_native_rounds_are_written_as_they_are_counted(log):
+    election = _election(tabulation.preferential_block_voting)
+    write = audit.rounds("President")
+    written = []
+
+    def on_round(round_):
+        write(round_)
+        written.append(audit._writer.entries)
+    result = election.count(on_round)
+    assert len(result.rounds) > 1
+    assert written == list(range(1, len(result.rounds) + 1))
+
+
+@pytest.mark.parametrize("evaluator", [tabulation.preferential_block_voting,
+                                       pyrankvote.preferential_block_voting])
+def test_rounds_written_while_counting_match_a_finished_count(log, evaluator):
+    election = _election(evaluator)
+    result = election.count(audit.rounds("President"))
+    audit.scenario("written afterwards")
+    audit.count("President", result)
+    audit.disable()
+    streamed, afterwards = [], []
+    for entry in audit.read(log, "President"):
+        (afterwards if entry.pop("scenario") else streamed).append(entry)
+    assert len(streamed) == len(result.rounds)
+    assert streamed == afterwards
+    assert streamed[1]["eliminated"] and streamed[1]["transfers"]
+
+
+def test_no_trail_no_writer():
+    assert audit.rounds("President") is None
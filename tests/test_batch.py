@@ -0,0 +1,49 @@
+import pytest
+import batch
+import runner
+
+# in the generated election the base run gives Nominee 0010 a seat elsewhere
+# and strikes them off Swag Master, which they win with three presidents
+SCENARIOS = {"as configured": {},
+             "three presidents": {"elec_with_multi_seats": {"President": 3}}}
+STRUCK, POSITION = "Nominee 0010", "Swag Master"
+
+
+def _names(winners):
+    return {position: [w.name for w in won] for position, won in winners.items()}
+
+
+@pytest.mark.parametrize("matrix", [True, False])
+def test_scenarios_match_standalone_runs(generated_election, matrix, monkeypatch):
+    config = dict(generated_election, USE_BALLOT_MATRIX=matrix)
+    parses = []
+    parse_ballots = runner.parse_ballots
+
+    def counted(*args, **kwargs):
+        parses.append(1)
+        return parse_ballots(*args, **kwargs)
+    monkeypatch.setattr(runner, "parse_ballots", counted)
+    results = batch.run_scenarios(config, SCENARIOS)
+    assert len(parses) == 1
+
+    first, second = (results[name] for name in SCENARIOS)
+    swag_master = next(e for e in first["elections"] if e.position == POSITION)
+    assert STRUCK in {c.name for c in swag_master.excluded}
+    assert STRUCK in _names(second["winners"])[POSITION]
+
+    for name, overrides in SCENARIOS.items():
+        alone = runner.run_election(config, **overrides)
+        assert _names(results[name]["winners"]) == _names(alone["winners"]), name
+        assert results[name]["problems"] == alone["problems"], name
+
+
+def test_scenario_that_doesnt_fit_the_ballots_fails_alone(generated_election):
+    config = generated_election
+    # without the joint, the ballots ranking it name nobody running
+    joint_name = config["joints"][0][2]
+    results = batch.run_scenarios(config, {"as configured": {},
+                                           "no joint": {"joints": []}})
+    assert "error" in results["no joint"]
+    assert joint_name in results["no joint"]["error"]
+    alone = runner.run_election(config)
+    assert _names(results["as configured"]["winners"]) == _names(alone["winners"])
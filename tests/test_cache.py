@@ -0,0 +1,105 @@
+import importlib.util
+import os
+import pickle
+import shutil
+import cache
+import eligibility
+
+
+def _inputs(tmp_path, ballots="President,Alice\n"):
+    fname = tmp_path / "votes.csv"
+    fname.write_text(ballots)
+    return [str(fname)]
+
+
+def test_hit_after_miss(tmp_path):
+    key = cache.cache_key(_inputs(tmp_path), {"VOTING_START_ROW": 3})
+    built = []
+
+    def build():
+        built.append(1)
+        return {"President": ["Alice"]}
+    assert cache.cached(key, build, str(tmp_path)) == {"President": ["Alice"]}
+    assert cache.cached(key, build, str(tmp_path)) == {"President": ["Alice"]}
+    assert len(built) == 1
+
+
+def test_changed_inputs_or_settings_miss(tmp_path):
+    key = cache.cache_key(_inputs(tmp_path), {"VOTING_START_ROW": 3})
+    cache.store(key, "parsed", str(tmp_path))
+    assert cache.load(key, str(tmp_path)) == "parsed"
+    assert cache.cache_key(_inputs(tmp_path), {"VOTING_START_ROW": 4}) != key
+    assert cache.cache_key(_inputs(tmp_path, "President,Bob\n"),
+                           {"VOTING_START_ROW": 3}) != key
+
+
+def _unpickled():
+    raise AssertionError("unpickled a file that isn't a cache file for the key")
+
+
+class _Payload:
+    def __reduce__(self):
+        return (_unpickled, ())
+
+
+def test_files_not_written_for_the_key_arent_unpickled(tmp_path):
+    key = cache.cache_key(_inputs(tmp_path))
+    # a bare pickle, as an earlier version would have left
+    with open(cache._path(key, str(tmp_path)), "wb") as f:
+        pickle.dump(_Payload(), f)
+    assert cache.load(key, str(tmp_path)) is None
+
+    # a cache file whose key only shares the file name
+    other = key[:32] + "0" * (len(key) - 32)
+    cache.store(other, "someone else's", str(tmp_path))
+    assert cache.load(key, str(tmp_path)) is None
+
+
+def test_truncated_file_rebuilds(tmp_path):
+    key = cache.cache_key(_inputs(tmp_path))
+    cache.store(key, list(range(1000)), str(tmp_path))
+    path = cache._path(key, str(tmp_path))
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    assert cache.cached(key, lambda: "rebuilt", str(tmp_path)) == "rebuilt"
+    assert cache.load(key, str(tmp_path)) == "rebuilt"
+
+
+def _rule_module(tmp_path, name, passing):
+    # a config file of the user's own, with a rule in it
+    fname = tmp_path / f"{name}.py"
+    fname.write_text("import eligibility\n\n\n"
+                     "def is_finished(values):\n"
+                     f"    return values == {passing!r}\n\n\n"
+                     "checker = eligibility.Eligibility(\n"
+                     "    0, [eligibility.Rule('incomplete', 1, is_finished)])\n")
+    spec = importlib.util.spec_from_file_location(name, fname)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.checker
+
+
+def test_editing_a_rule_misses(tmp_path):
+    before = _rule_module(tmp_path, "rules_before", "TRUE")
+    after = _rule_module(tmp_path, "rules_after", "YES")
+    # the same as far as their reprs go
+    assert repr(before) == repr(after)
+    key = cache.cache_key(_inputs(tmp_path), before)
+    assert cache.cache_key(_inputs(tmp_path), before) == key
+    assert cache.cache_key(_inputs(tmp_path), after) != key
+    assert cache.cache_key(
+        _inputs(tmp_path), eligibility.Eligibility(0, before.rules, "first")) != key
+
+
+def test_editing_the_parser_misses(tmp_path, monkeypatch):
+    scripts = os.path.dirname(os.path.abspath(cache.__file__))
+    copy = tmp_path / "scripts"
+    shutil.copytree(scripts, copy, ignore=shutil.ignore_patterns("__pycache__"))
+    monkeypatch.setattr(cache, "__file__", str(copy / "cache.py"))
+    key = cache.cache_key(_inputs(tmp_path))
+    for fname in ("eligibility.py", "parallel_parse.py", "runner.py"):
+        with open(copy / fname, "a") as f:
+            f.write("\n# edited\n")
+        edited = cache.cache_key(_inputs(tmp_path))
+        assert edited != key, fname
+        key = edited
@@ -0,0 +1,38 @@
+import pickle
+import pytest
+from election_helper import Candidate, Info
+
+
+def _candidate(name, positions=("President",)):
+    return Candidate(name, positions, Info("someone@example.com", True, []))
+
+
+def test_candidates_compare_and_hash_by_name():
+    alice, bob = _candidate("Alice"), _candidate("Bob")
+    assert alice != bob
+    assert len({alice, bob}) == 2
+
+    other_alice = _candidate("Alice", ("Treasurer",))
+    assert alice == other_alice
+    assert alice == "Alice"
+    assert hash(alice) == hash(other_alice)
+    assert other_alice in {alice}
+
+
+def test_hash_survives_pickling():
+    alice = _candidate("Alice")
+    loaded = pickle.loads(pickle.dumps(alice))
+    assert loaded == alice
+    assert hash(loaded) == hash(alice)
+    assert loaded in {alice: 1}
+
+
+def test_rank_follows_positions():
+    alice = _candidate("Alice", ("President", "Treasurer", "President"))
+    assert alice.rank("President") == 1
+    assert alice.rank("Treasurer") == 2
+    alice.positions = ["DUMMY", "Treasurer", "President"]
+    assert alice.rank("Treasurer") == 2
+    assert alice.rank("President") == 3
+    with pytest.raises(ValueError):
+        alice.rank("Secretary")
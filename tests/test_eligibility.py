@@ -0,0 +1,106 @@
+import itertools
+import pytest
+import events
+from eligibility import Eligibility, finished
+
+# student number, finished, and which submission it is
+LINES = [["1", "TRUE", "a"], ["2", "TRUE", "b"], ["1", "TRUE", "c"],
+         ["3", "FALSE", "d"], ["3", "TRUE", "e"], ["", "TRUE", "f"],
+         ["", "TRUE", "g"], ["2", "FALSE", "h"], ["1", "TRUE", "i"]]
+# what each policy counts. Blank student numbers are never repeats, and an
+# unfinished resubmission (h, or d before e) never knocks out a finished one
+KEPT = {"latest": "befgi", "first": "abefg", "drop": "befg", None: "abcefgi"}
+DUPLICATES = {"latest": ["1", "1"], "first": ["1", "1"], "drop": ["1", "1", "1"],
+              None: []}
+
+
+class _Collector:
+    level = events.DEBUG
+
+    def __init__(self) -> None:
+        self.events = []
+
+    def handle(self, event) -> None:
+        self.events.append(event)
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def collected():
+    sink = _Collector()
+    events.add_sink(sink)
+    yield sink.events
+    events.remove_sink(sink)
+
+
+def _kept(chunks):
+    return "".join(line[2] for line in itertools.chain.from_iterable(chunks))
+
+
+def _chunks(size):
+    return [LINES[i:i + size] for i in range(0, len(LINES), size)]
+
+
+@pytest.mark.parametrize("duplicates", list(KEPT))
+def test_duplicate_policies(duplicates):
+    checker = Eligibility(0, [finished(1)], duplicates)
+    assert _kept(checker.filter_chunks([LINES])) == KEPT[duplicates]
+    assert checker.counted == len(KEPT[duplicates])
+    assert checker.rejected.get("incomplete") == ["3", "2"]
+    assert checker.rejected.get("duplicate", []) == DUPLICATES[duplicates]
+
+
+@pytest.mark.parametrize("size", [1, 2, 4])
+@pytest.mark.parametrize("duplicates", list(KEPT))
+def test_chunks_keep_the_same_rows(duplicates, size):
+    checker = Eligibility(0, [finished(1)], duplicates)
+    kept = _kept(checker.filter_chunks(_chunks(size), lambda: _chunks(size)))
+    assert kept == KEPT[duplicates]
+    assert checker.counted == len(KEPT[duplicates])
+    assert sorted(checker.rejected.get("duplicate", [])) == DUPLICATES[duplicates]
+
+
+def test_first_across_chunks_needs_no_second_pass():
+    checker = Eligibility(0, [finished(1)], "first")
+    assert _kept(checker.filter_chunks(_chunks(2))) == KEPT["first"]
+
+
+def test_without_repeat_checks_student_numbers_arent_read():
+    checker = Eligibility(5, [finished(1)], None)
+    assert checker.needed_columns() == {1}
+    # the rows have no column 5, it's only looked at to name rejections
+    assert _kept(checker.filter_chunks([[line[:3] for line in LINES
+                                         if line[1] == "TRUE"]])) == KEPT[None]
+
+
+def test_incomplete_rows_rejected_before_repeats():
+    lines = [["7", "TRUE", "a"], ["7", "FALSE", "b"], ["7", "", "c"]]
+    checker = Eligibility(0, [finished(1)], "latest")
+    assert _kept(checker.filter_chunks([lines])) == "a"
+    assert checker.rejected == {"incomplete": ["7", "7"]}
+
+
+def test_report(collected):
+    checker = Eligibility(0, [finished(1)], "drop")
+    list(checker.filter_chunks([LINES]))
+    report, = [e for e in collected if e.kind == "ballots_eligibility"]
+    fields = report.values()
+    assert fields["counted"] == 4
+    assert fields["rejected"] == 5
+    assert fields["reasons"] == {"incomplete": ["3", "2"], "duplicate": ["1", "1", "1"]}
+    assert "incomplete (2): 3, 2" in report.text()
+    assert "duplicate (3): 1, 1, 1" in report.text()
+
+    # a checker used again starts its counts over
+    collected.clear()
+    list(checker.filter_chunks([LINES[:2]]))
+    report, = [e for e in collected if e.kind == "ballots_eligibility"]
+    assert report.values()["counted"] == 2
+    assert report.values()["rejected"] == 0
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Eligibility(0, [], duplicates="last")
@@ -0,0 +1,50 @@
+import io
+import json
+import pytest
+import events
+
+
+@pytest.fixture
+def console():
+    # a console of our own in place of the usual ones, put back afterwards
+    saved = events.sinks()
+    for sink in saved:
+        events._sinks.remove(sink)
+    sink = events.ConsoleSink(stream=io.StringIO())
+    events.add_sink(sink)
+    yield sink
+    events.close()
+    events._sinks[:] = saved
+    events._update_threshold()
+
+
+def test_fields_dont_overwrite_the_record(console, tmp_path):
+    log = tmp_path / "run.jsonl"
+    events.add_sink(events.JsonlSink(str(log)))
+    events.info("candidate_removed", "{candidate} removed", candidate="Alice",
+                message="not this", time=0)
+    events.close()
+    record = json.loads(log.read_text())
+    assert record["kind"] == "candidate_removed"
+    assert record["level"] == "info"
+    assert record["message"] == "Alice removed"
+    assert record["time"] != 0
+    assert record["fields"] == {"candidate": "Alice", "message": "not this", "time": 0}
+
+
+def test_lazy_fields_only_built_when_a_sink_takes_them(console, tmp_path):
+    built = []
+
+    def table():
+        built.append(1)
+        return "A: 1/1 seats filled."
+    events.debug("seats_filled", "{table}", table=table)
+    assert built == []
+
+    events.add_sink(events.JsonlSink(str(tmp_path / "run.jsonl")))
+    events.info("seats_filled", "{table}", table=table)
+    assert built == [1]
+    assert console.stream.getvalue() == "A: 1/1 seats filled.\n"
+    events.close()
+    assert json.loads((tmp_path / "run.jsonl").read_text())["fields"] == \
+        {"table": "A: 1/1 seats filled."}
@@ -0,0 +1,110 @@
+import json
+import pytest
+import instrument
+
+
+@pytest.fixture(autouse=True)
+def disabled():
+    instrument.disable()
+    yield
+    instrument.disable()
+
+
+def test_phases_nest_and_are_listed_by_when_they_began():
+    recorder = instrument.enable()
+    with instrument.phase("outer", file="ballots.csv"):
+        with instrument.phase("inner", position="President"):
+            pass
+        with instrument.phase("inner", position="Treasurer"):
+            with instrument.phase("innermost"):
+                pass
+    with instrument.phase("after"):
+        pass
+
+    assert [(p["name"], p["depth"]) for p in recorder.phases] == [
+        ("outer", 0), ("inner", 1), ("inner", 1), ("innermost", 2), ("after", 0)]
+    outer, first, second, innermost, after = recorder.phases
+    assert outer["args"] == {"file": "ballots.csv"}
+    assert first["args"] == {"position": "President"}
+    assert outer["seconds"] >= first["seconds"] + second["seconds"]
+    assert second["start"] <= innermost["start"]
+    assert after["start"] >= outer["start"] + outer["seconds"]
+    assert "peak_bytes" not in outer
+
+
+def test_exception_closes_the_phase():
+    recorder = instrument.enable()
+    with pytest.raises(KeyError):
+        with instrument.phase("outer"):
+            with instrument.phase("failing"):
+                raise KeyError("Alice")
+    with instrument.phase("next"):
+        pass
+
+    assert [(p["name"], p["depth"]) for p in recorder.phases] == [
+        ("outer", 0), ("failing", 1), ("next", 0)]
+    assert all(p is not None for p in recorder.phases)
+
+
+def test_counters_add_up():
+    recorder = instrument.enable()
+    instrument.count("ballots processed", 3)
+    instrument.count("ballots processed", 4)
+    instrument.count("rounds")
+    assert recorder.counters == {"ballots processed": 7, "rounds": 1}
+
+
+def test_memory_is_relative_to_the_start_of_the_phase():
+    recorder = instrument.enable(trace_memory=True)
+    with instrument.phase("outer"):
+        kept = bytearray(2 ** 20)
+        with instrument.phase("inner"):
+            dropped = bytearray(4 * 2 ** 20)
+            del dropped
+    outer, inner = recorder.phases
+    assert inner["peak_bytes"] >= 4 * 2 ** 20
+    assert inner["allocated_bytes"] < 2 ** 20
+    # the inner phase's peak counts towards the outer one's
+    assert outer["peak_bytes"] >= 5 * 2 ** 20
+    assert outer["allocated_bytes"] >= 2 ** 20
+    del kept
+
+
+def test_json_and_trace(tmp_path):
+    recorder = instrument.enable()
+    with instrument.phase("count", position="President", seats=2):
+        instrument.count("rounds", 5)
+
+    assert recorder.to_json() == {"phases": recorder.phases,
+                                  "counters": {"rounds": 5}}
+    instrument.write_json(str(tmp_path / "run.json"))
+    written = json.loads((tmp_path / "run.json").read_text())
+    assert written["counters"] == {"rounds": 5}
+    assert written["phases"][0]["name"] == "count"
+
+    instrument.write_trace(str(tmp_path / "run.trace.json"))
+    trace = json.loads((tmp_path / "run.trace.json").read_text())
+    span, counters = trace["traceEvents"]
+    record = recorder.phases[0]
+    assert span["ph"] == "X"
+    assert span["name"] == "count"
+    assert span["args"] == {"position": "President", "seats": "2"}
+    assert span["ts"] == pytest.approx(record["start"] * 1e6)
+    assert span["dur"] == pytest.approx(record["seconds"] * 1e6)
+    assert counters["ph"] == "C"
+    assert counters["args"] == {"rounds": 5}
+    assert counters["ts"] == pytest.approx(span["ts"] + span["dur"])
+
+
+def test_disabled_records_nothing():
+    assert not instrument.enabled()
+    assert instrument.phase("a") is instrument.phase("b", position="President")
+    with instrument.phase("a"):
+        with instrument.phase("b"):
+            instrument.count("rounds", 3)
+    assert instrument.recorder() is None
+
+    # enabling starts afresh rather than picking up anything from before
+    recorder = instrument.enable()
+    assert recorder.phases == []
+    assert recorder.counters == {}
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import pairwise
+from ballot_matrix import BallotMatrix
+from election_helper import Ballot, Candidate, Info
+from pairwise import PairwisePreferences, preference_matrix
+
+A, B, C, D, E = (Candidate(name, ("President",), Info(f"{name}@example.com", True, []))
+                 for name in "ABCDE")
+RANKINGS = [[A, B, C],
+            [B, A],  # C left off, so below both
+            [C],
+            [D, C, A],  # D isn't counted, the rest are as if D wasn't there
+            [],
+            [B, D, C]]
+# [i, j]: voters ranking i above j, worked out by hand from RANKINGS.
+# Nobody ranks E, so each ballot ranking someone puts them above E
+WINS = {(A, B): 2, (B, A): 2,
+        (A, C): 2, (C, A): 3,
+        (B, C): 3, (C, B): 2,
+        (A, E): 3, (B, E): 3, (C, E): 4}
+
+
+def _expected(candidates):
+    return np.array([[WINS.get((i, j), 0) for j in candidates] for i in candidates])
+
+
+def _ballots(rankings):
+    return [Ballot(list(ranking)) for ranking in rankings]
+
+
+@pytest.mark.parametrize("candidates", [[A, B, C], [C, A, B], [A, B, C, E]],
+                         ids=["ABC", "CAB", "ABCE"])
+@pytest.mark.parametrize("form", ["list", "matrix", "grouped"])
+def test_preference_matrix(candidates, form):
+    ballots = _ballots(RANKINGS)
+    if form != "list":
+        ballots = BallotMatrix.from_ballots(ballots)
+    if form == "grouped":
+        ballots = ballots.grouped()
+    wins = preference_matrix(candidates, ballots)
+    assert wins.dtype == np.int64
+    assert np.array_equal(wins, _expected(candidates))
+
+
+def test_weights_and_blocks(monkeypatch):
+    # the same ballots three times over, counted two rows at a time
+    monkeypatch.setattr(pairwise, "BLOCK_ROWS", 2)
+    ballots = BallotMatrix.from_ballots(_ballots(RANKINGS * 3))
+    expected = 3 * _expected([A, B, C])
+    assert np.array_equal(preference_matrix([A, B, C], ballots), expected)
+    assert np.array_equal(preference_matrix([A, B, C], ballots.grouped()), expected)
+
+
+def test_no_ballots():
+    assert np.array_equal(preference_matrix([A, B], []), np.zeros((2, 2)))
+
+
+def test_preferences():
+    prefs = PairwisePreferences.from_ballots([A, B, C], _ballots(RANKINGS))
+    assert prefs.head_to_head(C, A) == (3, 2)
+    assert prefs.head_to_head(A, B) == (2, 2)
+    # C beats A, B beats C, A and B tie
+    assert prefs.condorcet_winner() is None
+    assert prefs.condorcet_loser() is None
+    assert list(prefs.copeland_scores()) == [0.5, 1.5, 1.0]
+    assert prefs.smith_set() == [B]
+    among = prefs.restricted([C, B])
+    assert np.array_equal(among.wins, [[0, 2], [3, 0]])
+    assert among.condorcet_winner() == B
+    assert among.condorcet_loser() == C
+    assert prefs.break_tie([A, C, B]) == [B, C, A]
@@ -0,0 +1,63 @@
+import random
+import pyrankvote
+import pytest
+import tabulation
+from ballot_matrix import BallotMatrix
+from election_helper import PositionElection
+from parallel import ParallelCounter
+
+EVALUATORS = [tabulation.preferential_block_voting, tabulation.single_transferable_vote,
+              pyrankvote.preferential_block_voting, pyrankvote.single_transferable_vote]
+
+
+def _elections(random_ballots, evaluator, matrices):
+    elections = []
+    for seed in range(12):
+        candidates, ballots = random_ballots(seed, max_ballots=120)
+        seats = random.Random(seed).randint(1, len(candidates) - 1 or 1)
+        if matrices:
+            ballots = BallotMatrix.from_ballots(ballots)
+        election = PositionElection(f"Position {seed}", list(candidates), ballots,
+                                    evaluator, seats)
+        if seed % 3 == 0 and len(candidates) > 2:
+            # as if they'd won another position
+            election.remove_candidate(candidates[seed % len(candidates)])
+        elections.append(election)
+    return elections
+
+
+@pytest.mark.parametrize("evaluator", EVALUATORS, ids=lambda e: f"{e.__module__}.{e.__name__}")
+@pytest.mark.parametrize("matrices", [True, False], ids=["matrix", "ballots"])
+def test_parallel_counts_match_serial(random_ballots, monkeypatch, evaluator, matrices):
+    # chance ties go the same way in the workers, which are forked after this
+    monkeypatch.setattr(random, "choice", lambda options: list(options)[0])
+    elections = _elections(random_ballots, evaluator, matrices)
+    serial = []
+    for election in elections:
+        try:
+            serial.append(str(election.count()))
+        except RuntimeError as e:
+            # pyrankvote's STV can find itself in an "Illegal state"
+            serial.append(str(e))
+    with ParallelCounter(elections, 2) as counter:
+        parallel = []
+        for election in elections:
+            try:
+                parallel.append(str(counter.count([election])[0]))
+            except RuntimeError as e:
+                parallel.append(str(e))
+    assert parallel == serial
+
+
+def test_candidate_in_first_column_gets_transfers():
+    # pyrankvote passes over a falsy candidate when handing votes on, so the
+    # one in the matrix's first column mustn't be stood in for by 0
+    a, b, c = (pyrankvote.Candidate(name) for name in "ABC")
+    ballots = BallotMatrix.from_ballots(
+        [pyrankvote.Ballot(ranking) for ranking in [[a]] * 2 + [[c, a]] * 2 + [[b]] * 3])
+    election = PositionElection("Chair", [a, b, c], ballots,
+                                pyrankvote.single_transferable_vote, 1)
+    with ParallelCounter([election], 1) as counter:
+        result = counter.count([election])[0]
+    assert str(result) == str(election.count())
+    assert [w.name for w in result.get_winners()] == ["A"]
@@ -0,0 +1,92 @@
+import csv
+import random
+import numpy as np
+import pytest
+from election_helper import Candidate, Info, get_ballots
+from eligibility import Eligibility, finished
+from parallel_parse import byte_ranges
+
+NAMES = ["Nick Riviera", "Troy McClure", "Lionel Hutz", "Ned Flanders", "Edna Krabappel"]
+POSITIONS = [("President", 4), ("Treasurer", 5)]
+
+
+@pytest.fixture
+def ballot_file(tmp_path):
+    '''
+    A Qualtrics-like export: three header rows, then a student number, a
+    finished flag, a free text answer (with quotes and newlines in it) and
+    a ranking per position. Some voters submit twice or don't finish.
+    '''
+    rng = random.Random(0)
+    rows = [["Student", "Finished", "Comments", "President", "Treasurer"]] * 3
+    for voter in range(400):
+        comment = rng.choice(["", "fine", 'said "hi"\nthen left', "a,b\n\nc"])
+        rankings = []
+        for _ in POSITIONS:
+            picked = rng.sample(NAMES, rng.randint(0, 3))
+            rankings.append(",".join(picked) if picked else rng.choice(["", "Abstain"]))
+        rows.append([str(rng.randint(0, 300)), rng.choice(["TRUE"] * 9 + ["FALSE"]),
+                     comment] + rankings)
+    fname = tmp_path / "votes.csv"
+    with open(fname, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(fname)
+
+
+def _read(fname, processes, group, checker, chunk_size=None):
+    candidates = {name: Candidate(name, tuple(p for p, _ in POSITIONS),
+                                  Info(f"{name}@example.com", True, []))
+                  for name in NAMES}
+    return get_ballots(fname, POSITIONS, candidates, checker, as_matrix=True,
+                       group=group, processes=processes, chunk_size=chunk_size)
+
+
+def _same_matrices(ballots, expected):
+    assert list(ballots) == list(expected)
+    for position, matrix in expected.items():
+        other = ballots[position]
+        assert [c.name for c in other.candidates] == [c.name for c in matrix.candidates]
+        assert other.ranks.dtype == matrix.ranks.dtype
+        assert np.array_equal(other.ranks, matrix.ranks)
+        assert np.array_equal(other.row_weights(), matrix.row_weights())
+
+
+@pytest.mark.parametrize("checked", [False, True], ids=["unchecked", "eligibility"])
+@pytest.mark.parametrize("group", [False, True], ids=["rows", "grouped"])
+def test_same_matrices_as_reading_in_one_go(ballot_file, group, checked):
+    def checker():
+        return Eligibility(0, [finished(1)]) if checked else None
+    serial = _read(ballot_file, None, group, checker())
+    for processes in (1, 2, 3):
+        _same_matrices(_read(ballot_file, processes, group, checker()), serial)
+
+
+@pytest.mark.parametrize("duplicates", ["latest", "first", "drop", None])
+def test_every_duplicate_policy_keeps_the_same_ballots_however_read(ballot_file,
+                                                                    duplicates):
+    single = Eligibility(0, [finished(1)], duplicates)
+    serial = _read(ballot_file, None, False, single)
+    assert single.counted < 400
+    for processes, chunk_size in ((None, 7), (None, 1000), (2, None), (3, None)):
+        other = Eligibility(0, [finished(1)], duplicates)
+        _same_matrices(_read(ballot_file, processes, False, other, chunk_size), serial)
+        assert other.counted == single.counted
+        assert {reason: sorted(numbers) for reason, numbers in other.rejected.items()} \
+            == {reason: sorted(numbers) for reason, numbers in single.rejected.items()}
+
+
+def test_ranges_cover_whole_records(ballot_file):
+    with open(ballot_file, "rb") as f:
+        data = f.read()
+    for parts in (1, 2, 5, 40):
+        ranges = byte_ranges(ballot_file, start_row=3, parts=parts)
+        # records are short next to a range, so every part gets some
+        assert len(ranges) == parts
+        assert ranges[-1][1] == len(data)
+        records = 0
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:] + [(len(data), 0)]):
+            assert end == next_start
+            text = data[start:end].decode()
+            # a range is whole records: parsing it alone gives what it holds
+            records += len(list(csv.reader(text.splitlines(keepends=True))))
+        assert records == 400
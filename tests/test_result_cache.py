@@ -0,0 +1,105 @@
+import pickle
+import pyrankvote
+import pytest
+import tabulation
+from ballot_matrix import BallotMatrix
+from election_helper import PositionElection
+from result_cache import ResultCache, ballot_digest, count_key
+
+METHOD = tabulation.preferential_block_voting
+
+
+@pytest.fixture
+def result_cache(tmp_path):
+    PositionElection.result_cache = ResultCache(str(tmp_path))
+    yield PositionElection.result_cache
+    PositionElection.result_cache = None
+
+
+def _election(candidates, ballots, evaluator=METHOD, seats=1):
+    return PositionElection("President", list(candidates),
+                            BallotMatrix.from_ballots(ballots), evaluator, seats)
+
+
+def _clear_winner():
+    a, b, c = (pyrankvote.Candidate(name) for name in "ABC")
+    rankings = [[a, b]] * 5 + [[b, a]] * 3 + [[c, b]] * 2
+    return [a, b, c], [pyrankvote.Ballot(ranking) for ranking in rankings]
+
+
+def test_hit_after_miss(result_cache):
+    candidates, ballots = _clear_winner()
+    first = _election(candidates, ballots)
+    assert first.cached_result() is None
+    expected = str(first.count())
+
+    again = _election(candidates, ballots)
+    hit = again.cached_result()
+    assert hit is not None and str(hit) == expected
+    # put back around the election's own candidates
+    assert all(r.candidate in candidates for r in hit.rounds[0].candidate_results)
+
+
+def test_changes_miss(result_cache):
+    candidates, ballots = _clear_winner()
+    _election(candidates, ballots).count()
+    assert _election(candidates, ballots, seats=2).cached_result() is None
+    assert _election(candidates, ballots, tabulation.single_transferable_vote) \
+        .cached_result() is None
+    assert _election(candidates, ballots[:-1]).cached_result() is None
+    struck_off = _election(candidates, ballots)
+    struck_off.remove_candidate(candidates[2])
+    assert struck_off.cached_result() is None
+
+
+def test_counts_settled_by_chance_arent_kept(result_cache):
+    a, b = pyrankvote.Candidate("A"), pyrankvote.Candidate("B")
+    tied = [pyrankvote.Ballot([a]), pyrankvote.Ballot([b])]
+    for evaluator in (METHOD, pyrankvote.preferential_block_voting):
+        election = _election([a, b], tied, evaluator)
+        election.count()
+        assert election.cached_result() is None
+    assert result_cache.size == 0
+
+
+def test_entries_not_written_for_the_key_arent_unpickled(result_cache):
+    candidates, ballots = _clear_winner()
+    key = count_key(METHOD, candidates, 1, ballot_digest(BallotMatrix.from_ballots(ballots)))
+    path = result_cache._path(key)
+    # a bare pickle, as an earlier version would have left
+    result_cache.put(key, METHOD(candidates, BallotMatrix.from_ballots(ballots), 1))
+    with open(path, "wb") as f:
+        pickle.dump([], f)
+    assert result_cache.get(key, candidates) is None
+
+    # an entry whose key only shares the file name
+    other = key[:32] + "0" * (len(key) - 32)
+    result_cache.put(other, METHOD(candidates, BallotMatrix.from_ballots(ballots), 1))
+    assert result_cache.get(key, candidates) is None
+    assert result_cache.get(other, candidates) is not None
+
+
+def test_least_recently_used_go_first(tmp_path):
+    candidates, ballots = _clear_winner()
+    result = METHOD(candidates, BallotMatrix.from_ballots(ballots), 1)
+    results = ResultCache(str(tmp_path))
+    results.put("a" * 64, result)
+    entry = results.size
+    results = ResultCache(str(tmp_path), max_bytes=2 * entry)
+    results.put("b" * 64, result)
+    assert results.get("a" * 64, candidates) is not None
+    results.put("c" * 64, result)
+    assert results.get("b" * 64, candidates) is None
+    assert results.get("a" * 64, candidates) is not None
+    assert results.get("c" * 64, candidates) is not None
+
+
+def test_parallel_counts_settled_by_chance_arent_kept(result_cache):
+    from parallel import ParallelCounter
+    a, b = pyrankvote.Candidate("A"), pyrankvote.Candidate("B")
+    tied = _election([a, b], [pyrankvote.Ballot([a]), pyrankvote.Ballot([b])])
+    clear = _election(*_clear_winner())
+    with ParallelCounter([tied, clear], 1) as counter:
+        counter.count([tied, clear])
+    assert tied.cached_result() is None
+    assert clear.cached_result() is not None
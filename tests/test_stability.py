@@ -0,0 +1,43 @@
+import random
+import numpy as np
+import pytest
+import stability
+import tabulation
+from ballot_matrix import BallotMatrix
+from election_helper import PositionElection
+
+
+def test_batched_count_matches_counting_each_resample(random_ballots):
+    compared = 0
+    for seed in range(40):
+        candidates, ballots = random_ballots(seed, max_ballots=60)
+        election = PositionElection("President", list(candidates),
+                                    BallotMatrix.from_ballots(ballots),
+                                    tabulation.preferential_block_voting)
+        slots, ranks, weights = stability.slot_ballots(election)
+        drawn = stability.resample(weights, 20, np.random.default_rng(seed))
+        batched = stability.single_seat_winners(ranks, drawn, len(slots))
+        for row_weights, won in zip(drawn, batched):
+            keep = row_weights > 0
+            matrix = BallotMatrix(slots, ranks[keep], row_weights[keep], validate=False)
+            state = random.getstate()
+            result = tabulation.preferential_block_voting(list(slots), matrix, 1)
+            if random.getstate() != state:
+                # settled by chance, which the batched count gives the first listed
+                continue
+            expected = {slots.index(w) for w in result.get_winners()}
+            assert set(np.flatnonzero(won)) == expected, seed
+            compared += 1
+    assert compared > 500
+
+
+def test_shares_add_up_to_the_seats(random_ballots):
+    candidates, ballots = random_ballots(3)
+    for evaluator, seats in ((tabulation.preferential_block_voting, 1),
+                             (tabulation.single_transferable_vote, 2)):
+        election = PositionElection("President", list(candidates),
+                                    BallotMatrix.from_ballots(ballots), evaluator, seats)
+        shares = stability.bootstrap(election, resamples=50, seed=0)
+        assert set(shares) == set(candidates)
+        assert sum(shares.values()) == pytest.approx(seats, abs=0.1)
+        assert shares == stability.bootstrap(election, resamples=50, seed=0)
@@ -0,0 +1,108 @@
+import random
+import pyrankvote
+import pytest
+import tabulation
+from ballot_matrix import BallotMatrix
+
+METHODS = ["preferential_block_voting", "instant_runoff_voting",
+           "single_transferable_vote"]
+
+
+def _count(module, name, candidates, ballots, seats, seed):
+    # ties that come down to chance are settled with random, so both
+    # counts start from the same state
+    random.seed(seed)
+    method = getattr(module, name)
+    if name == "instant_runoff_voting":
+        return str(method(candidates, ballots))
+    return str(method(candidates, ballots, seats))
+
+
+@pytest.mark.parametrize("name", METHODS)
+@pytest.mark.parametrize("grouped", [False, True])
+def test_same_results_as_pyrankvote(random_ballots, name, grouped):
+    for seed in range(150):
+        candidates, ballots = random_ballots(seed)
+        seats = random.Random(seed).randint(1, len(candidates) - 1 or 1)
+        matrix = BallotMatrix.from_ballots(ballots)
+        if grouped:
+            matrix = matrix.grouped()
+        try:
+            expected = _count(pyrankvote, name, candidates, ballots, seats, seed)
+        except RuntimeError as e:
+            # pyrankvote's STV can find itself in an "Illegal state"
+            with pytest.raises(RuntimeError, match=str(e)):
+                _count(tabulation, name, candidates, matrix, seats, seed)
+            continue
+        assert _count(tabulation, name, candidates, matrix, seats, seed) == expected, seed
+
+
+def test_stv_fractional_transfers_print_the_same():
+    # fractional surplus transfers: multiplying them out rounds the blank
+    # and candidate totals differently from adding a ballot at a time
+    from pyrankvote import Ballot, Candidate
+    a, b, c, d = (Candidate(name) for name in "ABCD")
+    rankings = ([[a]] * 2 + [[b, c]] * 8 + [[c, d]] * 5 + [[d]] * 8
+                + [[a, c]] * 7 + [[b]] * 3)
+    ballots = [Ballot(ranking) for ranking in rankings]
+    name = "single_transferable_vote"
+    expected = _count(pyrankvote, name, [a, b, c, d], ballots, 2, 0)
+    for matrix in (BallotMatrix.from_ballots(ballots),
+                   BallotMatrix.from_ballots(ballots).grouped()):
+        assert _count(tabulation, name, [a, b, c, d], matrix, 2, 0) == expected
+
+
+def test_add_each_adds_one_at_a_time():
+    total = 0.5
+    for _ in range(37):
+        total += 0.1
+    assert tabulation._add_each(0.5, 0.1, 37) == total
+    assert tabulation._add_each(2.0, 0.1, 0) == 2.0
+
+
+@pytest.mark.parametrize("name", ["preferential_block_voting", "single_transferable_vote"])
+@pytest.mark.parametrize("grouped", [False, True])
+@pytest.mark.parametrize("struck", ["elected", "rejected", "both"])
+def test_recount_after_removal_matches_a_fresh_count(random_ballots, name, grouped, struck):
+    # the election's Tally is kept from the first count and only moves the
+    # ballots of whoever is struck off, which has to come out as counting
+    # the remaining candidates from scratch
+    from election_helper import PositionElection
+    checked = 0
+    for seed in range(100):
+        candidates, ballots = random_ballots(seed)
+        if len(candidates) < 3:
+            continue
+        seats = random.Random(seed).randint(1, len(candidates) - 2)
+        matrix = BallotMatrix.from_ballots(ballots)
+        if grouped:
+            matrix = matrix.grouped()
+        election = PositionElection("President", list(candidates), matrix,
+                                    getattr(tabulation, name), seats)
+        random.seed(seed)
+        try:
+            first = election.count()
+        except RuntimeError:
+            continue
+        winners = first.get_winners()
+        losers = [c for c in candidates if c not in winners]
+        removed = {"elected": winners[:1], "rejected": losers[:1],
+                   "both": winners[:1] + losers[-1:]}[struck]
+        for candidate in removed:
+            election.remove_candidate(candidate)
+        assert election._tally is not None
+
+        running = [c for c in candidates if c not in removed]
+        left = [pyrankvote.Ballot([c for c in b.ranked_candidates if c in running])
+                for b in ballots]
+        try:
+            expected = _count(pyrankvote, name, running, left, seats, seed)
+        except RuntimeError as e:
+            with pytest.raises(RuntimeError, match=str(e)):
+                random.seed(seed)
+                election.count()
+            continue
+        random.seed(seed)
+        assert str(election.count()) == expected, seed
+        checked += 1
+    assert checked > 50
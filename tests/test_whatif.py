@@ -0,0 +1,139 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import HTTPServer
+import pytest
+import runner
+import whatif
+
+
+@pytest.fixture(scope="module")
+def session(generated_election):
+    return whatif.WhatIf(whatif._load(generated_election))
+
+
+def _state(elections):
+    return [(e.position, list(e.candidates), set(e.excluded), e.seats,
+             list(e.final_winners), e.evaluator_method) for e in elections]
+
+
+def _standalone(config, **overrides):
+    winners = runner.run_election(config, **overrides)["winners"]
+    return {position: [w.name for w in won] for position, won in winners.items()}
+
+
+@pytest.mark.parametrize("line, question", [
+    ("withdraw Nominee 0010", {"withdraw": ["Nominee 0010"]}),
+    ("withdraw Nominee 0010 from Swag Master",
+     {"withdraw": [["Nominee 0010", "Swag Master"]]}),
+    ("seats Head Quartermaster 2", {"seats": {"Head Quartermaster": 2}}),
+    ("evaluator tabulation.single_transferable_vote",
+     {"evaluator": "tabulation.single_transferable_vote"}),
+    ("  withdraw Nominee 0001; withdraw Nominee 0002 from Treasurer ;seats President 3;",
+     {"withdraw": ["Nominee 0001", ["Nominee 0002", "Treasurer"]],
+      "seats": {"President": 3}}),
+    ('{"seats": {"President": 3}}', {"seats": {"President": 3}}),
+    ("", {}),
+])
+def test_parse_question(line, question):
+    assert whatif.parse_question(line) == question
+
+
+@pytest.mark.parametrize("line", [
+    "withdraw", "seats President", "seats President three", "evaluator",
+    "elect Nominee 0010", "Withdraw Nominee 0010", '{"seats": '])
+def test_parse_question_rejects(line):
+    with pytest.raises(ValueError):
+        whatif.parse_question(line)
+
+
+def test_questions_leave_the_base_alone(session, generated_election):
+    before = _state(session.elections)
+    base = session.base
+
+    withdrawn = session.ask({"withdraw": ["Nominee 0010"]})
+    assert "Public Relations" in withdrawn["changed"]
+    assert all("Nominee 0010" not in names for names in withdrawn["winners"].values())
+
+    # nothing of the withdrawal is left for the next question
+    seats = session.ask({"seats": {"President": 3}})
+    assert seats["winners"] == _standalone(generated_election,
+                                           elec_with_multi_seats={"President": 3})
+    assert len(seats["winners"]["President"]) > 1
+    assert "Nominee 0010" in seats["winners"]["Swag Master"]
+
+    again = session.ask({})
+    assert again["winners"] == base["winners"]
+    assert again["changed"] == []
+    assert again["problems"] == base["problems"]
+    assert session.base is base
+    assert _state(session.elections) == before
+
+
+@pytest.mark.parametrize("question", [
+    {"joints": []},
+    {"seats": [["President", 2]]},
+    {"seats": {"President": 0}},
+    {"seats": {"President": True}},
+    {"seats": {"Mayor": 2}},
+    {"withdraw": "Nominee 0010"},
+    {"withdraw": ["Nobody"]},
+    {"withdraw": [["Nominee 0010", "Mayor"]]},
+    {"withdraw": [["Nominee 0010", "President", "now"]]},
+    {"evaluator": "tabulation.no_such_method"},
+])
+def test_questions_that_dont_fit(session, question):
+    before = _state(session.elections)
+    with pytest.raises(ValueError):
+        session.ask(question)
+    assert _state(session.elections) == before
+
+
+def test_withdrawing_someone_not_running(session):
+    running = {c.name for e in session.elections if e.position == "President"
+               for c in e.candidates}
+    name = next(name for name in session.candidates if name not in running)
+    with pytest.raises(ValueError):
+        session.ask({"withdraw": [[name, "President"]]})
+
+
+@pytest.fixture
+def server(session):
+    handler = type("Handler", (whatif._Handler,), {"session": session})
+    with HTTPServer(("127.0.0.1", 0), handler) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        yield "http://{}:{}".format(*httpd.server_address[:2])
+        httpd.shutdown()
+        thread.join()
+
+
+def _request(url, body=None):
+    data = None if body is None else body.encode()
+    try:
+        with urllib.request.urlopen(url, data) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http(server, session):
+    assert _request(server + "/") == (200, session.base)
+    assert _request(server + "/base") == (200, session.base)
+
+    status, answer = _request(server + "/query",
+                              json.dumps({"withdraw": [["Nominee 0010", "Public Relations"]]}))
+    assert status == 200
+    assert answer["winners"] == session.ask(
+        {"withdraw": [["Nominee 0010", "Public Relations"]]})["winners"]
+    assert "Public Relations" in answer["changed"]
+    status, answer = _request(server + "/query", "")
+    assert status == 200
+    assert answer["winners"] == session.base["winners"]
+
+    assert _request(server + "/query", '{"withdraw": ["Nobody"]}')[0] == 400
+    assert _request(server + "/query", "[1, 2]")[0] == 400
+    assert _request(server + "/query", "{not json")[0] == 400
+    assert _request(server + "/elsewhere")[0] == 404
+    assert _request(server + "/elsewhere", "{}")[0] == 404